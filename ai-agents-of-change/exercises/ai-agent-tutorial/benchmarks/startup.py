@@ -0,0 +1,116 @@
+"""
+Startup benchmark for the OpenServ Agent library.
+
+Measures, in fresh interpreters:
+- the cumulative ``python -X importtime`` cost of common import statements
+- time-to-first-request: from spawning an agent process until ``/health``
+  answers
+
+Run from the project root:
+
+    python benchmarks/startup.py [--runs 5] [--json]
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+from typing import Dict, List
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+IMPORT_CASES = {
+    'types': 'from src import ProcessParams, DoTaskAction',
+    'capability': 'from src import Capability',
+    'agent': 'from src import Agent',
+}
+
+AGENT_SCRIPT = """
+import sys
+from src import Agent, AgentOptions
+agent = Agent(AgentOptions(system_prompt='benchmark', api_key='benchmark-key', port=int(sys.argv[1])))
+agent.start()
+"""
+
+
+def _env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(PROJECT_ROOT), env.get('PYTHONPATH')]))
+    env.setdefault('OPENSERV_LOG_LEVEL', 'WARNING')
+    return env
+
+
+def import_time_us(statement: str) -> int:
+    """Total cumulative import time of the top-level modules imported by ``statement``."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        capture_output=True, text=True, env=_env(), cwd=PROJECT_ROOT, check=True
+    )
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Top-level entries are not indented; nested ones are already counted in them
+        if not name[1:].startswith(' '):
+            total += int(cumulative)
+    return total
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def time_to_first_request(timeout: float = 30.0) -> float:
+    """Seconds from spawning an agent process until its /health route responds."""
+    port = _free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-c', AGENT_SCRIPT, str(port)],
+        env=_env(), cwd=PROJECT_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/health', timeout=0.5) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError(f'Agent did not answer /health within {timeout}s')
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='number of runs per measurement')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    results: Dict[str, Dict[str, float]] = {}
+    for name, statement in IMPORT_CASES.items():
+        samples: List[float] = [import_time_us(statement) / 1000 for _ in range(args.runs)]
+        results[f'import_{name}_ms'] = {'median': statistics.median(samples), 'min': min(samples)}
+
+    samples = [time_to_first_request() * 1000 for _ in range(args.runs)]
+    results['time_to_first_request_ms'] = {'median': statistics.median(samples), 'min': min(samples)}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for name, stats in results.items():
+        print(f"{name:<32} median {stats['median']:>8.1f}  min {stats['min']:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
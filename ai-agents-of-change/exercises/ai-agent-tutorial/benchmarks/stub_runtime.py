@@ -0,0 +1,153 @@
+"""
+Stand-in OpenServ runtime for exercising request compression.
+
+``create_app`` returns an ASGI app serving ``/runtime/execute`` and
+``/runtime/chat``. It decompresses gzip and zstd request bodies, answers
+415 with an ``Accept-Encoding`` header for encodings it is told not to
+accept (as the real runtime would), and records the size of each body on
+the wire and after decoding.
+
+Run from the project root to compare an execute payload for a large
+workspace sent uncompressed, with gzip and with zstd:
+
+    python benchmarks/stub_runtime.py [--agents 200] [--memories 500] [--runs 20] [--json]
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+import httpx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def _decompress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'gzip':
+        return gzip.decompress(body)
+    if encoding == 'zstd':
+        import zstandard
+        return zstandard.ZstdDecompressor().decompressobj().decompress(body)
+    return body
+
+
+def create_app(accept: Sequence[str] = ('gzip', 'zstd')) -> Starlette:
+    """
+    Create the stand-in runtime.
+
+    Args:
+        accept: Request content encodings to accept; others get 415
+
+    The app's ``state.requests`` lists one dict per request with the path,
+    encoding, wire size, decoded size and decoded JSON payload.
+    """
+    async def handle(request: Request) -> JSONResponse:
+        encoding = request.headers.get('content-encoding', 'identity').lower()
+        if encoding != 'identity' and encoding not in accept:
+            return JSONResponse(
+                {'error': f'Unsupported content encoding {encoding}'},
+                status_code=415,
+                headers={'Accept-Encoding': ', '.join(accept) or 'identity'},
+            )
+        body = await request.body()
+        decoded = _decompress(body, encoding)
+        app.state.requests.append({
+            'path': request.url.path,
+            'encoding': encoding,
+            'wire_bytes': len(body),
+            'decoded_bytes': len(decoded),
+            'payload': json.loads(decoded),
+        })
+        return JSONResponse({'status': 'accepted'})
+
+    app = Starlette(routes=[
+        Route('/runtime/execute', handle, methods=['POST']),
+        Route('/runtime/chat', handle, methods=['POST']),
+    ])
+    app.state.requests = []
+    return app
+
+
+def large_action(agents: int, memories: int) -> Dict[str, Any]:
+    """A do-task action for a busy workspace."""
+    return {
+        'type': 'do-task',
+        'me': {'id': 1, 'name': 'benchmark', 'kind': 'external'},
+        'task': {'id': 42, 'description': 'Summarize the research notes ' * 20, 'dependencies': []},
+        'workspace': {
+            'id': 7,
+            'goal': 'Produce a quarterly market report covering every product line. ' * 50,
+            'bucket_folder': 'workspaces/7',
+            'agents': [
+                {'id': i, 'name': f'agent-{i}', 'capabilities_description': 'Researches and writes reports ' * 5}
+                for i in range(agents)
+            ],
+        },
+        'integrations': [],
+        'memories': [{'id': i, 'memory': f'Fact {i}: the customer prefers concise summaries.'} for i in range(memories)],
+    }
+
+
+async def _send(compression: str, action: Dict[str, Any], runs: int) -> Dict[str, float]:
+    # Read by the client when it is created
+    os.environ['OPENSERV_REQUEST_COMPRESSION'] = compression
+    from src.client import RuntimeClient
+    from src.config import APIConfig
+
+    app = create_app()
+    client = RuntimeClient(APIConfig(api_key='benchmark-key', runtime_url='http://runtime.local'))
+    client.client._transport = httpx.ASGITransport(app=app)
+    tools: List[Dict[str, Any]] = [{'name': 'summarize', 'description': 'Summarize text', 'schema': {}}]
+    messages = [{'role': 'system', 'content': 'You are a research assistant.'}]
+    start = time.perf_counter()
+    for _ in range(runs):
+        await client.execute_task(7, 42, tools, messages, action)
+    elapsed = time.perf_counter() - start
+    await client.close()
+    last = app.state.requests[-1]
+    assert last['payload']['action'] == action
+    return {
+        'wire_bytes': last['wire_bytes'],
+        'decoded_bytes': last['decoded_bytes'],
+        'ms_per_request': elapsed / runs * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--agents', type=int, default=200, help='agents in the workspace')
+    parser.add_argument('--memories', type=int, default=500, help='memories attached to the action')
+    parser.add_argument('--runs', type=int, default=20, help='requests per measurement')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    os.environ.setdefault('OPENSERV_LOG_LEVEL', 'WARNING')
+    action = large_action(args.agents, args.memories)
+    encodings = ['', 'gzip']
+    try:
+        import zstandard  # noqa: F401
+        encodings.append('zstd')
+    except ImportError:
+        pass
+
+    results = {name or 'identity': asyncio.run(_send(name, action, args.runs)) for name in encodings}
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for name, stats in results.items():
+        print(f"{name:<10} wire {stats['wire_bytes']:>9} bytes  decoded {stats['decoded_bytes']:>9} bytes  "
+              f"{stats['ms_per_request']:>7.2f} ms/request")
+
+
+if __name__ == '__main__':
+    main()
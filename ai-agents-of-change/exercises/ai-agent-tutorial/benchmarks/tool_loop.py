@@ -0,0 +1,118 @@
+"""
+Offline load test of the process tool loop.
+
+Runs many conversations through ``Agent.process`` at once against a
+``ScriptedBackend``, so no tokens are spent and the model's latency is
+whatever the script says. Each conversation calls the ``lookup`` tool the
+given number of times and then answers; the tool itself is a short sleep.
+
+Run from the project root:
+
+    python benchmarks/tool_loop.py [--conversations 500] [--concurrency 100] [--tool-calls 3]
+                                   [--latency-ms 300] [--jitter-ms 100] [--json]
+
+or replay a recorded script with ``--script script.json`` (see src/llm.py
+for the format).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from pydantic import BaseModel
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+class LookupArgs(BaseModel):
+    key: str
+
+
+async def _lookup(params: Dict[str, Any], messages: Any) -> str:
+    await asyncio.sleep(0.005)
+    return f"value of {params['args'].key}"
+
+
+def _script(tool_calls: int) -> List[Dict[str, Any]]:
+    steps: List[Dict[str, Any]] = [
+        {'tool_calls': [{'name': 'lookup', 'arguments': {'key': f'k{i}'}}]} for i in range(tool_calls)
+    ]
+    steps.append({'content': 'All values looked up.'})
+    return steps
+
+
+async def _run(args: argparse.Namespace) -> Dict[str, Any]:
+    from src import AgentOptions, Capability, MessageHistory, ProcessParams
+    from src.agent import Agent
+    from src.llm import ScriptedBackend
+
+    if args.script:
+        backend = ScriptedBackend.from_file(args.script)
+    else:
+        backend = ScriptedBackend(
+            _script(args.tool_calls), latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000, seed=1
+        )
+    agent = Agent(AgentOptions(system_prompt='You look things up.', api_key='benchmark-key', llm_backend=backend))
+    agent.add_capability(Capability(name='lookup', description='Look up a key', schema=LookupArgs, run=_lookup))
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: List[float] = []
+    failures = 0
+
+    async def conversation(i: int) -> None:
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            result = await agent.process(ProcessParams(messages=MessageHistory([
+                {'role': 'system', 'content': 'You look things up.'},
+                {'role': 'user', 'content': f'Look up everything for request {i}'},
+            ])))
+            latencies.append(time.perf_counter() - start)
+            if not result.get('completed'):
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(conversation(i) for i in range(args.conversations)))
+    elapsed = time.perf_counter() - start
+    await agent.on_shutdown()
+    latencies.sort()
+    return {
+        'conversations': args.conversations,
+        'failures': failures,
+        'completions': backend.calls,
+        'seconds': elapsed,
+        'conversations_per_second': args.conversations / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p99_ms': latencies[int(len(latencies) * 0.99) - 1] * 1000 if len(latencies) > 1 else latencies[0] * 1000,
+        'llm_limit': agent.llm_limiter.limit,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--conversations', type=int, default=500, help='conversations to run')
+    parser.add_argument('--concurrency', type=int, default=100, help='conversations in flight at once')
+    parser.add_argument('--tool-calls', type=int, default=3, help='tool calls before the final answer')
+    parser.add_argument('--latency-ms', type=float, default=300, help='latency of each completion')
+    parser.add_argument('--jitter-ms', type=float, default=100, help='extra random latency per completion')
+    parser.add_argument('--script', help='replay this script instead')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    os.environ.setdefault('OPENSERV_LOG_LEVEL', 'WARNING')
+    results = asyncio.run(_run(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for key, value in results.items():
+        print(f"{key:<26} {value:.2f}" if isinstance(value, float) else f"{key:<26} {value}")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,12 +2,12 @@
 OpenServ Agent library.
 """
 
-import logging
-import os
+from typing import TYPE_CHECKING
 
 from .types import (
     AgentOptions,
     ProcessParams,
+    MessageHistory,
     AgentAction,
     DoTaskAction,
     RespondChatMessageAction,
@@ -16,8 +16,7 @@ from .types import (
     IntegrationCallRequest,
     ProxyConfiguration
 )
-from .agent import Agent
-from .capability import Capability
+from .capability import Capability, Progress
 from .exceptions import (
     OpenServError,
     ConfigurationError,
@@ -28,20 +27,29 @@ from .exceptions import (
     RuntimeError
 )
 
-# Configure logging - use environment variable or default to INFO
-log_level = os.environ.get("OPENSERV_LOG_LEVEL", "INFO").upper()
-logging.basicConfig(
-    level=getattr(logging, log_level, logging.INFO),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
-logger.info(f"OpenServ Agent SDK initialized with log level: {log_level}")
+if TYPE_CHECKING:
+    from .agent import Agent
+    from .host import AgentHost
+
+def __getattr__(name: str):
+    # Agent pulls in openai, fastapi, uvicorn and httpx; load it on first use so
+    # code that only needs Capability or the types starts quickly
+    if name == 'Agent':
+        from .agent import Agent
+        return Agent
+    if name == 'AgentHost':
+        from .host import AgentHost
+        return AgentHost
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 __all__ = [
     'Agent',
+    'AgentHost',
     'AgentOptions',
     'Capability',
+    'Progress',
     'ProcessParams',
+    'MessageHistory',
     'AgentAction',
     'DoTaskAction',
     'RespondChatMessageAction',
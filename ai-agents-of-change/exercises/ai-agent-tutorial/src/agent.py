@@ -3,23 +3,36 @@ Main Agent implementation for the OpenServ Agent library.
 """
 
 import logging
-from typing import Optional, List, Dict, Any, TypeVar, Generic, Callable, Awaitable, cast, Union
-import openai
+from typing import Optional, List, Dict, Any, TypeVar, Generic, Callable, Awaitable, AsyncIterator, cast, Union, TYPE_CHECKING
 import asyncio
 import signal
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 import json
 import inspect
 import os
-
-# Configure logging to show INFO and above
-logging.basicConfig(level=logging.INFO)
+import time
+from pathlib import Path
+import httpx
 
 from .config import Config
-from .client import OpenServClient, RuntimeClient, DateTimeEncoder
+from .client import OpenServClient, RuntimeClient, DateTimeEncoder, RawJSON
 from .server import AgentServer
-from .capability import Capability
-from .exceptions import ConfigurationError, RuntimeError
+from .capability import Capability, Progress, validation_errors
+from .exceptions import ConfigurationError, ToolError
+from .metrics import DEFAULT_AGENT, LLM_LATENCY, TOOL_LOOP_ITERATIONS, INFLIGHT_TASKS
+from . import tracing
+from .logger import configure_logging
+from .task_queue import DurableTaskQueue, QueuedAction
+from .dedup import DeliveryDeduplicator
+from .scheduler import ActionScheduler, CHAT, TASK
+from .limiter import AdaptiveLimiter
+from .jobs import CallbackPolicy, Job, JobStore
+from .secret_cache import SecretCache
+from .attachments import AttachmentCache
+from .projection import PayloadProjection, PAYLOAD_BYTES
+from .shedding import LoadShedder
+from .loop_monitor import loop_monitor
+from .llm import LLMBackend, OpenAIBackend, ScriptedBackend, HedgedBackend
 from .types import (
     AgentOptions,
     DoTaskAction,
@@ -38,9 +51,16 @@ from .types import (
     IntegrationCallRequest,
     ProxyConfiguration,
     GetSecretsParams,
-    GetSecretValueParams
+    GetSecretValueParams,
+    MessageHistory,
+    TaskAttachment,
+    parse_action
 )
 
+if TYPE_CHECKING:
+    import openai
+    from .host import SharedResources
+
 logger = logging.getLogger(__name__)
 
 T = TypeVar('T', bound=BaseModel)
@@ -57,9 +77,15 @@ class Agent:
     - Server management
     """
     
-    def __init__(self, options: AgentOptions) -> None:
-        """Initialize the Agent with the given options."""
-        logger.info("Initializing Agent with options: %s", options.model_dump())
+    def __init__(self, options: AgentOptions, shared: Optional['SharedResources'] = None) -> None:
+        """
+        Initialize the Agent with the given options.
+        
+        ``shared`` holds the connection pools and caches of an ``AgentHost``
+        when several agents run in one process; on its own an agent creates
+        its own.
+        """
+        logger.info("Initializing Agent with options: %s", options.model_dump(exclude={'auth_token'}))
         
         # Create configuration
         self.config = Config.from_env(system_prompt=options.system_prompt)
@@ -72,6 +98,8 @@ class Agent:
         if options.model:
             self.config.openai.model = options.model
             logger.info(f"Using custom OpenAI model: {options.model}")
+        if options.auth_token:
+            self.config.server.auth_token = options.auth_token
             
         # Validate configuration - fail early
         if not self.config.api.api_key:
@@ -81,27 +109,118 @@ class Agent:
             raise api_key_error
         
         # Initialize components
+        self.name = options.name
+        # The agent label of this agent's metrics, which tells agents hosted together apart
+        self.metrics_agent = options.name or DEFAULT_AGENT
         self.tools: List[Capability[BaseModel]] = []
-        self._openai: Optional[openai.OpenAI] = None
-        self.api_client = OpenServClient(self.config.api)
-        self.runtime_client = RuntimeClient(self.config.api)
+        # Adaptive cap on concurrent LLM calls, tuned from latency and 429s
+        self.llm_limiter = AdaptiveLimiter.from_env('llm', 'LLM', agent=self.metrics_agent)
+        self._openai: Optional['openai.OpenAI'] = None
+        # Completions for the tool loop: given, scripted for offline load tests, or OpenAI on first use
+        self._llm_backend: Optional[LLMBackend] = options.llm_backend
+        if self._llm_backend is None and os.environ.get("OPENSERV_LLM_SCRIPT"):
+            self._llm_backend = ScriptedBackend.from_file(os.environ["OPENSERV_LLM_SCRIPT"])
+            logger.warning(f"Using scripted LLM responses from {os.environ['OPENSERV_LLM_SCRIPT']}")
+        if self._llm_backend is not None:
+            self._llm_backend = HedgedBackend.from_env(self._llm_backend, self.metrics_agent, self.llm_limiter)
+        self.shared = shared
+        transport = shared.transport if shared else None
+        self.api_client = OpenServClient(self.config.api, transport, self.metrics_agent)
+        self.runtime_client = RuntimeClient(self.config.api, transport, self.metrics_agent)
         
         # Store error handler if provided
         self.on_error = options.on_error
         
+        # Suppress repeated deliveries of the same task or chat message
+        self.deduplicator = DeliveryDeduplicator(
+            ttl=float(os.environ.get("OPENSERV_DEDUP_TTL", "600")),
+            agent=self.metrics_agent,
+        )
+        
+        # Dispatcher for accepted actions: chat before tasks, fair across workspaces
+        self.scheduler = ActionScheduler(
+            max_concurrency=int(os.environ.get("OPENSERV_MAX_CONCURRENCY", "32")),
+            workspace_concurrency=int(os.environ.get("OPENSERV_WORKSPACE_CONCURRENCY", "4")),
+            agent=self.metrics_agent,
+        )
+        
+        # Refuse new root-route work while queue delay or loop lag stays above target
+        self.shedder: Optional[LoadShedder] = None
+        if os.environ.get("OPENSERV_LOAD_SHEDDING", "1") != "0":
+            self.shedder = LoadShedder(
+                self.scheduler,
+                loop_monitor,
+                sojourn_target=float(os.environ.get("OPENSERV_SHED_QUEUE_DELAY_MS", "500")) / 1000,
+                lag_target=float(os.environ.get("OPENSERV_SHED_LOOP_LAG_MS", "200")) / 1000,
+                interval=float(os.environ.get("OPENSERV_SHED_INTERVAL_MS", "1000")) / 1000,
+                agent=self.metrics_agent,
+            )
+        
+        # Workspace secrets, prefetched on a workspace's first action and held for a TTL
+        self.secret_cache = SecretCache(
+            ttl=float(os.environ.get("OPENSERV_SECRET_TTL", "300")),
+            agent=self.metrics_agent,
+        )
+        self._background: set = set()
+        
+        # Task attachments, downloaded in the background when a task starts
+        self.attachments = shared.attachments if shared else AttachmentCache.from_env()
+        
+        # Records of tool calls run in async mode, bounded and expiring
+        self.jobs = JobStore(
+            ttl=float(os.environ.get("OPENSERV_JOB_TTL", "3600")),
+            max_jobs=int(os.environ.get("OPENSERV_MAX_JOBS", "1000")),
+            agent=self.metrics_agent,
+        )
+        self.callback_policy = CallbackPolicy.from_env()
+        self._callback_client: Optional[httpx.AsyncClient] = None
+        
+        # Which parts of the action are forwarded to the runtime
+        projection_config = options.payload_projection
+        if projection_config is None and os.environ.get("OPENSERV_PAYLOAD_PROJECTION"):
+            projection_config = json.loads(os.environ["OPENSERV_PAYLOAD_PROJECTION"])
+        self.payload_projection = PayloadProjection.from_config(projection_config)
+        
+        # Optional durable queue for accepted do-task actions
+        task_queue_path = options.task_queue_path or os.environ.get("OPENSERV_TASK_QUEUE_PATH")
+        self.task_queue: Optional[DurableTaskQueue] = None
+        if task_queue_path:
+            self.task_queue = DurableTaskQueue(
+                task_queue_path,
+                max_in_flight=int(os.environ.get("OPENSERV_TASK_QUEUE_IN_FLIGHT", "128")),
+                drain_rate=float(os.environ.get("OPENSERV_TASK_QUEUE_RATE", "0")),
+                agent=self.metrics_agent,
+            )
+        
         # Set up server with common security and performance features
         self.server = AgentServer(self.config.server)
         self.server.set_agent(self)
         
     @property
-    def openai_client(self) -> openai.OpenAI:
+    def openai_client(self) -> 'openai.OpenAI':
         """Get or create the OpenAI client instance."""
         if not self._openai:
             if not self.config.openai.api_key:
                 raise ConfigurationError('OpenAI API key is required')
+            # Imported on first use: the openai package is slow to import
+            import openai
             self._openai = openai.OpenAI(api_key=self.config.openai.api_key)
         return self._openai
 
+    @property
+    def llm_backend(self) -> LLMBackend:
+        """Get or create the backend that produces completions for the tool loop."""
+        if not self._llm_backend:
+            if not self.config.openai.api_key:
+                raise ConfigurationError('OpenAI API key is required')
+            self._llm_backend = HedgedBackend.from_env(OpenAIBackend(
+                self.config.openai.api_key,
+                self.config.openai.model,
+                base_url=self.config.openai.base_url,
+                http_client=self.shared.llm_http_client if self.shared else None,
+            ), self.metrics_agent, self.llm_limiter)
+        return self._llm_backend
+
     @property
     def openai_tools(self) -> List[Dict[str, Any]]:
         """Convert tools to OpenAI function format."""
@@ -118,6 +237,7 @@ class Agent:
         """Add a single capability to the agent."""
         if any(t.name == capability.name for t in self.tools):
             raise ValueError(f'Tool with name "{capability.name}" already exists')
+        capability.bind_metrics(self.metrics_agent)
         self.tools.append(capability)
         return self
 
@@ -128,13 +248,14 @@ class Agent:
         return self
 
     async def process(self, params: ProcessParams) -> Dict[str, Any]:
-        """Process a conversation with OpenAI."""
+        """Process a conversation with the LLM backend, running the tools it calls."""
         logger.info("Starting process with %d messages", len(params.messages))
+        iteration_count = 0
         try:
-            current_messages = params.messages.copy()
+            # Shared by reference with the tools; appends never copy the history
+            current_messages = params.messages
             # Get the tool loop limit from env or default to 10 to match TS SDK
             max_iterations = int(os.environ.get("OPENSERV_TOOL_LOOP_LIMIT", "10"))
-            iteration_count = 0
             final_response = None
             tool_outputs = []
 
@@ -142,140 +263,99 @@ class Agent:
                 logger.info("Process iteration %d/%d", iteration_count + 1, max_iterations)
                 iteration_count += 1
                 
-                # Debug the tools being sent to OpenAI
-                if self.tools:
-                    tool_names = [tool.name for tool in self.tools]
-                    logger.info(f"Sending {len(self.tools)} tools to OpenAI: {tool_names}")
-                else:
-                    logger.info("No tools available to send to OpenAI")
-                
-                # Log the model being used
-                logger.info(f"Using OpenAI model: {self.config.openai.model}")
-                
-                try:
-                    # Create the completion with tools if available
-                    completion_args = {
-                        'model': self.config.openai.model,
-                        'messages': current_messages,
-                    }
-                    
+                with tracing.start_span('process.iteration', iteration=iteration_count):
+                    # Debug the tools being sent to OpenAI
                     if self.tools:
-                        completion_args['tools'] = self.openai_tools
-                        
-                    # Add tool_outputs if there are any
-                    if tool_outputs:
-                        completion_args['tool_choice'] = 'auto'
-                        
-                    completion = self.openai_client.chat.completions.create(**completion_args)
-                except Exception as e:
-                    logger.error(f"OpenAI API error: {str(e)}")
-                    if self.on_error:
-                        self.on_error(e, {"context": "OpenAI API call failure in process method"})
-                    return {
-                        "error": str(e),
-                        "messages": current_messages,
-                        "completed": False
-                    }
-
-                if not completion.choices or not completion.choices[0].message:
-                    error = RuntimeError('No response from OpenAI')
-                    if self.on_error:
-                        self.on_error(error, {"context": "Empty response from OpenAI"})
-                    raise error
-
-                last_message = completion.choices[0].message
-                
-                # Create a properly formatted message to add to the conversation history
-                assistant_message = {
-                    'role': 'assistant',
-                    'content': last_message.content or '',
-                }
+                        tool_names = [tool.name for tool in self.tools]
+                        logger.info(f"Sending {len(self.tools)} tools to OpenAI: {tool_names}")
+                    else:
+                        logger.info("No tools available to send to OpenAI")
                 
-                # Add tool_calls if present
-                if last_message.tool_calls:
-                    assistant_message['tool_calls'] = last_message.tool_calls
+                    backend = self.llm_backend
+                    logger.info(f"Using model: {backend.model}")
                 
-                # Add the assistant's message to the conversation
-                current_messages.append(assistant_message)
+                    llm_start = time.perf_counter()
+                    try:
+                        # Create the completion with tools if available
+                        async with self.llm_limiter.slot():
+                            completion = await backend.complete(
+                                current_messages.as_list(),
+                                tools=self.openai_tools if self.tools else None,
+                                tool_choice='auto' if tool_outputs else None,
+                            )
+                        LLM_LATENCY.labels(self.metrics_agent, backend.model, 'ok').observe(time.perf_counter() - llm_start)
+                    except Exception as e:
+                        LLM_LATENCY.labels(self.metrics_agent, backend.model, 'error').observe(time.perf_counter() - llm_start)
+                        logger.error(f"OpenAI API error: {str(e)}")
+                        if self.on_error:
+                            self.on_error(e, {"context": "OpenAI API call failure in process method"})
+                        return {
+                            "error": str(e),
+                            "messages": list(current_messages),
+                            "completed": False
+                        }
+
+                    # Add the assistant's message to the conversation
+                    current_messages = current_messages.with_message(completion.to_message())
                 
-                # If no tool calls, we have our final response
-                if not last_message.tool_calls:
-                    logger.info("No tool calls requested, returning completion")
-                    final_response = last_message.content
-                    break
+                    # If no tool calls, we have our final response
+                    if not completion.tool_calls:
+                        logger.info("No tool calls requested, returning completion")
+                        final_response = completion.content
+                        break
 
-                logger.info(f"OpenAI requested {len(last_message.tool_calls)} tool calls")
+                    logger.info(f"Model requested {len(completion.tool_calls)} tool calls")
                 
-                # Process all tool calls in the response
-                tool_outputs = []
-                for tool_call in last_message.tool_calls:
-                    if not tool_call.function or not tool_call.function.name:
-                        logger.warning("Tool call missing function name")
-                        continue
-
-                    tool_name = tool_call.function.name
-                    function_args = tool_call.function.arguments
-                    tool_call_id = tool_call.id
+                    # Process all tool calls in the response
+                    tool_outputs = []
+                    for tool_call in completion.tool_calls:
+                        if not tool_call.name:
+                            logger.warning("Tool call missing function name")
+                            continue
+
+                        tool_name = tool_call.name
+                        function_args = tool_call.arguments
+                        tool_call_id = tool_call.id
                     
-                    logger.info(f"Processing tool call: {tool_name}")
+                        logger.info(f"Processing tool call: {tool_name}")
                     
-                    # Find the corresponding tool
-                    tool = next((t for t in self.tools if t.name == tool_name), None)
-                    if not tool:
-                        error_msg = f"Tool not found: {tool_name}"
-                        logger.warning(error_msg)
-                        tool_outputs.append({
-                            "tool_call_id": tool_call_id,
-                            "role": "tool",
-                            "content": f"Error: {error_msg}",
-                        })
-                        continue
+                        # Find the corresponding tool
+                        tool = next((t for t in self.tools if t.name == tool_name), None)
+                        if not tool:
+                            error_msg = f"Tool not found: {tool_name}"
+                            logger.warning(error_msg)
+                            tool_outputs.append({
+                                "tool_call_id": tool_call_id,
+                                "role": "tool",
+                                "content": f"Error: {error_msg}",
+                            })
+                            continue
                     
-                    # Parse tool arguments
-                    try:
-                        if isinstance(function_args, str):
-                            try:
-                                args = json.loads(function_args)
-                            except json.JSONDecodeError:
-                                args = function_args
-                        else:
-                            args = function_args
-                            
-                        logger.info(f"Tool arguments: {args}")
-                    except Exception as e:
-                        error_msg = f"Failed to parse tool arguments: {str(e)}"
-                        logger.error(error_msg)
-                        tool_outputs.append({
-                            "tool_call_id": tool_call_id,
-                            "role": "tool",
-                            "content": f"Error: {error_msg}",
-                        })
-                        continue
+                        logger.debug(f"Tool arguments: {function_args}")
                     
-                    # Execute the tool
-                    try:
-                        result = await tool.run({"args": args}, current_messages)
-                        logger.info(f"Tool result: {result[:100]}...")
+                        # Execute the tool; the raw JSON arguments are parsed and validated in one pass
+                        try:
+                            result = await tool.run({"args": function_args}, current_messages)
+                            logger.info(f"Tool result: {result[:100]}...")
                         
-                        tool_outputs.append({
-                            "tool_call_id": tool_call_id,
-                            "role": "tool",
-                            "content": result,
-                        })
-                    except Exception as e:
-                        error_msg = f"Error executing tool: {str(e)}"
-                        logger.error(error_msg)
-                        if self.on_error:
-                            self.on_error(e, {"context": f"Tool execution failure: {tool_name}"})
-                        tool_outputs.append({
-                            "tool_call_id": tool_call_id,
-                            "role": "tool",
-                            "content": f"Error: {error_msg}",
-                        })
+                            tool_outputs.append({
+                                "tool_call_id": tool_call_id,
+                                "role": "tool",
+                                "content": result,
+                            })
+                        except Exception as e:
+                            error_msg = f"Error executing tool: {str(e)}"
+                            logger.error(error_msg)
+                            if self.on_error:
+                                self.on_error(e, {"context": f"Tool execution failure: {tool_name}"})
+                            tool_outputs.append({
+                                "tool_call_id": tool_call_id,
+                                "role": "tool",
+                                "content": f"Error: {error_msg}",
+                            })
                 
-                # Add tool responses to messages
-                for tool_output in tool_outputs:
-                    current_messages.append(tool_output)
+                    # Add tool responses to messages
+                    current_messages = current_messages.with_messages(tool_outputs)
             
             # Check if we exited the loop due to max iterations
             if iteration_count >= max_iterations and not final_response:
@@ -283,7 +363,7 @@ class Agent:
                 final_response = "Maximum number of tool calls reached without a conclusion. Please try again with a simpler request."
             
             return {
-                "messages": current_messages,
+                "messages": list(current_messages),
                 "content": final_response,
                 "completed": True
             }
@@ -293,29 +373,67 @@ class Agent:
                 self.on_error(e, {"context": "Process method failure"})
             return {
                 "error": str(e),
-                "messages": params.messages,
+                "messages": list(params.messages),
                 "completed": False
             }
+        finally:
+            # Failed loops are counted too
+            TOOL_LOOP_ITERATIONS.labels(self.metrics_agent).observe(iteration_count)
 
-    async def handle_root_route(self, body: Dict[str, Any]) -> None:
-        """Handle the root route for task execution and chat message responses."""
-        logger.info("Handling root route request with body type: %s", body.get('type'))
+    @tracing.traced('handle_root_route')
+    async def handle_root_route(self, body: Union[bytes, Dict[str, Any]]) -> None:
+        """
+        Handle the root route for task execution and chat message responses.
+        
+        The body may be the raw request bytes, which are validated in a single
+        pass, or an already decoded dict.
+        """
         try:
-            if body.get('type') == 'do-task':
+            action = parse_action(body)
+            logger.info("Handling root route request with action type: %s", action.type)
+            tracing.current_span().set_attribute('type', action.type)
+            
+            # Acknowledge repeated deliveries without running the work again
+            duplicate_of = self.deduplicator.check(action)
+            if duplicate_of:
+                logger.info(f"Ignoring duplicate {action.type} delivery; the original run is {duplicate_of}")
+                return
+            
+            # Warm the secret cache while the action waits for its turn
+            if not self.secret_cache.cached(('list', action.workspace.id)):
+                self._start_background(self.prefetch_secrets(action.workspace.id))
+            
+            if isinstance(action, DoTaskAction) and self.task_queue:
+                # Record the action durably before acknowledging it; a worker runs it
+                self.deduplicator.register(action)
+                try:
+                    await self.task_queue.put(action.type, action.raw_json or action.model_dump_json().encode('utf-8'))
+                except Exception:
+                    self.deduplicator.forget(action)
+                    raise
+                logger.info(f"Task {action.task.id} queued for processing")
+                
+            elif isinstance(action, DoTaskAction):
                 logger.info("Processing do-task action")
-                action = DoTaskAction.model_validate(body)
                 
-                # To ensure consistent behavior with TypeScript, use create_task 
+                # Don't wait for the task to finish, to match the TypeScript SDK,
                 # but add better error reporting
-                task = asyncio.create_task(self.do_task(action))
+                task = self.scheduler.submit(TASK, action.workspace.id, lambda: self._run_action(action))
+                self.deduplicator.register(action, task)
                 
                 # Add a done callback to log any errors
                 def on_task_done(t):
+                    if t.cancelled():
+                        # Stopped before finishing, e.g. at shutdown: let a redelivery run it
+                        self.deduplicator.forget(action)
+                        return
                     try:
                         # This will re-raise any exception that occurred in do_task
                         t.result()
                     except Exception as e:
                         logger.error(f"Task {action.task.id} failed: {str(e)}")
+                        # Let a redelivery try again
+                        self.deduplicator.forget(action)
                         if self.on_error:
                             try:
                                 self.on_error(e)
@@ -324,20 +442,25 @@ class Agent:
                 
                 task.add_done_callback(on_task_done)
                 
-            elif body.get('type') == 'respond-chat-message':
+            elif isinstance(action, RespondChatMessageAction):
                 logger.info("Processing respond-chat-message action")
-                action = RespondChatMessageAction.model_validate(body)
                 
-                # Fire and forget - don't await
-                chat_task = asyncio.create_task(self.respond_to_chat(action))
+                # Fire and forget - don't await; chat is scheduled ahead of tasks
+                chat_task = self.scheduler.submit(CHAT, action.workspace.id, lambda: self._run_action(action))
+                self.deduplicator.register(action, chat_task)
                 
                 # Add a done callback to log any errors
                 def on_chat_done(t):
+                    if t.cancelled():
+                        # Stopped before finishing, e.g. at shutdown: let a redelivery run it
+                        self.deduplicator.forget(action)
+                        return
                     try:
                         # This will re-raise any exception that occurred in respond_to_chat
                         t.result()
                     except Exception as e:
                         logger.error(f"Chat response failed: {str(e)}")
+                        self.deduplicator.forget(action)
                         if self.on_error:
                             try:
                                 self.on_error(e)
@@ -347,7 +470,7 @@ class Agent:
                 chat_task.add_done_callback(on_chat_done)
                 
             else:
-                raise ValueError(f'Invalid action type: {body.get("type")}')
+                raise ValueError(f'Invalid action type: {action.type}')
         except Exception as error:
             logger.error("Root route handler failed: %s", str(error), exc_info=True)
             if self.on_error:
@@ -366,28 +489,20 @@ class Agent:
                 logger.warning(f'Tool "{tool_name}" not found')
                 return {'error': f'Tool "{tool_name}" not found'}
 
-            # Parse and validate the args with the tool's schema
+            # Parse and validate the args with the tool's schema; run uses the instance as it is
             args_data = body.get('args', {})
             logger.info(f"Executing tool '{tool_name}' with args: {args_data}")
             
             try:
-                # Create a pydantic model instance to pass to the tool
-                args = tool.schema(**args_data)
-            except Exception as validation_error:
-                logger.error(f"Validation error for tool '{tool_name}': {str(validation_error)}")
-                return {'error': f"Invalid arguments: {str(validation_error)}"}
+                args = tool.validate(args_data)
+            except ValidationError as validation_error:
+                errors = validation_errors(validation_error)
+                logger.error(f"Validation error for tool '{tool_name}': {errors}")
+                summary = '; '.join(f"{e['field']}: {e['problem']}" for e in errors)
+                return {'error': f"Invalid arguments: {summary}", 'errors': errors}
             
-            # Ensure messages are in the correct format (if provided)
+            # The capability wraps the decoded messages without copying them; IDs keep their original types
             messages = body.get('messages', [])
-            # Convert any message IDs to maintain their original types (don't force string conversion)
-            formatted_messages = []
-            for msg in messages:
-                if isinstance(msg, dict):
-                    formatted_msg = dict(msg)
-                    formatted_messages.append(formatted_msg)
-                else:
-                    # If it's already a model instance, convert to dict 
-                    formatted_messages.append(msg.dict() if hasattr(msg, 'dict') else msg)
             
             # Get the action if it exists
             action = body.get('action')
@@ -396,7 +511,7 @@ class Agent:
             params = {"args": args, "action": action}
             
             # Execute the tool
-            result = await tool.run(params, formatted_messages)
+            result = await tool.run(params, messages)
             logger.info(f"Tool '{tool_name}' execution result: {result}")
             
             # Return the result in the format expected by the runtime
@@ -405,6 +520,173 @@ class Agent:
             logger.error(f"Tool route handler failed for '{tool_name}': {str(error)}", exc_info=True)
             return {'error': str(error)}
 
+    def handle_tool_stream(self, tool_name: str, body: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Start streaming execution of a tool.
+        
+        Returns an async iterator of events - ``chunk`` ({'text': ...}) and
+        ``progress`` ({'message': ..., 'fraction': ...}) as the tool produces
+        them, then ``done`` or ``error``. Raises ToolError if the tool does
+        not exist.
+        """
+        tool = next((t for t in self.tools if t.name == tool_name), None)
+        if not tool:
+            logger.warning(f'Tool "{tool_name}" not found')
+            raise ToolError(tool_name, 'Tool not found')
+        logger.info(f"Streaming tool '{tool_name}'")
+        return self._stream_tool(tool, body)
+
+    async def _stream_tool(self, tool: Capability[BaseModel], body: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        messages = MessageHistory(body.get('messages', []))
+        params = {"args": body.get('args', {}), "action": body.get('action')}
+        try:
+            async for chunk in tool.stream(params, messages):
+                if isinstance(chunk, Progress):
+                    yield {'event': 'progress', 'data': chunk.to_dict()}
+                else:
+                    yield {'event': 'chunk', 'data': {'text': chunk}}
+        except Exception as error:
+            logger.error(f"Streaming tool '{tool.name}' failed: {str(error)}", exc_info=True)
+            yield {'event': 'error', 'data': {'error': str(error)}}
+            return
+        yield {'event': 'done', 'data': {}}
+
+    async def handle_tool_batch(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Handle a batch of tool calls in one request.
+
+        ``messages`` and ``action`` at the top level of the body are shared by
+        every call; a call may override either with its own. Calls run
+        concurrently, at most ``OPENSERV_TOOL_BATCH_CONCURRENCY`` at a time,
+        and results are returned in call order, each as ``{'result': ...}``
+        or ``{'error': ...}`` like the single tool route.
+        """
+        calls = body.get('calls') or []
+        # Wrapped once so every call shares the same history by reference
+        messages = MessageHistory(body.get('messages', []))
+        action = body.get('action')
+        limit = asyncio.Semaphore(int(os.environ.get("OPENSERV_TOOL_BATCH_CONCURRENCY", "8")))
+        logger.info(f"Executing batch of {len(calls)} tool calls")
+
+        async def run_call(call: Dict[str, Any]) -> Dict[str, Any]:
+            tool_name = call.get('tool_name')
+            if not tool_name:
+                return {'error': 'Missing tool_name'}
+            item = {
+                'args': call.get('args') or {},
+                'messages': MessageHistory(call['messages']) if 'messages' in call else messages,
+                'action': call.get('action', action),
+            }
+            async with limit:
+                with tracing.start_span('tool.batch_item', tool=tool_name):
+                    return await self.handle_tool_route(tool_name, item)
+
+        results = await asyncio.gather(*(run_call(call) for call in calls), return_exceptions=True)
+        return {'results': [
+            {'error': str(result)} if isinstance(result, Exception) else result
+            for result in results
+        ]}
+
+    def submit_tool_job(self, tool_name: str, body: Dict[str, Any], callback_url: Optional[str] = None) -> Job:
+        """
+        Run a tool call in the background and return its job record.
+        
+        The job is queued with the task class of the scheduler, under the
+        workspace of the action in the body. Its outcome is kept in the job
+        store for polling and, if ``callback_url`` is set, POSTed there.
+        Raises ToolError if the tool does not exist, ValueError if the
+        callback URL is not allowed or the action is malformed and
+        JobStoreFullError if no more jobs can be accepted.
+        """
+        if not any(t.name == tool_name for t in self.tools):
+            logger.warning(f'Tool "{tool_name}" not found')
+            raise ToolError(tool_name, 'Tool not found')
+        if callback_url is not None:
+            self.callback_policy.check(callback_url)
+        action = body.get('action') or {}
+        if not isinstance(action, dict) or not isinstance(action.get('workspace') or {}, dict):
+            raise ValueError('The action and its workspace must be JSON objects')
+        workspace = (action.get('workspace') or {}).get('id')
+        if workspace is not None and (not isinstance(workspace, int) or isinstance(workspace, bool)):
+            raise ValueError('The workspace id must be an integer')
+        job = self.jobs.create(tool_name, callback_url)
+        self.scheduler.submit(TASK, workspace, lambda: self._run_job(job, body))
+        logger.info(f"Accepted job {job.id} for tool '{tool_name}'")
+        return job
+
+    async def _run_job(self, job: Job, body: Dict[str, Any]) -> None:
+        self.jobs.start(job)
+        outcome = await self.handle_tool_route(job.tool, body)
+        self.jobs.finish(job, result=outcome.get('result'), error=outcome.get('error'))
+        logger.info(f"Job {job.id} {job.status}")
+        if job.callback_url:
+            await self._deliver_job(job)
+
+    async def _deliver_job(self, job: Job, attempts: int = 3) -> None:
+        """POST a finished job to its callback URL, retrying with backoff."""
+        if self._callback_client is None:
+            # Separate from the API clients so their credentials never go to callback URLs;
+            # redirects are not followed, so a callback cannot lead off the allowed hosts
+            self._callback_client = httpx.AsyncClient(timeout=10.0, follow_redirects=False)
+        for attempt in range(attempts):
+            try:
+                response = await self._callback_client.post(job.callback_url, json=job.to_dict())
+                if response.status_code < 500:
+                    if response.is_error:
+                        logger.warning(f"Callback for job {job.id} rejected with status {response.status_code}")
+                    return
+                logger.warning(f"Callback for job {job.id} failed with status {response.status_code}")
+            except httpx.HTTPError as e:
+                logger.warning(f"Callback for job {job.id} failed: {str(e)}")
+            except Exception as e:
+                # Anything else would end the job's task with the error unreported
+                logger.exception(f"Callback for job {job.id} failed: {str(e)}")
+            if attempt + 1 < attempts:
+                await asyncio.sleep(2 ** attempt)
+        logger.error(f"Giving up on callback for job {job.id}; the result can still be polled")
+
+    async def _run_action(self, action: AgentAction) -> None:
+        """Run an accepted action once the scheduler starts it."""
+        INFLIGHT_TASKS.labels(self.metrics_agent, action.type).inc()
+        try:
+            if isinstance(action, DoTaskAction):
+                await self.do_task(action)
+            else:
+                await self.respond_to_chat(action)
+        finally:
+            INFLIGHT_TASKS.labels(self.metrics_agent, action.type).dec()
+
+    async def _run_queued_action(self, item: QueuedAction) -> None:
+        """Schedule an action taken from the durable task queue; returns when its run is done."""
+        action = parse_action(item.body)
+        logger.info(f"Running queued task {action.task.id} (queued {time.time() - item.enqueued_at:.1f}s ago)")
+        run = self.scheduler.submit(TASK, action.workspace.id, lambda: self._run_action(action))
+        self.deduplicator.register(action, run)
+        await run
+
+    async def on_startup(self) -> None:
+        """Start background services; called by the server when it starts."""
+        # Read the attachment cache directory now rather than on the first task
+        try:
+            await self.attachments.load()
+        except OSError as e:
+            logger.warning(f"Attachment cache unavailable, tasks will retry it: {str(e)}")
+        if self.task_queue:
+            await self.task_queue.start(self._run_queued_action)
+
+    async def on_shutdown(self) -> None:
+        """Stop background services; called by the server when it stops."""
+        if self.task_queue:
+            await self.task_queue.stop()
+        await self.scheduler.shutdown()
+        if self._callback_client is not None:
+            await self._callback_client.aclose()
+            self._callback_client = None
+        if not self.shared:
+            await self.attachments.close()
+        if self._llm_backend is not None:
+            await self._llm_backend.close()
+
     def start(self) -> None:
         """
         Start the server and set up signal handlers.
@@ -413,6 +695,7 @@ class Agent:
         Returns:
             None
         """
+        configure_logging()
         logger.info("Starting agent")
         
         # Set up signal handlers for graceful shutdown
@@ -461,9 +744,15 @@ class Agent:
             await self.runtime_client.close()
         except Exception as e:
             logger.error("Error during client cleanup: %s", e)
+        
+        tracing.flush()
 
+    @tracing.traced('do_task')
     async def do_task(self, action: DoTaskAction) -> None:
         """Handle a task execution request."""
+        span = tracing.current_span()
+        span.set_attribute('task_id', action.task.id)
+        span.set_attribute('workspace_id', action.workspace.id)
         logger.info(f"Handling task: {action.task.id} - '{action.task.description}'")
         
         messages = [
@@ -480,6 +769,17 @@ class Agent:
         logger.info(f"Available tools: {[tool.name for tool in self.tools]}")
 
         try:
+            # Start fetching the dependencies' attachments while the runtime works;
+            # a cache that cannot be used only costs the head start
+            try:
+                await self.attachments.prefetch(
+                    attachment.fullUrl
+                    for dependency in action.task.dependencies
+                    for attachment in dependency.attachments
+                )
+            except OSError as e:
+                logger.warning(f"Failed to prefetch attachments for task {action.task.id}: {str(e)}")
+            
             # Convert tools to JSON schema format
             tools = [self._convert_tool_to_json_schema(t) for t in self.tools]
             
@@ -492,7 +792,7 @@ class Agent:
                 task_id=action.task.id,
                 tools=tools,
                 messages=messages,
-                action=action.model_dump()
+                action=self._action_payload(action, 'execute')
             )
             logger.info(f"Runtime response: {response}")
             
@@ -500,6 +800,8 @@ class Agent:
             if not response.get('success', False):
                 error_msg = response.get('error', 'Unknown error')
                 logger.error(f"Task execution failed: {error_msg}")
+                # The failure is handled here, so let a redelivery of the task run again
+                self.deduplicator.forget(action)
                 
                 # Try to mark the task as errored
                 try:
@@ -513,6 +815,7 @@ class Agent:
             
         except Exception as error:
             logger.error(f"Task execution failed: {str(error)}", exc_info=True)
+            self.deduplicator.forget(action)
             # Try to mark the task as errored if we have an exception
             try:
                 await self.mark_task_as_errored(
@@ -523,8 +826,10 @@ class Agent:
             except Exception as mark_error:
                 logger.error(f"Failed to mark task as errored: {str(mark_error)}")
 
+    @tracing.traced('respond_to_chat')
     async def respond_to_chat(self, action: RespondChatMessageAction) -> None:
         """Handle a chat message response request."""
+        tracing.current_span().set_attribute('workspace_id', action.workspace.id)
         # Create message list with system prompt
         messages = [
             {'role': 'system', 'content': self.config.system_prompt}
@@ -565,21 +870,54 @@ class Agent:
                     logger.error(f"Local chat processing failed: {process_result['error']}")
             
             # If local processing failed or we have no tools, use the runtime
+            if self.payload_projection is not None:
+                messages = self.payload_projection.messages(messages)
             logger.info("Sending chat to runtime with %d messages", len(messages))
             response = await self.runtime_client.handle_chat(
                 tools=[self._convert_tool_to_json_schema(t) for t in self.tools],
                 messages=messages,
-                action=action.model_dump(),
+                action=self._action_payload(action, 'chat'),
                 single_use=True
             )
             
             if not response.get('success', False):
                 logger.error(f"Runtime chat processing failed: {response.get('error', 'Unknown error')}")
+                # The failure is handled here, so let a redelivery of the message run again
+                self.deduplicator.forget(action)
             
         except Exception as error:
             logger.error("Chat response failed: %s", str(error), exc_info=True)
+            self.deduplicator.forget(action)
             # Don't re-raise the error to match TypeScript behavior
 
+    def _action_payload(self, action: AgentAction, kind: str) -> Union[Dict[str, Any], RawJSON]:
+        """
+        Get the action for a runtime payload.
+        
+        Without a payload projection the original request bytes are reused
+        when available. With one, the projected action is encoded once here
+        and spliced into the payload as-is.
+        """
+        projection = self.payload_projection
+        if projection is None or not projection.changes_action:
+            if action.raw_json is not None:
+                PAYLOAD_BYTES.labels(self.metrics_agent, kind, 'full').inc(len(action.raw_json))
+                PAYLOAD_BYTES.labels(self.metrics_agent, kind, 'sent').inc(len(action.raw_json))
+                return RawJSON(action.raw_json)
+            return action.model_dump()
+        
+        if action.raw_json is not None:
+            full = json.loads(action.raw_json)
+            full_size = len(action.raw_json)
+        else:
+            full = action.model_dump(mode='json')
+            full_size = len(json.dumps(full, separators=(',', ':')))
+        projected = json.dumps(projection.apply(full), separators=(',', ':'), cls=DateTimeEncoder).encode('utf-8')
+        PAYLOAD_BYTES.labels(self.metrics_agent, kind, 'full').inc(full_size)
+        PAYLOAD_BYTES.labels(self.metrics_agent, kind, 'sent').inc(len(projected))
+        logger.debug(f"Projected {kind} action from {full_size} to {len(projected)} bytes")
+        return RawJSON(projected)
+
     @staticmethod
     def _convert_tool_to_json_schema(tool: Capability[BaseModel]) -> Dict[str, Any]:
         """
@@ -639,15 +977,67 @@ class Agent:
         response = await self.api_client.get(f"/workspaces/{workspace_id}/files")
         return self._extract_response_data(response, {})
 
+    async def iter_files(self, workspace_id: int) -> AsyncIterator[Dict[str, Any]]:
+        """Iterate over the files in a workspace as they are received, without loading the whole listing."""
+        async for item in self.api_client.iter_json_array(f"/workspaces/{workspace_id}/files"):
+            yield item
+
     async def get_secrets(self, params: GetSecretsParams) -> Dict[str, Any]:
-        """Get all secrets for an agent in a workspace."""
-        response = await self.api_client.get(f"/workspaces/{params.workspace_id}/agent-secrets")
-        return self._extract_response_data(response, {})
+        """Get all secrets for an agent in a workspace. Served from the secret cache."""
+        async def load():
+            response = await self.api_client.get(f"/workspaces/{params.workspace_id}/agent-secrets")
+            return self._extract_response_data(response, {})
+        return await self.secret_cache.get(('list', params.workspace_id), load)
 
     async def get_secret_value(self, params: GetSecretValueParams) -> str:
-        """Get the value of a secret for an agent in a workspace."""
-        response = await self.api_client.get(f"/workspaces/{params.workspace_id}/agent-secrets/{params.secret_id}/value")
-        return self._extract_response_data(response, "")
+        """Get the value of a secret for an agent in a workspace. Served from the secret cache."""
+        async def load():
+            # Values live only in the secret cache, which drops them when they expire
+            response = await self.api_client.get(
+                f"/workspaces/{params.workspace_id}/agent-secrets/{params.secret_id}/value",
+                conditional=False
+            )
+            return self._extract_response_data(response, "")
+        return await self.secret_cache.get(('value', params.workspace_id, params.secret_id), load)
+
+    async def prefetch_secrets(self, workspace_id: int) -> None:
+        """Load a workspace's secret list, and the values capabilities declare they need, into the cache."""
+        secrets = await self.get_secrets(GetSecretsParams(workspace_id=workspace_id))
+        wanted = {name for tool in self.tools for name in tool.secrets}
+        if not wanted or not isinstance(secrets, list):
+            return
+        ids = [
+            str(secret['id']) for secret in secrets
+            if isinstance(secret, dict) and 'id' in secret and secret.get('name') in wanted
+        ]
+        results = await asyncio.gather(
+            *(self.get_secret_value(GetSecretValueParams(workspace_id=workspace_id, secret_id=secret_id))
+              for secret_id in ids),
+            return_exceptions=True
+        )
+        failed = sum(isinstance(result, Exception) for result in results)
+        logger.info(f"Prefetched {len(ids) - failed} secret values for workspace {workspace_id}")
+
+    def _start_background(self, coro: Awaitable[Any]) -> None:
+        """Run best-effort background work, logging rather than raising its errors."""
+        task = asyncio.ensure_future(coro)
+        self._background.add(task)
+        
+        def on_done(t):
+            self._background.discard(t)
+            if not t.cancelled() and t.exception() is not None:
+                logger.warning(f"Background work failed: {str(t.exception())}")
+        task.add_done_callback(on_done)
+
+    async def get_attachment(self, attachment: Union[TaskAttachment, str]) -> Path:
+        """Get the local path of a task attachment (or attachment URL), downloading it if needed."""
+        url = attachment if isinstance(attachment, str) else attachment.fullUrl
+        return await self.attachments.path(url)
+
+    async def get_attachment_view(self, attachment: Union[TaskAttachment, str]) -> memoryview:
+        """Get a read-only memory-mapped view of a task attachment, downloading it if needed."""
+        url = attachment if isinstance(attachment, str) else attachment.fullUrl
+        return await self.attachments.view(url)
 
     async def upload_file(self, workspace_id: int, path: str, file: Union[str, bytes], task_ids: Optional[List[int]] = None, skip_summarizer: bool = False) -> Dict[str, Any]:
         """Upload a file to a workspace."""
@@ -666,6 +1056,11 @@ class Agent:
         response = await self.api_client.get(f"/workspaces/{workspace_id}/tasks")
         return self._extract_response_data(response, [])
 
+    async def iter_tasks(self, workspace_id: int) -> AsyncIterator[Dict[str, Any]]:
+        """Iterate over the tasks in a workspace as they are received, without loading the whole listing."""
+        async for item in self.api_client.iter_json_array(f"/workspaces/{workspace_id}/tasks"):
+            yield item
+
     async def mark_task_as_errored(self, workspace_id: int, task_id: int, error: str) -> Dict[str, Any]:
         """Mark a task as errored."""
         response = await self.api_client.post(f"/workspaces/{workspace_id}/tasks/{task_id}/error", {
@@ -711,6 +1106,11 @@ class Agent:
         response = await self.api_client.get(f"/workspaces/{params.workspace_id}/agents")
         return self._extract_response_data(response, [])
 
+    async def iter_agents(self, params: GetAgentsParams) -> AsyncIterator[Dict[str, Any]]:
+        """Iterate over the agents in a workspace as they are received, without loading the whole listing."""
+        async for item in self.api_client.iter_json_array(f"/workspaces/{params.workspace_id}/agents"):
+            yield item
+
     async def get_tasks_with_params(self, params: GetTasksParams) -> Dict[str, Any]:
         """Gets a list of tasks in a workspace."""
         response = await self.api_client.get(f"/workspaces/{params.workspace_id}/tasks")
@@ -0,0 +1,264 @@
+"""
+Local cache for task attachments.
+
+When a task starts, the agent begins downloading the attachments of its
+dependencies in the background, a few at a time, so the downloads overlap
+with the runtime round-trip. Files are stored by the SHA-256 of their
+content, so the same file attached to many tasks is kept once, and the
+cache is trimmed to a size limit by evicting the least recently used files.
+
+Capabilities get a local path with ``path`` or a read-only memory-mapped
+view with ``view``; both wait for an in-flight download instead of starting
+another one. Files left by a previous run are picked up by ``load``, which
+the agent calls at startup and which reads the directory off the event loop.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import mmap
+import os
+import tempfile
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+ATTACHMENT_LOOKUPS = REGISTRY.counter(
+    'openserv_attachment_cache_lookups_total',
+    'Attachment lookups, by result (hit, miss or shared).',
+    ('result',),
+)
+ATTACHMENT_CACHE_BYTES = REGISTRY.gauge(
+    'openserv_attachment_cache_bytes',
+    'Bytes of attachments held in the local cache.',
+)
+
+_WRITE_CHUNK = 1024 * 1024
+_INDEX_FILE = 'index.json'
+
+
+class AttachmentCache:
+    """A content-addressed on-disk cache of downloaded attachments with size-based LRU eviction."""
+
+    def __init__(self, directory: str, max_bytes: int = 1024 ** 3, concurrency: int = 4) -> None:
+        """
+        Args:
+            directory: Where cached files are stored
+            max_bytes: Size the cache is trimmed to after each download
+            concurrency: Maximum downloads running at once
+        """
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.concurrency = concurrency
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._downloads: Dict[str, asyncio.Future] = {}
+        # URL -> content digest, and digest -> size in least recently used order
+        self._index: Dict[str, str] = {}
+        self._files: 'OrderedDict[str, int]' = OrderedDict()
+        self._size = 0
+        self._loaded = False
+        self._loading: Optional[asyncio.Future] = None
+        ATTACHMENT_CACHE_BYTES.set_function(lambda: self._size)
+
+    @classmethod
+    def from_env(cls) -> 'AttachmentCache':
+        """
+        Create a cache configured from ``OPENSERV_ATTACHMENT_CACHE_DIR``,
+        ``OPENSERV_ATTACHMENT_CACHE_BYTES`` and ``OPENSERV_ATTACHMENT_CONCURRENCY``.
+        """
+        return cls(
+            os.environ.get("OPENSERV_ATTACHMENT_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "openserv-attachments"),
+            max_bytes=int(os.environ.get("OPENSERV_ATTACHMENT_CACHE_BYTES", str(1024 ** 3))),
+            concurrency=int(os.environ.get("OPENSERV_ATTACHMENT_CONCURRENCY", "4")),
+        )
+
+    async def load(self) -> None:
+        """Pick up files and the URL index left by a previous run, reading the directory in a thread."""
+        if self._loaded:
+            return
+        if self._loading is None:
+            self._loading = asyncio.ensure_future(asyncio.to_thread(self._scan))
+        loading = self._loading
+        try:
+            found = await asyncio.shield(loading)
+        except Exception:
+            # Let the next caller try again
+            if self._loading is loading:
+                self._loading = None
+            raise
+        if not self._loaded:
+            self._apply(*found)
+
+    def _load(self) -> None:
+        """``load`` for callers outside the event loop, or that need a path before it ran."""
+        self._apply(*self._scan())
+
+    def _scan(self) -> Tuple[List[Tuple[str, int]], Dict[str, str]]:
+        """The cached files, least recently used first, and the saved URL index."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and len(entry.name) == 64:
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        try:
+            index = json.loads((self.directory / _INDEX_FILE).read_text())
+        except (OSError, ValueError):
+            index = {}
+        return [(digest, size) for _, digest, size in sorted(entries)], index
+
+    def _apply(self, files: List[Tuple[str, int]], index: Dict[str, str]) -> None:
+        for digest, size in files:
+            self._files[digest] = size
+            self._size += size
+        self._index = {url: digest for url, digest in index.items() if digest in self._files}
+        self._loaded = True
+
+    def _persist(self, evicted: List[str], index: Dict[str, str]) -> None:
+        """Delete evicted files and write the URL index; runs off the event loop."""
+        for digest in evicted:
+            (self.directory / digest).unlink(missing_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=self.directory, suffix='.index')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_name, self.directory / _INDEX_FILE)
+
+    def cached_path(self, url: str) -> Optional[Path]:
+        """The local path of an already downloaded attachment, or None."""
+        if not self._loaded:
+            self._load()
+        digest = self._index.get(url)
+        if digest is None or digest not in self._files:
+            return None
+        self._files.move_to_end(digest)
+        return self.directory / digest
+
+    async def prefetch(self, urls: Iterable[str]) -> None:
+        """Start downloading any of ``urls`` that are not cached yet, without waiting for the downloads."""
+        await self.load()
+        for url in urls:
+            if self.cached_path(url) is None and url not in self._downloads:
+                self._start(url)
+
+    async def path(self, url: str) -> Path:
+        """Get the local path of an attachment, downloading it if needed."""
+        await self.load()
+        path = self.cached_path(url)
+        if path is not None:
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                # Deleted behind our back: forget it and download it again
+                self._forget(path.name)
+            else:
+                ATTACHMENT_LOOKUPS.labels('hit').inc()
+                return path
+        download = self._downloads.get(url)
+        if download is not None:
+            ATTACHMENT_LOOKUPS.labels('shared').inc()
+        else:
+            ATTACHMENT_LOOKUPS.labels('miss').inc()
+            download = self._start(url)
+        return await asyncio.shield(download)
+
+    async def view(self, url: str) -> memoryview:
+        """Get a read-only memory-mapped view of an attachment, downloading it if needed."""
+        path = await self.path(url)
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return memoryview(b'')
+            return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def _start(self, url: str) -> asyncio.Future:
+        download = asyncio.ensure_future(self._download(url))
+        self._downloads[url] = download
+
+        def on_done(t: asyncio.Future) -> None:
+            self._downloads.pop(url, None)
+            if not t.cancelled() and t.exception() is not None:
+                logger.warning(f"Failed to download attachment {url}: {str(t.exception())}")
+        download.add_done_callback(on_done)
+        return download
+
+    async def _download(self, url: str) -> Path:
+        if self._client is None:
+            # Attachment URLs are pre-signed; never send the API credentials with them
+            self._client = httpx.AsyncClient(timeout=60.0, follow_redirects=True)
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            fd, tmp_name = tempfile.mkstemp(dir=self.directory, suffix='.part')
+            digest = hashlib.sha256()
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    async with self._client.stream('GET', url) as response:
+                        response.raise_for_status()
+                        buffer = bytearray()
+                        async for chunk in response.aiter_bytes():
+                            buffer += chunk
+                            if len(buffer) >= _WRITE_CHUNK:
+                                await asyncio.to_thread(self._write, f, digest, bytes(buffer))
+                                buffer.clear()
+                        await asyncio.to_thread(self._write, f, digest, bytes(buffer))
+                return await self._commit(url, tmp_name, digest.hexdigest())
+            except BaseException:
+                Path(tmp_name).unlink(missing_ok=True)
+                raise
+
+    @staticmethod
+    def _write(f, digest, data: bytes) -> None:
+        digest.update(data)
+        f.write(data)
+
+    async def _commit(self, url: str, tmp_name: str, digest: str) -> Path:
+        path = self.directory / digest
+        evicted: List[str] = []
+        if digest in self._files:
+            # Same content under another URL: keep the copy we already have
+            await asyncio.to_thread(os.unlink, tmp_name)
+            self._files.move_to_end(digest)
+        else:
+            size = await asyncio.to_thread(self._place, tmp_name, path)
+            self._files[digest] = size
+            self._size += size
+            evicted = self._evict(keep=digest)
+        self._index[url] = digest
+        await asyncio.to_thread(self._persist, evicted, dict(self._index))
+        return path
+
+    @staticmethod
+    def _place(tmp_name: str, path: Path) -> int:
+        os.replace(tmp_name, path)
+        return path.stat().st_size
+
+    def _evict(self, keep: str) -> List[str]:
+        """Drop least recently used files until the cache fits in ``max_bytes``."""
+        evicted = []
+        while self._size > self.max_bytes and len(self._files) > 1:
+            digest, size = next(iter(self._files.items()))
+            if digest == keep:
+                break
+            self._files.popitem(last=False)
+            self._size -= size
+            evicted.append(digest)
+        if evicted:
+            self._index = {url: digest for url, digest in self._index.items() if digest in self._files}
+        return evicted
+
+    def _forget(self, digest: str) -> None:
+        self._size -= self._files.pop(digest, 0)
+        self._index = {url: known for url, known in self._index.items() if known != digest}
+
+    async def close(self) -> None:
+        for download in list(self._downloads.values()):
+            download.cancel()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
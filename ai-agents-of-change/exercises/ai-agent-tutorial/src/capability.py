@@ -1,21 +1,70 @@
-from typing import TypeVar, Protocol, Dict, Any, List, Awaitable, Union, Generic, cast
-from pydantic import BaseModel
+from typing import TypeVar, Protocol, Dict, Any, List, Awaitable, Union, Generic, Sequence, Optional, AsyncIterator, cast
+from pydantic import BaseModel, ValidationError
 import inspect
 import json
 import logging
-from .types import AgentAction, ChatMessage
+import time
+from .types import AgentAction, ChatMessage, MessageHistory
+from .metrics import CAPABILITY_LATENCY, DEFAULT_AGENT
+from . import tracing
+from .profiler import request_profiler
+from .exceptions import ToolError
 
 logger = logging.getLogger(__name__)
 
 T = TypeVar('T', bound=BaseModel)
 
+# Longest input echoed back in a validation error
+_MAX_ERROR_INPUT = 80
+
+def validation_errors(error: ValidationError) -> List[Dict[str, Any]]:
+    """
+    A compact form of a validation error for the model or API caller: one
+    entry per problem with the field path, the message and, for bad values,
+    a short copy of the value that was sent.
+    """
+    problems = []
+    for detail in error.errors(include_url=False, include_context=False):
+        problem: Dict[str, Any] = {
+            'field': '.'.join(str(part) for part in detail['loc']) or '(arguments)',
+            'problem': detail['msg'],
+        }
+        if detail['type'] != 'missing' and not isinstance(detail.get('input'), (dict, list)):
+            value = detail.get('input')
+            if isinstance(value, str) and len(value) > _MAX_ERROR_INPUT:
+                value = value[:_MAX_ERROR_INPUT] + '...'
+            problem['got'] = value
+        problems.append(problem)
+    return problems
+
+class Progress:
+    """
+    A progress update yielded by a streaming capability between output chunks.
+    
+    Progress updates are sent to streaming callers only; they are not part of
+    the capability's result.
+    """
+    __slots__ = ('message', 'fraction')
+    
+    def __init__(self, message: str = '', fraction: Optional[float] = None) -> None:
+        self.message = message
+        self.fraction = fraction
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {'message': self.message, 'fraction': self.fraction}
+
 class CapabilityFunction(Protocol[T]):
-    """Protocol defining the expected signature of a capability's run function."""
+    """
+    Protocol defining the expected signature of a capability's run function.
+    
+    The function may also be an async generator yielding output chunks and
+    ``Progress`` updates.
+    """
     def __call__(
         self,
         params: Dict[str, Union[T, AgentAction]],
-        messages: List[Dict[str, Any]]
-    ) -> Union[str, Awaitable[str]]: ...
+        messages: Sequence[Dict[str, Any]]
+    ) -> Union[str, Awaitable[str], AsyncIterator[Union[str, Progress]]]: ...
 
 class Capability(Generic[T]):
     """
@@ -29,13 +78,16 @@ class Capability(Generic[T]):
         description: A description of what the capability does
         schema: The Pydantic model class defining the capability's parameters
         run: The function that implements the capability's behavior
+        secrets: Names of the workspace secrets the capability reads
+        streaming: Whether run is an async generator producing output incrementally
     """
     def __init__(
         self,
         name: str,
         description: str,
         schema: type[T],
-        run: CapabilityFunction[T]
+        run: CapabilityFunction[T],
+        secrets: Optional[List[str]] = None
     ) -> None:
         """
         Initialize a new Capability instance.
@@ -45,6 +97,9 @@ class Capability(Generic[T]):
             description: A description of what the capability does
             schema: The Pydantic model class defining the capability's parameters
             run: The function that implements the capability's behavior
+            secrets: Names of the workspace secrets the capability reads. Their
+                values are fetched into the agent's secret cache as soon as the
+                first action for a workspace arrives.
             
         Raises:
             TypeError: If schema is not a Pydantic model class
@@ -58,9 +113,14 @@ class Capability(Generic[T]):
         self.name = name
         self.description = description
         self.schema = schema
+        self.secrets = list(secrets or [])
+        # Bound by the agent it is added to, or to the default agent on a first standalone run
+        self._latency_ok = None
+        self._latency_error = None
         
-        # Ensure run is an async function
-        if inspect.iscoroutinefunction(run):
+        # Ensure run is an async function; async generators are kept as they are
+        self.streaming = inspect.isasyncgenfunction(run)
+        if self.streaming or inspect.iscoroutinefunction(run):
             self._run = run
         else:
             # Convert sync function to async
@@ -68,7 +128,13 @@ class Capability(Generic[T]):
                 return run(args, messages)
             self._run = async_run
             
-    async def run(self, params: Dict[str, Any], messages: List[Any]) -> str:
+    def bind_metrics(self, agent: str) -> None:
+        """Record this capability's latency under ``agent``; called when it is added to an agent."""
+        self._latency_ok = CAPABILITY_LATENCY.labels(agent, self.name, 'ok')
+        self._latency_error = CAPABILITY_LATENCY.labels(agent, self.name, 'error')
+
+    @tracing.traced('capability.run')
+    async def run(self, params: Dict[str, Any], messages: Union[MessageHistory, List[Any]]) -> str:
         """
         Execute the capability with the given parameters.
         
@@ -76,69 +142,131 @@ class Capability(Generic[T]):
         
         Args:
             params: A dictionary with the arguments for the capability
-            messages: The conversation history
+            messages: The conversation history. The capability's run function receives
+                its own MessageHistory, so changing the list does not affect the caller;
+                the message dicts are shared, use ``messages.to_list()`` to modify them.
             
         Returns:
             The result of executing the capability
         """
+        start = time.perf_counter()
+        if self._latency_error is None:
+            self.bind_metrics(DEFAULT_AGENT)
+        latency = self._latency_error
+        tracing.current_span().set_attribute('capability', self.name)
         try:
-            # Extract args and action
-            args = params.get('args', {})
-            action = params.get('action')
+            run_params = self._prepare(params)
+            if isinstance(run_params, str):
+                return run_params
             
-            # If args is a string (JSON), parse it
-            if isinstance(args, str):
-                try:
-                    args = json.loads(args)
-                except json.JSONDecodeError as e:
-                    logger.error(f"Failed to parse JSON arguments: {e}")
-                    return f"Error: Invalid JSON arguments: {str(e)}"
-            
-            # If args is already a Pydantic model instance of the right type, use it directly
-            if isinstance(args, self.schema):
-                validated_args = args
-            else:
-                # Otherwise validate args with the schema
-                try:
-                    validated_args = self.schema(**args)
-                except Exception as e:
-                    logger.error(f"Validation error for {self.name}: {str(e)}")
-                    return f"Error: Invalid arguments: {str(e)}"
-            
-            # Ensure messages are properly formatted
-            formatted_messages = []
-            for msg in messages:
-                if isinstance(msg, dict):
-                    formatted_messages.append(msg)
-                elif hasattr(msg, 'dict') or hasattr(msg, 'model_dump'):
-                    # Handle both Pydantic v1 and v2 models
-                    if hasattr(msg, 'model_dump'):
-                        formatted_messages.append(msg.model_dump())
-                    else:
-                        formatted_messages.append(msg.dict())
-                else:
-                    formatted_messages.append(msg)
-            
-            # Prepare params with validated args
-            run_params = {"args": validated_args, "action": action}
+            # The run function gets its own list; the message dicts are not copied
+            messages = MessageHistory(messages)
             
             # Execute the capability's run function
-            result = await self._run(run_params, formatted_messages)
-            
-            # Ensure result is a string
-            if not isinstance(result, str):
-                logger.warning(f"Capability {self.name} returned non-string result, converting to string")
-                if hasattr(result, 'model_dump'):
-                    # Pydantic v2
-                    result = json.dumps(result.model_dump())
-                elif hasattr(result, 'dict'):
-                    # Pydantic v1
-                    result = json.dumps(result.dict())
+            with request_profiler.profile_request('capability', self.name):
+                if self.streaming:
+                    # Callers that need the whole result get the chunks joined
+                    chunks = []
+                    stream = self._run(run_params, messages)
+                    try:
+                        async for chunk in stream:
+                            if not isinstance(chunk, Progress):
+                                chunks.append(self._to_text(chunk))
+                    finally:
+                        await stream.aclose()
+                    result = ''.join(chunks)
                 else:
-                    # Other types
-                    result = str(result)
+                    result = self._to_text(await self._run(run_params, messages))
                     
+            latency = self._latency_ok
             return result
         except Exception as e:
             logger.exception(f"Error executing capability {self.name}")
             return f"Error executing {self.name}: {str(e)}"
+        finally:
+            latency.observe(time.perf_counter() - start)
+
+    async def stream(
+        self,
+        params: Dict[str, Any],
+        messages: Union[MessageHistory, List[Any]]
+    ) -> AsyncIterator[Union[str, Progress]]:
+        """
+        Execute the capability, yielding output chunks and progress updates as they are produced.
+        
+        Capabilities whose run function is not an async generator yield their
+        whole result as a single chunk. Unlike ``run``, errors are raised
+        rather than returned as text.
+        
+        Args:
+            params: A dictionary with the arguments for the capability
+            messages: The conversation history
+        """
+        start = time.perf_counter()
+        if self._latency_error is None:
+            self.bind_metrics(DEFAULT_AGENT)
+        latency = self._latency_error
+        try:
+            run_params = self._prepare(params)
+            if isinstance(run_params, str):
+                raise ToolError(self.name, run_params)
+            messages = MessageHistory(messages)
+            
+            if self.streaming:
+                # Closed explicitly so the run function's cleanup happens now, not when collected
+                stream = self._run(run_params, messages)
+                try:
+                    async for chunk in stream:
+                        yield chunk if isinstance(chunk, Progress) else self._to_text(chunk)
+                finally:
+                    await stream.aclose()
+            else:
+                yield self._to_text(await self._run(run_params, messages))
+            latency = self._latency_ok
+        finally:
+            latency.observe(time.perf_counter() - start)
+
+    def validate(self, args: Union[str, bytes, Dict[str, Any], T]) -> T:
+        """
+        Validate arguments in a single pass with the schema's compiled validator.
+        
+        A JSON string, as the model sends it, is parsed and validated in one
+        step without building an intermediate dict; an instance of the schema
+        is returned as it is. Raises pydantic's ValidationError.
+        """
+        if isinstance(args, self.schema):
+            return args
+        if isinstance(args, (str, bytes)):
+            # Models send an empty string for tools without parameters
+            return self.schema.model_validate_json(args if args.strip() else '{}')
+        return self.schema.model_validate(args if args is not None else {})
+
+    def _prepare(self, params: Dict[str, Any]) -> Union[Dict[str, Any], str]:
+        """Validate the arguments in ``params``; returns the run params, or an error message."""
+        try:
+            validated_args = self.validate(params.get('args', {}))
+        except ValidationError as e:
+            logger.warning(f"Invalid arguments for {self.name}: {e.error_count()} errors")
+            # Structured, so the model can correct every field in one retry
+            return json.dumps({
+                'error': 'invalid_arguments',
+                'tool': self.name,
+                'errors': validation_errors(e),
+            }, default=str)
+        
+        # Prepare params with validated args
+        return {"args": validated_args, "action": params.get('action')}
+
+    def _to_text(self, result: Any) -> str:
+        """Ensure a result or output chunk is a string."""
+        if isinstance(result, str):
+            return result
+        logger.warning(f"Capability {self.name} returned non-string result, converting to string")
+        if hasattr(result, 'model_dump'):
+            # Pydantic v2
+            return json.dumps(result.model_dump())
+        if hasattr(result, 'dict'):
+            # Pydantic v1
+            return json.dumps(result.dict())
+        # Other types
+        return str(result)
@@ -2,49 +2,341 @@
 API client implementations for OpenServ and Runtime services.
 """
 
+import asyncio
+import codecs
+import gzip
 import httpx
-from typing import Any, Dict, Optional, List
+from typing import Any, AsyncIterator, Dict, Optional, List, Tuple, Union
 from .config import APIConfig
 from .exceptions import APIError, AuthenticationError
 import logging
 import json
+import os
+import time
+from collections import OrderedDict
 from datetime import datetime
+from .metrics import (
+    DEFAULT_AGENT, UPSTREAM_LATENCY, POOL_CONNECTIONS, CONDITIONAL_REQUESTS, CONDITIONAL_BYTES_SAVED,
+    REQUEST_BODY_BYTES, path_template
+)
+from . import tracing
+from .limiter import AdaptiveLimiter
 
-# Configure logging to show INFO and above
-logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
-# Set httpx logger to debug level
-logging.getLogger("httpx").setLevel(logging.ERROR)
-logging.getLogger("httpcore").setLevel(logging.ERROR)
+class RawJSON:
+    """Already-encoded JSON that is spliced into a request body as-is."""
+    __slots__ = ('data',)
 
-logger = logging.getLogger(__name__)
+    def __init__(self, data: bytes):
+        self.data = data
 
 class DateTimeEncoder(json.JSONEncoder):
     def default(self, obj):
         if isinstance(obj, datetime):
             return obj.isoformat()
+        if isinstance(obj, RawJSON):
+            return json.loads(obj.data)
         return super().default(obj)
 
+def encode_json(data: Any) -> bytes:
+    """
+    Encode a request body, splicing top-level RawJSON values in without
+    decoding and re-encoding them.
+    """
+    if isinstance(data, dict) and any(isinstance(v, RawJSON) for v in data.values()):
+        parts = []
+        for key, value in data.items():
+            encoded = value.data if isinstance(value, RawJSON) else json.dumps(value, cls=DateTimeEncoder).encode('utf-8')
+            parts.append(json.dumps(key).encode('utf-8') + b':' + encoded)
+        return b'{' + b','.join(parts) + b'}'
+    return json.dumps(data, cls=DateTimeEncoder).encode('utf-8')
+
+def _zstd_compressor():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard.ZstdCompressor(level=3)
+
+def compress_body(data: bytes, encoding: str) -> bytes:
+    """Compress a request body with ``gzip`` or ``zstd``."""
+    if encoding == 'zstd':
+        return _zstd_compressor().compress(data)
+    return gzip.compress(data, compresslevel=5)
+
+class JSONArrayParser:
+    """
+    Incrementally decodes a streamed JSON array, returning each item as soon
+    as it is complete. Only the unfinished tail of the stream is buffered.
+    
+    An array wrapped in an object, ``{"data": [...]}``, is streamed the same
+    way; the object's other fields are decoded whole and dropped. An object
+    without ``data`` is returned as the only item once it is complete, and
+    any other body is buffered whole and returned by ``close``.
+    """
+    _WHITESPACE = ' \t\n\r'
+    _DELIMITERS = _WHITESPACE + ',]}'
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._state = 'start'
+        # Fields of a wrapping object, and whether its data array is the one being streamed
+        self._envelope: Optional[Dict[str, Any]] = None
+        self._key: Optional[str] = None
+        self._streamed = False
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        """Add bytes from the stream; returns the items completed by them."""
+        self._buffer += self._text.decode(chunk)
+        if self._state == 'whole':
+            return []
+        items = []
+        buffer = self._buffer
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in self._WHITESPACE:
+                pos += 1
+            if pos == len(buffer) or self._state == 'done':
+                break
+            char = buffer[pos]
+            state = self._state
+            if state == 'start':
+                if char == '[':
+                    self._state = 'first'
+                elif char == '{':
+                    self._state = 'first-key'
+                    self._envelope = {}
+                else:
+                    # Not an array: fall back to decoding the whole body at the end
+                    self._state = 'whole'
+                    return items
+                pos += 1
+            elif char == ']' and state in ('first', 'separator'):
+                self._state = 'done' if self._envelope is None else 'fields'
+                pos += 1
+            elif state == 'separator':
+                if char != ',':
+                    raise ValueError(f"Expected ',' or ']' in JSON array, got {char!r}")
+                self._state = 'item'
+                pos += 1
+            elif state in ('first', 'item'):
+                decoded = self._decode(buffer, pos)
+                if decoded is None:
+                    break
+                item, pos = decoded
+                items.append(item)
+                self._state = 'separator'
+            elif char == '}' and state in ('first-key', 'fields'):
+                self._state = 'done'
+                pos += 1
+                items.extend(self._unwrap())
+            elif state == 'fields':
+                if char != ',':
+                    raise ValueError(f"Expected ',' or '}}' in JSON object, got {char!r}")
+                self._state = 'key'
+                pos += 1
+            elif state in ('first-key', 'key'):
+                if char != '"':
+                    raise ValueError(f"Expected a key in JSON object, got {char!r}")
+                decoded = self._decode(buffer, pos)
+                if decoded is None:
+                    break
+                self._key, pos = decoded
+                self._state = 'colon'
+            elif state == 'colon':
+                if char != ':':
+                    raise ValueError(f"Expected ':' in JSON object, got {char!r}")
+                self._state = 'value'
+                pos += 1
+            elif self._key == 'data' and char == '[' and not self._streamed:
+                self._streamed = True
+                self._state = 'first'
+                pos += 1
+            else:
+                decoded = self._decode(buffer, pos)
+                if decoded is None:
+                    break
+                self._envelope[self._key], pos = decoded
+                self._state = 'fields'
+        self._buffer = buffer[pos:]
+        return items
+
+    def _decode(self, buffer: str, pos: int) -> Optional[Tuple[Any, int]]:
+        """The value at ``pos`` and the position after it, or None if it may not be complete yet."""
+        try:
+            value, end = self._decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            return None
+        # A number or literal only ends at a delimiter: "0." may continue as "0.5" in the next chunk
+        if not isinstance(value, (str, list, dict)) and (end == len(buffer) or buffer[end] not in self._DELIMITERS):
+            return None
+        return value, end
+
+    def _unwrap(self) -> List[Any]:
+        """The items of a wrapping object that were not streamed."""
+        if self._streamed:
+            return []
+        if 'data' in self._envelope:
+            data = self._envelope['data']
+            return data if isinstance(data, list) else [data]
+        return [self._envelope]
+
+    def close(self) -> List[Any]:
+        """Signal the end of the stream; returns any remaining items."""
+        self._buffer += self._text.decode(b'', final=True)
+        if self._state == 'whole':
+            data = json.loads(self._buffer)
+            return data if isinstance(data, list) else [data]
+        # The space ends a number at the very end of the stream
+        items = self.feed(b' ')
+        if self._state == 'start' and not self._buffer.strip():
+            return items
+        if self._state != 'done':
+            raise ValueError("Invalid or truncated JSON array")
+        return items
+
+class _CachedResponse:
+    __slots__ = ('validators', 'content_type', 'content')
+
+    def __init__(self, validators: Dict[str, str], content_type: str, content: bytes):
+        self.validators = validators
+        self.content_type = content_type
+        self.content = content
+
+class ConditionalCache:
+    """
+    Validators and bodies of recent GET responses, so repeated GETs can be
+    sent as conditional requests and a 304 answered from the local copy.
+    
+    Holds at most ``max_bytes`` of response bodies, evicting the least
+    recently used. Responses marked ``Cache-Control: no-store`` are never kept.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[str, _CachedResponse]' = OrderedDict()
+        self._size = 0
+
+    def get(self, key: str) -> Optional[_CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def store(self, key: str, response: httpx.Response) -> None:
+        self.discard(key)
+        validators = {}
+        if 'etag' in response.headers:
+            validators['If-None-Match'] = response.headers['etag']
+        if 'last-modified' in response.headers:
+            validators['If-Modified-Since'] = response.headers['last-modified']
+        if not validators or 'no-store' in response.headers.get('cache-control', ''):
+            return
+        content = response.content
+        if len(content) > self.max_bytes:
+            return
+        self._entries[key] = _CachedResponse(validators, response.headers.get('content-type', ''), content)
+        self._size += len(content)
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted.content)
+
+    def discard(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry.content)
+
+def pool_connections(transport: Any, idle: bool) -> int:
+    """Count idle or active connections in the pool behind an httpx transport."""
+    connections = getattr(getattr(transport, '_pool', None), 'connections', None) or []
+    return sum(1 for c in connections if c.is_idle() == idle)
+
+class SharedTransport(httpx.AsyncBaseTransport):
+    """
+    A connection pool used by several clients. Closing a client leaves the
+    pool open; its owner closes it with ``close``. The pool's connections
+    are reported once, with agent="host" and client="shared".
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self.transport = transport
+        for state, idle in (('active', False), ('idle', True)):
+            POOL_CONNECTIONS.labels('host', 'shared', state).set_function(
+                lambda idle=idle: pool_connections(self.transport, idle)
+            )
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self.transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        await self.transport.aclose()
+
+    @property
+    def _pool(self):
+        # Read by the pool connection metrics
+        return getattr(self.transport, '_pool', None)
+
 class BaseClient:
     """Base class for API clients."""
-    def __init__(self, config: APIConfig):
+    # Label used for this client's upstream and pool metrics
+    metrics_name = 'base'
+
+    def __init__(self, config: APIConfig, transport: Optional[SharedTransport] = None, agent: str = DEFAULT_AGENT):
         self.config = config
-        # Create client without base_url, will be set by subclasses
+        # Agent label of this client's metrics
+        self.metrics_agent = agent
+        # Create client without base_url, will be set by subclasses. Each
+        # client keeps its own credentials even when the pool is shared.
         self.client = httpx.AsyncClient(
             headers={
                 'Content-Type': 'application/json',
                 'x-openserv-key': config.api_key
             },
-            timeout=30.0  # Set a reasonable default timeout
+            timeout=30.0,  # Set a reasonable default timeout
+            transport=transport
         )
+        # Local copies of GET responses for conditional requests; 0 disables them
+        cache_bytes = int(os.environ.get("OPENSERV_HTTP_CACHE_BYTES", str(64 * 1024 * 1024)))
+        self.conditional_cache = ConditionalCache(cache_bytes) if cache_bytes > 0 else None
+        # Optional request body compression: gzip or zstd, for bodies of at least min_bytes
+        self.compression = os.environ.get("OPENSERV_REQUEST_COMPRESSION", "").lower() or None
+        if self.compression == 'zstd' and _zstd_compressor() is None:
+            logger.warning("zstandard is not installed; compressing request bodies with gzip instead")
+            self.compression = 'gzip'
+        elif self.compression not in (None, 'gzip', 'zstd'):
+            logger.warning(f"Unknown request compression '{self.compression}'; sending bodies uncompressed")
+            self.compression = None
+        self.compression_min_bytes = int(os.environ.get("OPENSERV_REQUEST_COMPRESSION_MIN_BYTES", "16384"))
+        self.compression_thread_bytes = int(os.environ.get("OPENSERV_REQUEST_COMPRESSION_THREAD_BYTES", "262144"))
+        # Hosts that rejected an encoding, mapped to the one they accept (None for none)
+        self._host_encodings: Dict[str, Optional[str]] = {}
+        if transport is None:
+            # A shared pool reports itself
+            for state, idle in (('active', False), ('idle', True)):
+                POOL_CONNECTIONS.labels(agent, self.metrics_name, state).set_function(
+                    lambda idle=idle: pool_connections(self.client._transport, idle)
+                )
     
     async def close(self):
         """Close the HTTP client."""
         await self.client.aclose()
     
-    async def get(self, path: str, params: Optional[Dict[str, str]] = None) -> Optional[Dict[str, Any]]:
-        """Make a GET request to the API."""
-        return await self._request('GET', path, params=params)
+    async def get(self, path: str, params: Optional[Dict[str, str]] = None, conditional: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Make a GET request to the API.
+        
+        Responses with an ETag or Last-Modified header are kept, and the next
+        GET of the same URL is sent as a conditional request; a 304 is then
+        answered from the kept copy. Pass ``conditional=False`` for responses
+        that must not be kept, such as secret values.
+        """
+        return await self._request('GET', path, params=params, conditional=conditional)
         
     async def post(self, path: str, json_data: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
         """Make a POST request to the API."""
@@ -54,6 +346,90 @@ class BaseClient:
         """Make a PUT request to the API."""
         return await self._request('PUT', path, json_data=json_data)
     
+    async def iter_json_array(self, path: str, params: Optional[Dict[str, str]] = None) -> AsyncIterator[Any]:
+        """
+        GET a JSON array, or an array wrapped as ``{"data": [...]}``, and
+        yield its items as they arrive.
+        
+        The response is streamed and parsed incrementally, so memory use is
+        bounded by the largest item rather than the whole listing.
+        """
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            async with self.client.stream('GET', path, params=params, headers=tracing.inject({})) as response:
+                status = str(response.status_code)
+                if response.is_error:
+                    await response.aread()
+                    self._raise_for_status(
+                        response, f"HTTP error {response.status_code} for GET {response.request.url}"
+                    )
+                parser = JSONArrayParser()
+                async for chunk in response.aiter_bytes():
+                    for item in parser.feed(chunk):
+                        yield item
+                for item in parser.close():
+                    yield item
+        except httpx.RequestError as e:
+            logger.error(f"Request error: {str(e)}")
+            raise APIError(f"Request failed: {str(e)}")
+        except ValueError as e:
+            logger.error(f"JSON decode error: {str(e)}")
+            raise APIError(f"Invalid JSON response: {str(e)}")
+        finally:
+            UPSTREAM_LATENCY.labels(self.metrics_agent, self.metrics_name, 'GET', path_template(path), status).observe(
+                time.perf_counter() - start
+            )
+    
+    def _host(self, path: str) -> str:
+        url = httpx.URL(path)
+        return url.netloc.decode('ascii') if url.is_absolute_url else self.client.base_url.netloc.decode('ascii')
+    
+    async def _encode_body(self, content: bytes, host: str) -> Tuple[bytes, Optional[str]]:
+        """Compress a request body if it is large enough and the host accepts it; returns (body, encoding)."""
+        encoding = self._host_encodings.get(host, self.compression)
+        if encoding is None or len(content) < self.compression_min_bytes:
+            return content, None
+        if len(content) >= self.compression_thread_bytes:
+            # Large bodies would block the event loop for milliseconds
+            body = await asyncio.to_thread(compress_body, content, encoding)
+        else:
+            body = compress_body(content, encoding)
+        REQUEST_BODY_BYTES.labels(self.metrics_agent, self.metrics_name, 'uncompressed').inc(len(content))
+        REQUEST_BODY_BYTES.labels(self.metrics_agent, self.metrics_name, 'sent').inc(len(body))
+        return body, encoding
+    
+    def _encoding_rejected(self, host: str, encoding: str, response: httpx.Response) -> None:
+        """Remember that a host refused an encoding, and which one it offers instead (RFC 7694)."""
+        offered = [e.split(';')[0].strip().lower() for e in response.headers.get('accept-encoding', '').split(',')]
+        fallback = next((e for e in ('zstd', 'gzip') if e in offered and e != encoding), None)
+        if fallback == 'zstd' and _zstd_compressor() is None:
+            fallback = 'gzip' if 'gzip' in offered and encoding != 'gzip' else None
+        self._host_encodings[host] = fallback
+        logger.info(f"{host} does not accept {encoding} request bodies; using {fallback or 'no compression'}")
+    
+    def _raise_for_status(self, response: httpx.Response, message: str) -> None:
+        """Raise AuthenticationError or APIError for an error response."""
+        if response.status_code == 401:
+            raise AuthenticationError("Invalid API key")
+        
+        # Try to get error details from response
+        error_details = None
+        try:
+            if response.content:
+                error_details = response.json()
+        except json.JSONDecodeError:
+            # If response is not JSON, use text content
+            error_details = {'error': response.text} if response.text else None
+            
+        logger.error(f"HTTP error {response.status_code}: {error_details}")
+        raise APIError(
+            message,
+            status_code=response.status_code,
+            response=error_details
+        )
+    
+    @tracing.traced('http.request')
     async def _request(
         self,
         method: str,
@@ -61,13 +437,20 @@ class BaseClient:
         json_data: Optional[Dict[str, Any]] = None,
         params: Optional[Dict[str, str]] = None,
         files: Optional[Dict[str, Any]] = None,
+        conditional: bool = False,
     ) -> Optional[Dict[str, Any]]:
         """Make an HTTP request and handle common error cases."""
-        logger = logging.getLogger(__name__)
+        start = time.perf_counter()
+        status = 'error'
+        span = tracing.current_span()
+        span.set_attribute('client', self.metrics_name)
+        span.set_attribute('method', method)
+        span.set_attribute('path', path_template(path))
         try:
             # Pre-serialize JSON with our custom encoder
             content = None
-            headers = {}
+            # Propagate the trace context to the platform and runtime
+            headers = tracing.inject({})
             
             # Handle file uploads with multipart/form-data
             if files is not None:
@@ -79,24 +462,78 @@ class BaseClient:
                     params=params,
                     files=files,
                     data=json_data,  # For file uploads, json_data is sent as form fields
+                    headers=headers,
                 )
             else:
+                # Revalidate a kept copy instead of downloading the body again
+                cache_key = cached = None
+                if conditional and self.conditional_cache is not None:
+                    cache_key = str(httpx.URL(path, params=params))
+                    cached = self.conditional_cache.get(cache_key)
+                    if cached is not None:
+                        headers.update(cached.validators)
+                
                 # Normal JSON request
                 if json_data is not None:
-                    content = json.dumps(json_data, cls=DateTimeEncoder).encode('utf-8')
+                    content = encode_json(json_data)
                     headers['Content-Type'] = 'application/json'
                     logger.debug(f"Sending {method} request to {path} with data size: {len(content)} bytes")
                 else:
                     logger.debug(f"Sending {method} request to {path} without data")
 
+                encoding = None
+                body = content
+                if content is not None and self.compression:
+                    host = self._host(path)
+                    body, encoding = await self._encode_body(content, host)
+                    if encoding:
+                        headers['Content-Encoding'] = encoding
+                        span.set_attribute('content_encoding', encoding)
+                
                 response = await self.client.request(
                     method,
                     path,
-                    content=content,
+                    content=body,
                     params=params,
                     headers=headers,
                 )
+                
+                if encoding and response.status_code == 415:
+                    # The host does not take this encoding: resend the way it accepts
+                    self._encoding_rejected(host, encoding, response)
+                    headers.pop('Content-Encoding')
+                    body, encoding = await self._encode_body(content, host)
+                    if encoding:
+                        headers['Content-Encoding'] = encoding
+                    response = await self.client.request(
+                        method,
+                        path,
+                        content=body,
+                        params=params,
+                        headers=headers,
+                    )
+                
+                if cached is not None and response.status_code == 304:
+                    CONDITIONAL_REQUESTS.labels(self.metrics_agent, self.metrics_name, 'not_modified').inc()
+                    CONDITIONAL_BYTES_SAVED.labels(self.metrics_agent, self.metrics_name).inc(len(cached.content))
+                    span.set_attribute('not_modified', True)
+                    # Continue as if the kept copy had just been downloaded
+                    response = httpx.Response(
+                        200,
+                        headers={'content-type': cached.content_type},
+                        content=cached.content,
+                        request=response.request,
+                    )
+                elif cache_key is not None:
+                    if cached is not None:
+                        CONDITIONAL_REQUESTS.labels(self.metrics_agent, self.metrics_name, 'modified').inc()
+                    if response.status_code == 200:
+                        self.conditional_cache.store(cache_key, response)
+                    else:
+                        self.conditional_cache.discard(cache_key)
             
+            status = str(response.status_code)
+            span.set_attribute('status', response.status_code)
             logger.info(f"Response status: {response.status_code}")
             logger.debug(f"Response headers: {response.headers}")
             
@@ -105,13 +542,14 @@ class BaseClient:
                 logger.info("Received 204 No Content response")
                 return {"success": True}
                 
-            logger.debug(f"Response content size: {len(response.content)} bytes")
-            
             # Log the actual content for debugging, but limit length
-            if len(response.content) < 1000:
-                logger.debug(f"Response content: {response.content}")
-            else:
-                logger.debug(f"Response content (truncated): {response.content[:1000]}...")
+            if logger.isEnabledFor(logging.DEBUG):
+                body = response.content
+                logger.debug(f"Response content size: {len(body)} bytes")
+                if len(body) < 1000:
+                    logger.debug(f"Response content: {body}")
+                else:
+                    logger.debug(f"Response content (truncated): {body[:1000]}...")
             
             response.raise_for_status()
             
@@ -162,35 +600,24 @@ class BaseClient:
                 return {'success': True}
                 
         except httpx.HTTPStatusError as e:
-            if e.response.status_code == 401:
-                raise AuthenticationError("Invalid API key")
-            
-            # Try to get error details from response
-            error_details = None
-            try:
-                if e.response.content:
-                    error_details = e.response.json()
-            except json.JSONDecodeError:
-                # If response is not JSON, use text content
-                error_details = {'error': e.response.text} if e.response.text else None
-                
-            logger.error(f"HTTP error {e.response.status_code}: {error_details}")
-            raise APIError(
-                str(e),
-                status_code=e.response.status_code,
-                response=error_details
-            )
+            self._raise_for_status(e.response, str(e))
         except httpx.RequestError as e:
             logger.error(f"Request error: {str(e)}")
             raise APIError(f"Request failed: {str(e)}")
         except json.JSONDecodeError as e:
             logger.error(f"JSON decode error: {str(e)}")
             raise APIError(f"Invalid JSON response: {str(e)}")
+        finally:
+            UPSTREAM_LATENCY.labels(self.metrics_agent, self.metrics_name, method, path_template(path), status).observe(
+                time.perf_counter() - start
+            )
 
 class OpenServClient(BaseClient):
     """Client for the OpenServ Platform API."""
-    def __init__(self, config: APIConfig):
-        super().__init__(config)
+    metrics_name = 'platform'
+
+    def __init__(self, config: APIConfig, transport: Optional[SharedTransport] = None, agent: str = DEFAULT_AGENT):
+        super().__init__(config, transport, agent)
         # Make sure the base URL doesn't end with a slash
         self.client.base_url = httpx.URL(config.platform_url.rstrip('/'))
         logger.info(f"Platform client initialized with base URL: {config.platform_url}")
@@ -234,11 +661,15 @@ class OpenServClient(BaseClient):
 
 class RuntimeClient(BaseClient):
     """Client for the OpenServ Runtime API."""
-    def __init__(self, config: APIConfig):
-        super().__init__(config)
+    metrics_name = 'runtime'
+
+    def __init__(self, config: APIConfig, transport: Optional[SharedTransport] = None, agent: str = DEFAULT_AGENT):
+        super().__init__(config, transport, agent)
         # Make sure the base URL doesn't end with a slash
         # and append /runtime to match TypeScript SDK
         self.client.base_url = httpx.URL(f"{config.runtime_url.rstrip('/')}/runtime")
+        # Shared by execute and chat calls; backs off when the runtime throttles or slows down
+        self.limiter = AdaptiveLimiter.from_env('runtime', 'RUNTIME', agent=agent)
         
         # Log base URL for debugging
         logger.info(f"Runtime client initialized with base URL: {self.client.base_url}")
@@ -248,15 +679,17 @@ class RuntimeClient(BaseClient):
         else:
             logger.warning("API key is missing or too short")
     
+    @tracing.traced('runtime.execute_task')
     async def execute_task(
         self,
         workspace_id: int,
         task_id: int,
         tools: List[Dict[str, Any]],
         messages: List[Dict[str, Any]],
-        action: Dict[str, Any]
+        action: Union[Dict[str, Any], RawJSON]
     ) -> Dict[str, Any]:
         """Execute a task on the runtime."""
+        tracing.current_span().set_attribute('task_id', task_id)
         logger.info(f"Executing task {task_id} for workspace {workspace_id}")
         logger.info(f"Tools provided: {', '.join([t.get('name', 'unknown') for t in tools])}")
         logger.info(f"Number of messages: {len(messages)}")
@@ -272,11 +705,13 @@ class RuntimeClient(BaseClient):
         }
         
         # Log request details at debug level
-        logger.debug(f"Execute task payload: {json.dumps(payload, cls=DateTimeEncoder)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Execute task payload: {json.dumps(payload, cls=DateTimeEncoder)}")
         
         try:
             # Note: Path is now just /execute since /runtime is part of the base URL
-            response = await self.post('/execute', json_data=payload)
+            async with self.limiter.slot():
+                response = await self.post('/execute', json_data=payload)
             logger.info(f"Task execution successful for task {task_id}")
             return {'success': True, 'data': response}
         except AuthenticationError as auth_err:
@@ -297,11 +732,12 @@ class RuntimeClient(BaseClient):
             logger.exception(f"Unexpected error executing task: {str(e)}")
             return {'success': False, 'error': str(e)}
     
+    @tracing.traced('runtime.handle_chat')
     async def handle_chat(
         self,
         tools: List[Dict[str, Any]],
         messages: List[Dict[str, str]],
-        action: Dict[str, Any],
+        action: Union[Dict[str, Any], RawJSON],
         single_use: bool = False
     ) -> Optional[Dict[str, Any]]:
         """Handle a chat request."""
@@ -316,11 +752,13 @@ class RuntimeClient(BaseClient):
             payload["single_use"] = True
         
         logger.info(f"Sending chat request with {len(messages)} messages and {len(tools)} tools")
-        logger.debug(f"Chat request payload: {json.dumps(payload, cls=DateTimeEncoder)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Chat request payload: {json.dumps(payload, cls=DateTimeEncoder)}")
         
         try:
             # Note: Path is now just /chat since /runtime is part of the base URL
-            response = await self.post('/chat', json_data=payload)
+            async with self.limiter.slot():
+                response = await self.post('/chat', json_data=payload)
             logger.info("Chat request successful")
             
             # Check if we have a response - this is optional since the runtime might handle sending the response directly
@@ -24,11 +24,15 @@ class ServerConfig(BaseModel):
     host: str = Field(default='0.0.0.0')
     log_level: str = Field(default='debug')
     reload: bool = Field(default=False)
+    # Bearer token required on the agent's routes; unset leaves them open
+    auth_token: Optional[str] = Field(default_factory=lambda: os.getenv('OPENSERV_AUTH_TOKEN'))
 
 class OpenAIConfig(BaseModel):
     """OpenAI configuration settings."""
     api_key: Optional[str] = Field(default_factory=lambda: os.getenv('OPENAI_API_KEY'))
     model: str = Field(default='gpt-4o')
+    # Any OpenAI-compatible endpoint; unset uses OpenAI
+    base_url: Optional[str] = Field(default_factory=lambda: os.getenv('OPENAI_BASE_URL'))
 
 class Config(BaseModel):
     """Main configuration class combining all settings."""
@@ -0,0 +1,91 @@
+"""
+Deduplication of repeated root-route deliveries.
+
+The platform may deliver the same do-task (same task id) or the same chat
+message (same workspace and last message id) more than once. The
+deduplicator remembers recently accepted deliveries for a bounded TTL
+window so repeats can be acknowledged without running the work again.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from .metrics import DEFAULT_AGENT, REGISTRY
+from .types import AgentAction, DoTaskAction, RespondChatMessageAction
+
+DUPLICATE_DELIVERIES = REGISTRY.counter(
+    'openserv_duplicate_deliveries_total',
+    'Root-route deliveries suppressed as duplicates, by agent, action type and state of the original run.',
+    ('agent', 'type', 'state'),
+)
+
+
+class DeliveryDeduplicator:
+    """Remembers recently accepted actions for ``ttl`` seconds, up to ``max_entries``."""
+
+    def __init__(self, ttl: float = 600.0, max_entries: int = 10000, agent: str = DEFAULT_AGENT) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.agent = agent
+        # key -> (expires_at, run task or None while queued); insertion order is expiry order
+        self._entries: 'OrderedDict[str, Tuple[float, Optional[asyncio.Task]]]' = OrderedDict()
+
+    @staticmethod
+    def key_for(action: AgentAction) -> Optional[str]:
+        """The identity of a delivery, or None if it cannot be deduplicated."""
+        if isinstance(action, DoTaskAction):
+            return f'task:{action.task.id}'
+        if isinstance(action, RespondChatMessageAction) and action.messages:
+            return f'chat:{action.workspace.id}:{action.messages[-1].id}'
+        return None
+
+    def _evict(self, now: float) -> None:
+        entries = self._entries
+        while entries:
+            key, (expires_at, _) = next(iter(entries.items()))
+            if expires_at > now and len(entries) <= self.max_entries:
+                break
+            entries.popitem(last=False)
+
+    def check(self, action: AgentAction) -> Optional[str]:
+        """
+        Check whether ``action`` repeats a recent delivery.
+
+        Returns None for a new delivery, or the state of the original run -
+        ``queued``, ``inflight`` or ``completed`` - for a duplicate, which is
+        also counted in the duplicate-deliveries metric.
+        """
+        key = self.key_for(action)
+        if key is None or self.ttl <= 0:
+            return None
+        self._evict(time.monotonic())
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        task = entry[1]
+        if task is None:
+            state = 'queued'
+        elif task.done():
+            state = 'completed'
+        else:
+            state = 'inflight'
+        DUPLICATE_DELIVERIES.labels(self.agent, action.type, state).inc()
+        return state
+
+    def register(self, action: AgentAction, task: Optional[asyncio.Task] = None) -> None:
+        """Remember an accepted delivery and the task running it, if any."""
+        key = self.key_for(action)
+        if key is None or self.ttl <= 0:
+            return
+        self._entries.pop(key, None)
+        self._entries[key] = (time.monotonic() + self.ttl, task)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def forget(self, action: AgentAction) -> None:
+        """Drop a delivery so a redelivery is run again, e.g. after it failed."""
+        key = self.key_for(action)
+        if key is not None:
+            self._entries.pop(key, None)
@@ -35,3 +35,15 @@ class ValidationError(OpenServError):
 class RuntimeError(OpenServError):
     """Raised when there's a runtime error."""
     pass 
+
+class ConcurrencyLimitError(OpenServError):
+    """Raised when a call waited too long for a slot under an adaptive concurrency limit."""
+    pass
+
+class JobStoreFullError(OpenServError):
+    """Raised when no more asynchronous jobs can be accepted until running ones finish."""
+    pass
+
+class TaskQueueClosedError(OpenServError):
+    """Raised when an action is written to a durable task queue that is not running."""
+    pass
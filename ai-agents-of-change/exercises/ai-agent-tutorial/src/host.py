@@ -0,0 +1,195 @@
+"""
+Run several agents in one process.
+
+Each agent on its own starts a server, an HTTP connection pool per API
+client and an OpenAI connection pool. ``AgentHost`` mounts many agents on
+one server instead:
+
+    host = AgentHost()
+    research = host.create_agent(AgentOptions(name='research', system_prompt=..., api_key=...))
+    research.add_capability(...)
+    writer = host.create_agent(AgentOptions(name='writer', system_prompt=..., api_key=...))
+    host.start()
+
+Requests reach an agent under ``/agents/<name>/`` (e.g. ``POST
+/agents/research/tools/search``), or on the usual paths with an
+``x-openserv-agent: <name>`` header. The agents share one connection pool
+for the platform and runtime APIs, one for the LLM provider and the
+attachment cache, while each keeps its own API keys, auth token,
+capabilities, limits and scheduler. The host counts requests and their latency per agent, and
+every agent's own metrics carry an ``agent`` label with its name.
+"""
+
+import logging
+import os
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .agent import Agent
+from .attachments import AttachmentCache
+from .client import SharedTransport
+from .config import ServerConfig
+from .logger import configure_logging
+from .loop_monitor import loop_monitor
+from .metrics import REGISTRY, CONTENT_TYPE
+from .types import AgentOptions
+
+logger = logging.getLogger(__name__)
+
+HOST_REQUESTS = REGISTRY.histogram(
+    'openserv_host_request_seconds',
+    'Latency of requests to hosted agents, by agent and status code.',
+    ('agent', 'status'),
+)
+
+AGENT_HEADER = 'x-openserv-agent'
+_NAME = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+class SharedResources:
+    """Connection pools and caches used by all agents of a host."""
+
+    def __init__(self) -> None:
+        self.max_connections = int(os.environ.get("OPENSERV_HOST_MAX_CONNECTIONS", "200"))
+        self.max_keepalive = int(os.environ.get("OPENSERV_HOST_MAX_KEEPALIVE", "40"))
+        self.transport = SharedTransport(httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_keepalive)
+        ))
+        self.attachments = AttachmentCache.from_env()
+        self._llm_http_client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def llm_http_client(self) -> httpx.AsyncClient:
+        """The HTTP client behind every agent's LLM backend; API keys are still sent per agent."""
+        if self._llm_http_client is None:
+            import openai
+            self._llm_http_client = openai.DefaultAsyncHttpxClient(
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_keepalive)
+            )
+        return self._llm_http_client
+
+    async def close(self) -> None:
+        await self.transport.close()
+        await self.attachments.close()
+        if self._llm_http_client is not None:
+            await self._llm_http_client.aclose()
+            self._llm_http_client = None
+
+
+class _HeaderRouting:
+    """Send requests with an agent header to that agent's mount point."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] == 'http' and not scope['path'].startswith('/agents/'):
+            for key, value in scope['headers']:
+                if key == AGENT_HEADER.encode():
+                    name = value.decode('latin-1')
+                    # Only a plain name may become part of the path
+                    if not _NAME.match(name):
+                        response = JSONResponse({'detail': f'Invalid {AGENT_HEADER} header'}, status_code=400)
+                        await response(scope, receive, send)
+                        return
+                    prefix = f"/agents/{name}"
+                    scope = dict(scope, path=prefix + scope['path'], raw_path=prefix.encode() + scope.get('raw_path', b''))
+                    break
+        await self.app(scope, receive, send)
+
+
+class AgentHost:
+    """One server for several agents, routed by path prefix or header."""
+
+    def __init__(self, config: Optional[ServerConfig] = None) -> None:
+        self.config = config or ServerConfig()
+        self.shared = SharedResources()
+        self.agents: Dict[str, Agent] = {}
+        self.app = FastAPI(lifespan=self._lifespan)
+        self._server: Optional[uvicorn.Server] = None
+
+        @self.app.get("/health")
+        async def health():
+            """Health check endpoint."""
+            return {"status": "up", "version": "1.0.0", "agents": sorted(self.agents)}
+
+        @self.app.get("/metrics")
+        async def metrics():
+            """Metrics of all agents in the Prometheus text exposition format."""
+            return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+        self.app.add_middleware(BaseHTTPMiddleware, dispatch=self._record)
+        self.app.add_middleware(_HeaderRouting)
+
+    def create_agent(self, options: AgentOptions) -> Agent:
+        """Create an agent that uses the host's shared pools and mount it under ``/agents/<name>``."""
+        name = options.name
+        if not name or not _NAME.match(name):
+            raise ValueError(f'Hosted agents need a name of letters, digits, "-" or "_", got {name!r}')
+        if name in self.agents:
+            raise ValueError(f'Agent with name "{name}" already exists')
+        if self._server is not None:
+            raise RuntimeError('Agents must be added before the host starts')
+        agent = Agent(options, shared=self.shared)
+        self.agents[name] = agent
+        # The host runs the agents' startup and shutdown; mounted apps get no lifespan events
+        self.app.mount(f"/agents/{name}", agent.server.app)
+        logger.info(f"Hosting agent {name} at /agents/{name}")
+        return agent
+
+    async def _record(self, request: Request, call_next):
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            parts = request.url.path.split('/', 3)
+            agent = parts[2] if len(parts) > 2 and parts[1] == 'agents' and parts[2] in self.agents else 'none'
+            HOST_REQUESTS.labels(agent, str(status)).observe(time.perf_counter() - start)
+
+    @asynccontextmanager
+    async def _lifespan(self, app: FastAPI):
+        """Start and stop every agent's background services with the server."""
+        monitor_enabled = os.environ.get("OPENSERV_LOOP_MONITOR", "1") != "0"
+        if monitor_enabled:
+            loop_monitor.start()
+        for agent in self.agents.values():
+            await agent.on_startup()
+        try:
+            yield
+        finally:
+            for name, agent in self.agents.items():
+                try:
+                    await agent.on_shutdown()
+                    await agent.api_client.close()
+                    await agent.runtime_client.close()
+                except Exception as e:
+                    logger.error(f"Error stopping agent {name}: {str(e)}")
+            await self.shared.close()
+            if monitor_enabled:
+                await loop_monitor.stop()
+
+    def start(self) -> None:
+        """Run the server until it is stopped; uvicorn handles SIGINT and SIGTERM."""
+        configure_logging()
+        if not self.agents:
+            raise RuntimeError('No agents to host')
+        logger.info(f"Agent host starting on port {self.config.port} with agents: {', '.join(self.agents)}")
+        self._server = uvicorn.Server(uvicorn.Config(
+            self.app,
+            host=self.config.host,
+            port=self.config.port,
+            log_level="info"
+        ))
+        self._server.run()
@@ -0,0 +1,160 @@
+"""
+Records of asynchronous tool jobs.
+
+A tool called in async mode returns a job id straight away and runs in the
+background. Its record holds the status and, once finished, the result or
+error until it is polled or expires. The store is bounded: finished jobs are
+kept for ``ttl`` seconds and evicted oldest first when the store is full,
+and new jobs are refused while it is full of unfinished ones.
+
+A finished job can also be POSTed to a ``callback_url`` given with the
+call. The agent would otherwise send requests to any address a caller
+names, including internal ones, so callbacks go only to the hosts listed in
+``OPENSERV_CALLBACK_HOSTS`` (comma-separated; ``*.example.com`` matches
+subdomains) and are refused while it is unset.
+"""
+
+import os
+import secrets
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence
+
+import httpx
+
+from .exceptions import JobStoreFullError
+from .metrics import DEFAULT_AGENT, REGISTRY
+
+JOBS = REGISTRY.gauge(
+    'openserv_jobs',
+    'Asynchronous tool jobs held in the job store, by agent and status.',
+    ('agent', 'status'),
+)
+
+PENDING = 'pending'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+
+class Job:
+    """An asynchronous tool call and its outcome."""
+    __slots__ = ('id', 'tool', 'status', 'created_at', 'finished_at', 'result', 'error', 'callback_url')
+
+    def __init__(self, tool: str, callback_url: Optional[str] = None) -> None:
+        # Unguessable, since the record holds the tool's output
+        self.id = secrets.token_urlsafe(16)
+        self.tool = tool
+        self.status = PENDING
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.result: Optional[str] = None
+        self.error: Optional[Any] = None
+        self.callback_url = callback_url
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (COMPLETED, FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            'job_id': self.id,
+            'tool': self.tool,
+            'status': self.status,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+        }
+        if self.status == COMPLETED:
+            data['result'] = self.result
+        elif self.status == FAILED:
+            data['error'] = self.error
+        return data
+
+
+class CallbackPolicy:
+    """The hosts that job results may be POSTed to."""
+
+    def __init__(self, hosts: Sequence[str] = ()) -> None:
+        self.hosts = [host.strip().lower() for host in hosts if host.strip()]
+
+    @classmethod
+    def from_env(cls) -> 'CallbackPolicy':
+        return cls(os.environ.get("OPENSERV_CALLBACK_HOSTS", "").split(','))
+
+    def allows(self, host: str) -> bool:
+        host = host.lower()
+        for allowed in self.hosts:
+            if allowed.startswith('*.'):
+                if host.endswith(allowed[1:]):
+                    return True
+            elif host == allowed:
+                return True
+        return False
+
+    def check(self, url: str) -> None:
+        """Raise ValueError unless ``url`` is an http(s) URL on an allowed host."""
+        if not self.hosts:
+            raise ValueError('Callbacks are disabled; set OPENSERV_CALLBACK_HOSTS to allow them')
+        try:
+            parsed = httpx.URL(url)
+        except (httpx.InvalidURL, TypeError):
+            raise ValueError('callback_url is not a valid URL')
+        if parsed.scheme not in ('http', 'https') or not parsed.host:
+            raise ValueError('callback_url must be an http(s) URL')
+        if not self.allows(parsed.host):
+            raise ValueError(f'callback_url host {parsed.host} is not allowed')
+
+
+class JobStore:
+    """Holds up to ``max_jobs`` job records; finished ones expire after ``ttl`` seconds."""
+
+    def __init__(self, ttl: float = 3600.0, max_jobs: int = 1000, agent: str = DEFAULT_AGENT) -> None:
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self._jobs: Dict[str, Job] = {}
+        # Finished job ids in the order they finished, i.e. expiry order
+        self._finished: 'OrderedDict[str, float]' = OrderedDict()
+        for status in (PENDING, RUNNING, COMPLETED, FAILED):
+            JOBS.labels(agent, status).set_function(lambda s=status: self.count(s))
+
+    def count(self, status: str) -> int:
+        return sum(1 for job in self._jobs.values() if job.status == status)
+
+    def _evict(self, now: float) -> None:
+        finished = self._finished
+        while finished:
+            job_id, finished_at = next(iter(finished.items()))
+            if finished_at + self.ttl > now and len(self._jobs) < self.max_jobs:
+                break
+            finished.popitem(last=False)
+            self._jobs.pop(job_id, None)
+
+    def create(self, tool: str, callback_url: Optional[str] = None) -> Job:
+        """Record a new pending job. Raises JobStoreFullError if the store is full of unfinished jobs."""
+        self._evict(time.time())
+        if len(self._jobs) >= self.max_jobs:
+            raise JobStoreFullError(f"Job store is full ({self.max_jobs} unfinished jobs)")
+        job = Job(tool, callback_url)
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._evict(time.time())
+        return self._jobs.get(job_id)
+
+    def start(self, job: Job) -> None:
+        job.status = RUNNING
+
+    def finish(self, job: Job, result: Optional[str] = None, error: Optional[Any] = None) -> None:
+        job.finished_at = time.time()
+        if error is not None:
+            job.status = FAILED
+            job.error = error
+        else:
+            job.status = COMPLETED
+            job.result = result
+        if job.id in self._jobs:
+            self._finished[job.id] = job.finished_at
+
+    def __len__(self) -> int:
+        return len(self._jobs)
@@ -0,0 +1,210 @@
+"""
+Adaptive concurrency limits for outbound calls.
+
+When the LLM provider or the OpenServ runtime starts throttling or slowing
+down, sending at full concurrency only makes it worse. ``AdaptiveLimiter``
+caps the number of calls in flight and tunes the cap with AIMD (additive
+increase, multiplicative decrease):
+
+- every successful call grows the limit by roughly one per round-trip
+- a throttling response (429/503) cuts the limit by ``backoff``, at most
+  once per baseline round-trip
+- once per ``window`` successful calls, the median latency of those calls
+  is compared with the baseline: the lowest such median seen, drifting up
+  slowly. A median more than ``latency_tolerance`` times the baseline cuts
+  the limit, and the limit holds until a later window is fast again
+
+Single slow calls never cut the limit; latency that merely varies a lot
+leaves the median, and so the limit, where it is.
+
+Callers over the limit wait in line for up to ``max_wait`` seconds instead
+of failing right away; only then is ``ConcurrencyLimitError`` raised.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Deque, Optional
+
+from .exceptions import ConcurrencyLimitError
+from .metrics import DEFAULT_AGENT, REGISTRY
+
+logger = logging.getLogger(__name__)
+
+CONCURRENCY_LIMIT = REGISTRY.gauge(
+    'openserv_concurrency_limit',
+    'Current adaptive concurrency limit, by agent and limiter.',
+    ('agent', 'limiter'),
+)
+CONCURRENCY_INFLIGHT = REGISTRY.gauge(
+    'openserv_concurrency_inflight',
+    'Calls currently holding a slot of the adaptive limiter, by agent and limiter.',
+    ('agent', 'limiter'),
+)
+CONCURRENCY_THROTTLED = REGISTRY.counter(
+    'openserv_concurrency_throttled_total',
+    'Calls that came back throttled or too slow and reduced the limit, by agent and limiter.',
+    ('agent', 'limiter'),
+)
+
+THROTTLE_STATUS_CODES = (429, 503)
+
+
+def is_throttled(error: BaseException) -> bool:
+    """Whether an error is a throttling response from the upstream service."""
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status in THROTTLE_STATUS_CODES
+
+
+class _Slot:
+    __slots__ = ('limiter', 'start')
+
+    def __init__(self, limiter: 'AdaptiveLimiter') -> None:
+        self.limiter = limiter
+        self.start = 0.0
+
+    async def __aenter__(self) -> '_Slot':
+        await self.limiter.acquire()
+        self.start = time.monotonic()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        latency = time.monotonic() - self.start
+        if exc is None:
+            self.limiter.release(latency)
+        elif is_throttled(exc):
+            self.limiter.release(latency, throttled=True)
+        else:
+            # Other failures say nothing about capacity
+            self.limiter.release(None)
+
+
+class AdaptiveLimiter:
+    """An AIMD concurrency limiter that queues callers over the limit."""
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: float = 8,
+        min_limit: float = 1,
+        max_limit: float = 64,
+        backoff: float = 0.7,
+        latency_tolerance: float = 2.0,
+        max_wait: float = 10.0,
+        window: int = 100,
+        agent: str = DEFAULT_AGENT,
+    ) -> None:
+        self.name = name
+        self.agent = agent
+        self.limit = float(initial_limit)
+        self.min_limit = float(min_limit)
+        self.max_limit = float(max_limit)
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self.baseline: Optional[float] = None
+        self._window: Deque[float] = deque(maxlen=max(1, window))
+        self._congested = False
+        self._last_decrease = 0.0
+        self._waiters: Deque[asyncio.Future] = deque()
+        CONCURRENCY_LIMIT.labels(agent, name).set_function(lambda: self.limit)
+        CONCURRENCY_INFLIGHT.labels(agent, name).set_function(lambda: self.in_flight)
+        self._throttled = CONCURRENCY_THROTTLED.labels(agent, name)
+
+    @classmethod
+    def from_env(cls, name: str, prefix: str, agent: str = DEFAULT_AGENT, **defaults: float) -> 'AdaptiveLimiter':
+        """
+        Create a limiter configured from ``OPENSERV_<prefix>_CONCURRENCY``,
+        ``OPENSERV_<prefix>_CONCURRENCY_MAX`` and ``OPENSERV_<prefix>_CONCURRENCY_WAIT``.
+        """
+        options = dict(defaults)
+        for suffix, option in (('', 'initial_limit'), ('_MAX', 'max_limit'), ('_WAIT', 'max_wait')):
+            value = os.environ.get(f"OPENSERV_{prefix}_CONCURRENCY{suffix}")
+            if value:
+                options[option] = float(value)
+        return cls(name, agent=agent, **options)
+
+    def slot(self) -> _Slot:
+        """Hold a slot for the duration of an ``async with`` block."""
+        return _Slot(self)
+
+    def try_acquire(self) -> bool:
+        """Take a slot only if one is free right now, without waiting in line."""
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return True
+        return False
+
+    async def acquire(self) -> None:
+        if self.try_acquire():
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.max_wait)
+        except asyncio.TimeoutError:
+            raise ConcurrencyLimitError(
+                f"Timed out after {self.max_wait}s waiting for a {self.name} slot (limit {int(self.limit)})"
+            )
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # We were handed a slot just as we got cancelled; pass it on
+                self.in_flight -= 1
+                self._wake()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self, latency: Optional[float], throttled: bool = False) -> None:
+        """Return a slot, adjusting the limit from the call's latency and outcome."""
+        self.in_flight -= 1
+        if latency is not None:
+            self._adjust(latency, throttled)
+        self._wake()
+
+    def report_throttled(self, latency: float) -> None:
+        """Count a throttling response to a call whose slot ended without an error, e.g. a lost hedge."""
+        self._decrease(latency, 'throttled')
+
+    def _adjust(self, latency: float, throttled: bool) -> None:
+        if throttled:
+            self._decrease(latency, 'throttled')
+            return
+        window = self._window
+        window.append(latency)
+        if len(window) == window.maxlen:
+            ordered = sorted(window)
+            median = ordered[len(ordered) // 2]
+            window.clear()
+            # The baseline follows the fastest windows and drifts up slowly
+            if self.baseline is None or median < self.baseline:
+                self.baseline = median
+            else:
+                self.baseline += (median - self.baseline) * 0.05
+            self._congested = median > self.baseline * self.latency_tolerance
+            if self._congested:
+                self._decrease(median, f'median latency {median:.2f}s')
+        if not self._congested:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def _decrease(self, latency: float, reason: str) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < (self.baseline or latency):
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+        self._throttled.inc()
+        logger.info(f"{self.name} limit reduced to {self.limit:.1f} ({reason})")
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
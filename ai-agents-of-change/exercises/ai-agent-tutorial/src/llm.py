@@ -0,0 +1,370 @@
+"""
+LLM backends for the process tool loop.
+
+``Agent.process`` asks an ``LLMBackend`` for each completion instead of
+calling OpenAI directly. Two backends are included:
+
+- ``OpenAIBackend`` talks to OpenAI or any OpenAI-compatible endpoint
+  (vLLM, a regional gateway, a local server) through ``base_url``, with the
+  async client so waiting calls don't hold threads
+- ``ScriptedBackend`` answers from a script without the network, with
+  optional latency, to benchmark and load-test the tool loop offline
+
+A script is JSON:
+
+    {
+        "latency_ms": 300,
+        "jitter_ms": 100,
+        "seed": 1,
+        "steps": [
+            {"tool_calls": [{"name": "search", "arguments": {"query": "rust"}}]},
+            {"content": "Here is what I found..."}
+        ]
+    }
+
+Each conversation replays the steps from the start: the step is chosen by
+the number of assistant turns since the last user or system message, so
+concurrent conversations don't interfere and the same input always gets the
+same answer. Past the end of the script the last step repeats.
+
+The agent picks ``AgentOptions.llm_backend`` if set, then a script named by
+``OPENSERV_LLM_SCRIPT``, and otherwise OpenAI with ``OPENAI_BASE_URL``.
+
+``HedgedBackend`` wraps any of them to cut tail latency: when a completion
+takes longer than a percentile of recent ones, an identical second request
+is sent and whichever answers first is used. It is enabled with
+``OPENSERV_LLM_HEDGE_PERCENTILE`` (e.g. 95).
+"""
+
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Sequence
+
+import httpx
+
+from .limiter import AdaptiveLimiter, is_throttled
+from .metrics import DEFAULT_AGENT, REGISTRY
+
+logger = logging.getLogger(__name__)
+
+LLM_HEDGES = REGISTRY.counter(
+    'openserv_llm_hedges_total',
+    'Hedged completion requests, by outcome: sent, won (the hedge answered first), '
+    'lost (the original answered first) or over_budget (not sent), by agent.',
+    ('agent', 'outcome'),
+)
+
+
+class ToolCall:
+    """A function call requested by the model."""
+    __slots__ = ('id', 'name', 'arguments')
+
+    def __init__(self, id: str, name: str, arguments: str):
+        self.id = id
+        self.name = name
+        # JSON-encoded, as the model produced it
+        self.arguments = arguments
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'id': self.id, 'type': 'function', 'function': {'name': self.name, 'arguments': self.arguments}}
+
+
+class Completion:
+    """The assistant message of a completion."""
+    __slots__ = ('content', 'tool_calls')
+
+    def __init__(self, content: Optional[str], tool_calls: Sequence[ToolCall] = ()):
+        self.content = content
+        self.tool_calls = list(tool_calls)
+
+    def to_message(self) -> Dict[str, Any]:
+        """The message to add to the conversation history."""
+        message: Dict[str, Any] = {'role': 'assistant', 'content': self.content or ''}
+        if self.tool_calls:
+            message['tool_calls'] = [call.to_dict() for call in self.tool_calls]
+        return message
+
+
+class LLMBackend:
+    """Produces the next assistant message for a conversation."""
+    # Label for latency metrics
+    model: str = 'unknown'
+
+    async def complete(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        tool_choice: Optional[str] = None,
+    ) -> Completion:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class OpenAIBackend(LLMBackend):
+    """Chat completions from OpenAI or an OpenAI-compatible endpoint."""
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str,
+        base_url: Optional[str] = None,
+        http_client: Optional[httpx.AsyncClient] = None,
+    ) -> None:
+        """
+        Args:
+            api_key: API key for the endpoint
+            model: Model name sent with each request
+            base_url: OpenAI-compatible API root, e.g. ``http://localhost:8000/v1``
+            http_client: Connection pool to use instead of a private one; left open on ``close``
+        """
+        # Imported here: the openai package is slow to import
+        import openai
+        self.model = model
+        self._owns_client = http_client is None
+        self.client = openai.AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client)
+
+    async def complete(self, messages, tools=None, tool_choice=None) -> Completion:
+        args: Dict[str, Any] = {'model': self.model, 'messages': messages}
+        if tools:
+            args['tools'] = tools
+        if tool_choice:
+            args['tool_choice'] = tool_choice
+        response = await self.client.chat.completions.create(**args)
+        if not response.choices or not response.choices[0].message:
+            raise ValueError('No response from the model')
+        message = response.choices[0].message
+        return Completion(message.content, [
+            ToolCall(call.id, call.function.name, call.function.arguments)
+            for call in message.tool_calls or ()
+            if call.function
+        ])
+
+    async def close(self) -> None:
+        if self._owns_client:
+            await self.client.close()
+
+
+class ScriptedBackend(LLMBackend):
+    """Replays scripted completions with injected latency; never touches the network."""
+
+    def __init__(
+        self,
+        steps: Sequence[Dict[str, Any]],
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        seed: int = 0,
+        model: str = 'scripted',
+    ) -> None:
+        """
+        Args:
+            steps: ``{"content": ...}`` or ``{"tool_calls": [{"name": ..., "arguments": {...}}]}`` per turn
+            latency: Seconds each completion takes
+            jitter: Up to this many extra seconds per completion, drawn from a seeded generator
+            seed: Seed for the jitter
+        """
+        if not steps:
+            raise ValueError('A scripted backend needs at least one step')
+        self.completions = [self._completion(index, step) for index, step in enumerate(steps)]
+        self.latency = latency
+        self.jitter = jitter
+        self.model = model
+        self.calls = 0
+        self._random = random.Random(seed)
+
+    @classmethod
+    def from_file(cls, path: str) -> 'ScriptedBackend':
+        with open(path) as f:
+            script = json.load(f)
+        return cls(
+            script['steps'],
+            latency=script.get('latency_ms', 0) / 1000,
+            jitter=script.get('jitter_ms', 0) / 1000,
+            seed=script.get('seed', 0),
+        )
+
+    @staticmethod
+    def _completion(index: int, step: Dict[str, Any]) -> Completion:
+        calls = [
+            ToolCall(
+                f"call_{index}_{i}",
+                call['name'],
+                call['arguments'] if isinstance(call.get('arguments'), str) else json.dumps(call.get('arguments', {})),
+            )
+            for i, call in enumerate(step.get('tool_calls', ()))
+        ]
+        return Completion(step.get('content'), calls)
+
+    async def complete(self, messages, tools=None, tool_choice=None) -> Completion:
+        self.calls += 1
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+        turn = 0
+        for message in reversed(messages):
+            role = message.get('role')
+            if role in ('user', 'system'):
+                break
+            if role == 'assistant':
+                turn += 1
+        return self.completions[min(turn, len(self.completions) - 1)]
+
+
+class HedgedBackend(LLMBackend):
+    """
+    Sends a second, identical request when a completion is slower than a
+    percentile of recent completions, and uses whichever answers first.
+
+    Hedges are paid for from a budget: each completion adds ``budget`` to a
+    credit and each hedge spends one, so at most about ``budget`` of all
+    requests are hedged, with short bursts up to ``burst``. A hedge also
+    needs a free slot of ``limiter``, taken without waiting; the original
+    request runs under the caller's slot. Throttling of either request is
+    reported to the limiter.
+
+    The hedge delay is a percentile of how long original requests take. An
+    original cut off because its hedge answered first counts as slower than
+    every completed one, so hedging does not pull its own threshold down.
+    """
+
+    def __init__(
+        self,
+        backend: LLMBackend,
+        percentile: float = 95.0,
+        budget: float = 0.05,
+        min_samples: int = 20,
+        window: int = 200,
+        burst: float = 5.0,
+        limiter: Optional[AdaptiveLimiter] = None,
+        agent: str = DEFAULT_AGENT,
+    ) -> None:
+        """
+        Args:
+            backend: The backend to hedge
+            percentile: Hedge after this percentile of recent latency
+            budget: Largest share of requests to hedge
+            min_samples: Completions to observe before hedging at all
+            window: Recent completions the percentile is taken over
+            burst: Most hedges that can be saved up
+            limiter: Concurrency limiter of the LLM calls; hedges take a slot of their own
+            agent: Agent label of the hedge metrics
+        """
+        self.backend = backend
+        self.model = backend.model
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.burst = burst
+        self.limiter = limiter
+        self._credit = 0.0
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._hedges = {outcome: LLM_HEDGES.labels(agent, outcome) for outcome in ('sent', 'won', 'lost', 'over_budget')}
+
+    @classmethod
+    def from_env(
+        cls,
+        backend: LLMBackend,
+        agent: str = DEFAULT_AGENT,
+        limiter: Optional[AdaptiveLimiter] = None,
+    ) -> LLMBackend:
+        """
+        Wrap ``backend`` if ``OPENSERV_LLM_HEDGE_PERCENTILE`` is set, with
+        ``OPENSERV_LLM_HEDGE_BUDGET`` and ``OPENSERV_LLM_HEDGE_MIN_SAMPLES``.
+        """
+        percentile = float(os.environ.get("OPENSERV_LLM_HEDGE_PERCENTILE") or 0)
+        if percentile <= 0 or isinstance(backend, cls):
+            return backend
+        return cls(
+            backend,
+            percentile=percentile,
+            budget=float(os.environ.get("OPENSERV_LLM_HEDGE_BUDGET", "0.05")),
+            min_samples=int(os.environ.get("OPENSERV_LLM_HEDGE_MIN_SAMPLES", "20")),
+            limiter=limiter,
+            agent=agent,
+        )
+
+    def hedge_delay(self) -> Optional[float]:
+        """How long to wait before hedging, or None while there are too few samples."""
+        if len(self._latencies) < self.min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        delay = ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))]
+        # The percentile falls among requests that were cut off: not enough is known to hedge
+        return delay if delay != math.inf else None
+
+    async def complete(self, messages, tools=None, tool_choice=None) -> Completion:
+        self._credit = min(self.burst, self._credit + self.budget)
+        start = time.monotonic()
+        delay = self.hedge_delay()
+        primary = asyncio.ensure_future(self.backend.complete(messages, tools, tool_choice))
+        primary.add_done_callback(lambda request: self._record(request, start))
+        hedge: Optional[asyncio.Future] = None
+        try:
+            if delay is not None:
+                await asyncio.wait((primary,), timeout=delay)
+                if not primary.done():
+                    hedge = self._send_hedge(messages, tools, tool_choice)
+            if hedge is None:
+                return await primary
+            return await self._first(primary, hedge, start)
+        finally:
+            # Stop the slower request; its answer is no longer needed
+            for request in (primary, hedge):
+                if request is not None and not request.done():
+                    request.cancel()
+
+    def _record(self, request: asyncio.Future, start: float) -> None:
+        if not request.cancelled() and request.exception() is None:
+            self._latencies.append(time.monotonic() - start)
+
+    def _send_hedge(self, messages, tools, tool_choice) -> Optional[asyncio.Future]:
+        if self._credit < 1 or (self.limiter is not None and not self.limiter.try_acquire()):
+            self._hedges['over_budget'].inc()
+            return None
+        self._credit -= 1
+        self._hedges['sent'].inc()
+        hedge = asyncio.ensure_future(self.backend.complete(messages, tools, tool_choice))
+        if self.limiter is not None:
+            # Released when the hedge ends, even if it is cancelled before it starts
+            hedge.add_done_callback(lambda request, start=time.monotonic(): self._release(request, start))
+        return hedge
+
+    def _release(self, request: asyncio.Future, start: float) -> None:
+        if request.cancelled() or (request.exception() is not None and not is_throttled(request.exception())):
+            # Other failures say nothing about capacity
+            self.limiter.release(None)
+        else:
+            self.limiter.release(time.monotonic() - start, throttled=request.exception() is not None)
+
+    async def _first(self, primary: asyncio.Future, hedge: asyncio.Future, start: float) -> Completion:
+        """The first successful answer, or the primary's error if both fail."""
+        pending = {primary, hedge}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            # Prefer the primary when both land together, and read every error so none goes unreported
+            for request in sorted(done, key=lambda r: r is not primary):
+                if request.exception() is None:
+                    if request is primary:
+                        self._hedges['lost'].inc()
+                        return request.result()
+                    self._hedges['won'].inc()
+                    if not primary.done():
+                        # Cut off, so only known to be slower than its hedge
+                        self._latencies.append(math.inf)
+                    elif self.limiter is not None and is_throttled(primary.exception()):
+                        # The caller's slot ends without an error, so it would never see this
+                        self.limiter.report_throttled(time.monotonic() - start)
+                    return request.result()
+        if primary.exception() is not None:
+            raise primary.exception()
+        raise hedge.exception()
+
+    async def close(self) -> None:
+        await self.backend.close()
@@ -21,5 +21,28 @@ def create_logger() -> logging.Logger:
     
     return logger
 
-# Create default logger instance
-logger = create_logger() 
+def configure_logging() -> None:
+    """
+    Configure root logging for a running agent.
+
+    Called when the agent starts rather than at import time, so importing the
+    library never touches the application's logging setup. Uses the
+    OPENSERV_LOG_LEVEL environment variable, defaulting to INFO.
+    """
+    log_level = os.environ.get("OPENSERV_LOG_LEVEL", "INFO").upper()
+    logging.basicConfig(
+        level=getattr(logging, log_level, logging.INFO),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    # Keep the HTTP client libraries quiet
+    logging.getLogger("httpx").setLevel(logging.ERROR)
+    logging.getLogger("httpcore").setLevel(logging.ERROR)
+    logging.getLogger(__package__).info(f"OpenServ Agent SDK initialized with log level: {log_level}")
+
+def __getattr__(name: str):
+    # Create the default logger instance on first use instead of at import
+    if name == 'logger':
+        global logger
+        logger = create_logger()
+        return logger
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
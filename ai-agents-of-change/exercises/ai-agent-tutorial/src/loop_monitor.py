@@ -0,0 +1,182 @@
+"""
+Event-loop lag monitor and slow-callback detector.
+
+Anything that runs synchronously on the event loop - the sync OpenAI client,
+sync capabilities, ``inspect.stack()``, large JSON dumps - stalls every other
+request. The monitor measures this directly in two ways:
+
+- A probe task sleeps for a short interval and records how late it wakes up.
+  The samples feed lag percentiles that are exported as metrics and logged.
+- A watchdog thread checks that the probe keeps running. When the loop has
+  not come back for longer than the slow-callback threshold, it captures the
+  stack of the loop thread - i.e. the code that is blocking it right now -
+  and records it together with the stall duration.
+
+The current lag is also read by the load shedder to decide when to reject
+new work.
+
+Configuration:
+    OPENSERV_LOOP_MONITOR: set to ``0`` to disable the monitor
+    OPENSERV_SLOW_CALLBACK_MS: stall threshold in milliseconds (default 100)
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG = REGISTRY.gauge(
+    'openserv_event_loop_lag_seconds',
+    'Event-loop lag percentiles over the recent sample window.',
+    ('quantile',),
+)
+LOOP_STALLS = REGISTRY.counter(
+    'openserv_event_loop_stalls_total',
+    'Number of times the event loop was blocked for longer than the slow-callback threshold.',
+)
+
+
+class LoopMonitor:
+    """Measures event-loop lag and records the stacks of long stalls."""
+
+    def __init__(
+        self,
+        interval: float = 0.05,
+        slow_threshold: float = 0.1,
+        window: int = 1200,
+        log_interval: float = 60.0,
+        max_stalls: int = 50,
+    ) -> None:
+        self.interval = interval
+        self.slow_threshold = slow_threshold
+        self.log_interval = log_interval
+        self._samples: Deque[float] = deque(maxlen=window)
+        self.stalls: Deque[Dict[str, Any]] = deque(maxlen=max_stalls)
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._probe_task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._current_stall: Optional[Dict[str, Any]] = None
+
+        for quantile in ('0.5', '0.9', '0.99', '1'):
+            LOOP_LAG.labels(quantile).set_function(lambda q=float(quantile): self.percentile(q))
+
+    @property
+    def running(self) -> bool:
+        return self._probe_task is not None and not self._probe_task.done()
+
+    def start(self) -> None:
+        """Start probing the running event loop. Must be called from the loop thread."""
+        if self.running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._probe_task = asyncio.get_running_loop().create_task(self._probe())
+        self._watchdog = threading.Thread(target=self._watch, name='openserv-loop-watchdog', daemon=True)
+        self._watchdog.start()
+        logger.info(f"Event-loop monitor started (slow-callback threshold {self.slow_threshold * 1000:.0f}ms)")
+
+    async def stop(self) -> None:
+        """Stop the probe task and the watchdog thread."""
+        self._stopped.set()
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            try:
+                await self._probe_task
+            except asyncio.CancelledError:
+                pass
+            self._probe_task = None
+
+    async def _probe(self) -> None:
+        last_log = time.monotonic()
+        while True:
+            before = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._samples.append(max(0.0, now - before - self.interval))
+            self._heartbeat = now
+            if now - last_log >= self.log_interval:
+                last_log = now
+                stats = self.stats()
+                logger.info(
+                    f"Event-loop lag p50={stats['p50'] * 1000:.1f}ms p90={stats['p90'] * 1000:.1f}ms "
+                    f"p99={stats['p99'] * 1000:.1f}ms max={stats['max'] * 1000:.1f}ms stalls={stats['stalls']}"
+                )
+
+    def _watch(self) -> None:
+        check_every = max(self.slow_threshold / 2, 0.01)
+        while not self._stopped.wait(check_every):
+            heartbeat = self._heartbeat
+            blocked_for = time.monotonic() - heartbeat - self.interval
+            stall = self._current_stall
+            if blocked_for < self.slow_threshold:
+                if stall is not None:
+                    self._finish_stall(stall)
+                continue
+            if stall is not None and stall['heartbeat'] == heartbeat:
+                stall['duration'] = blocked_for
+                continue
+            if stall is not None:
+                self._finish_stall(stall)
+            frame = sys._current_frames().get(self._loop_thread_id)
+            self._current_stall = {
+                'heartbeat': heartbeat,
+                'started_at': time.time() - blocked_for,
+                'duration': blocked_for,
+                'stack': ''.join(traceback.format_stack(frame)) if frame is not None else '',
+            }
+            LOOP_STALLS.inc()
+
+    def _finish_stall(self, stall: Dict[str, Any]) -> None:
+        self._current_stall = None
+        record = {k: v for k, v in stall.items() if k != 'heartbeat'}
+        self.stalls.append(record)
+        logger.warning(
+            f"Event loop was blocked for {record['duration'] * 1000:.0f}ms; stack at detection:\n{record['stack']}"
+        )
+
+    def current_lag(self) -> float:
+        """The lag right now: the ongoing stall if the loop is blocked, else the last sample."""
+        blocked_for = time.monotonic() - self._heartbeat - self.interval
+        if self.running and blocked_for > 0:
+            return blocked_for
+        return self._samples[-1] if self._samples else 0.0
+
+    def percentile(self, q: float) -> float:
+        if not self._samples:
+            return 0.0
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def stats(self) -> Dict[str, float]:
+        ordered = sorted(self._samples)
+
+        def pick(q: float) -> float:
+            return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+        return {
+            'p50': pick(0.5),
+            'p90': pick(0.9),
+            'p99': pick(0.99),
+            'max': ordered[-1] if ordered else 0.0,
+            'stalls': len(self.stalls),
+        }
+
+    def recent_stalls(self) -> List[Dict[str, Any]]:
+        return list(self.stalls)
+
+
+loop_monitor = LoopMonitor(
+    slow_threshold=int(os.environ.get('OPENSERV_SLOW_CALLBACK_MS', '100')) / 1000,
+)
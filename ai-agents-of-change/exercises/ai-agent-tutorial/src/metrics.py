@@ -0,0 +1,348 @@
+"""
+Runtime metrics for the OpenServ Agent library.
+
+Metrics are kept in plain Python objects and rendered in the Prometheus text
+exposition format by the ``/metrics`` route of the ``AgentServer``.
+
+The recording side is meant to be cheap enough for the hot path: every labelled
+series is created once, on first use, and afterwards an observation is a bisect
+plus two in-place increments on pre-allocated slots. No locks are taken - the
+agent runs on a single event loop, so updates never race with each other.
+"""
+
+import re
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets (seconds) shared by the route, capability, LLM and upstream histograms
+DEFAULT_LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+# Buckets for the number of LLM round-trips in one tool loop
+ITERATION_BUCKETS = (1, 2, 3, 4, 5, 6, 8, 10, 15, 20)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value != value:
+        return 'NaN'
+    if value == float('inf'):
+        return '+Inf'
+    if value == float('-inf'):
+        return '-Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """Base class for a metric family with a fixed set of label names."""
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            self._default = self._new_child()
+            self._children[()] = self._default
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """
+        Get the series for the given label values, creating it on first use.
+
+        Hot paths should call this once and keep the returned child around
+        when the label values are known up front.
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"Metric {self.name} expects labels {self.labelnames}, got {values}")
+            # Values that render the same (1 and '1') are the same series
+            key = tuple(str(v) for v in values)
+            child = self._children.get(key)
+            if child is None:
+                child = self._new_child()
+                self._children[key] = child
+            # Keep the un-stringified key as an alias so the next lookup hits directly
+            self._children[values] = child
+        return child
+
+    def _series(self):
+        seen = set()
+        for key, child in list(self._children.items()):
+            if id(child) in seen:
+                continue
+            seen.add(id(child))
+            yield tuple(str(v) for v in key), child
+
+    def render(self) -> List[str]:
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.kind}',
+        ]
+        for values, child in self._series():
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values: Tuple[str, ...], child) -> List[str]:
+        raise NotImplementedError
+
+
+class _ValueChild:
+    __slots__ = ('value', 'function')
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self.function: Optional[Callable[[], float]] = None
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Compute the value lazily at scrape time instead of on every update."""
+        self.function = function
+
+    def get(self) -> float:
+        if self.function is not None:
+            try:
+                return float(self.function())
+            except Exception:
+                return float('nan')
+        return self.value
+
+
+class Counter(_Metric):
+    """A monotonically increasing counter."""
+    kind = 'counter'
+
+    def _new_child(self) -> _ValueChild:
+        return _ValueChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default.value += amount
+
+    def _render_child(self, values, child) -> List[str]:
+        return [f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.get())}']
+
+
+class Gauge(Counter):
+    """A value that can go up and down, or be computed at scrape time."""
+    kind = 'gauge'
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._default.value -= amount
+
+    def set(self, value: float) -> None:
+        self._default.value = value
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self._default.set_function(function)
+
+
+class _HistogramChild:
+    __slots__ = ('upper_bounds', 'counts', 'sum')
+
+    def __init__(self, upper_bounds: Tuple[float, ...]) -> None:
+        self.upper_bounds = upper_bounds
+        # One slot per bucket plus the +Inf overflow slot
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+
+    def time(self) -> '_Timer':
+        """Time a block of code: ``with histogram.labels('x').time(): ...``"""
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ('child', 'start')
+
+    def __init__(self, child: _HistogramChild) -> None:
+        self.child = child
+        self.start = 0.0
+
+    def __enter__(self) -> '_Timer':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.child.observe(time.perf_counter() - self.start)
+
+
+class Histogram(_Metric):
+    """A histogram with fixed, cumulative buckets."""
+    kind = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+    ):
+        self.upper_bounds = tuple(sorted(float(b) for b in buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.upper_bounds)
+
+    def observe(self, value: float) -> None:
+        self._default.observe(value)
+
+    def time(self) -> _Timer:
+        return _Timer(self._default)
+
+    def _render_child(self, values, child) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.upper_bounds + (float('inf'),), child.counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"')
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f'{self.name}_sum{labels} {_format_value(child.sum)}')
+        lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    """A collection of metric families rendered together."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Content type of the text exposition format
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Default registry used by the agent, server and clients
+REGISTRY = MetricsRegistry()
+
+# Series that belong to one agent carry an ``agent`` label: its name, or
+# ``default`` for an unnamed agent. Agents hosted together share the registry.
+DEFAULT_AGENT = 'default'
+
+ROUTE_LATENCY = REGISTRY.histogram(
+    'openserv_http_request_duration_seconds',
+    'Latency of requests handled by the agent server, by agent, route template and status.',
+    ('agent', 'method', 'route', 'status'),
+)
+CAPABILITY_LATENCY = REGISTRY.histogram(
+    'openserv_capability_duration_seconds',
+    'Latency of Capability.run, by agent, capability name and outcome.',
+    ('agent', 'capability', 'outcome'),
+)
+LLM_LATENCY = REGISTRY.histogram(
+    'openserv_llm_request_duration_seconds',
+    'Latency of LLM completion calls made by the process tool loop, by agent, model and outcome.',
+    ('agent', 'model', 'outcome'),
+)
+TOOL_LOOP_ITERATIONS = REGISTRY.histogram(
+    'openserv_tool_loop_iterations',
+    'Number of LLM round-trips used by one process call, by agent.',
+    ('agent',),
+    buckets=ITERATION_BUCKETS,
+)
+UPSTREAM_LATENCY = REGISTRY.histogram(
+    'openserv_upstream_request_duration_seconds',
+    'Latency of requests to the OpenServ platform and runtime, by agent, client, path template and status.',
+    ('agent', 'client', 'method', 'path', 'status'),
+)
+INFLIGHT_TASKS = REGISTRY.gauge(
+    'openserv_inflight_actions',
+    'Number of do-task and respond-chat-message actions currently being processed, by agent.',
+    ('agent', 'type'),
+)
+POOL_CONNECTIONS = REGISTRY.gauge(
+    'openserv_http_pool_connections',
+    'Connections held by the outbound HTTP pools, by agent, client and state; '
+    'a pool shared by hosted agents is reported once with agent="host".',
+    ('agent', 'client', 'state'),
+)
+CONDITIONAL_REQUESTS = REGISTRY.counter(
+    'openserv_conditional_requests_total',
+    'Conditional GET requests, by agent, client and result (not_modified or modified).',
+    ('agent', 'client', 'result'),
+)
+REQUEST_BODY_BYTES = REGISTRY.counter(
+    'openserv_request_body_bytes_total',
+    'Size of compressed request bodies before and after compression, by agent, client and stage.',
+    ('agent', 'client', 'stage'),
+)
+CONDITIONAL_BYTES_SAVED = REGISTRY.counter(
+    'openserv_conditional_bytes_saved_total',
+    'Response body bytes served from the local copy on 304 Not Modified, by agent and client.',
+    ('agent', 'client'),
+)
+
+_ID_SEGMENT = re.compile(r'/(?:\d+|[0-9a-fA-F]{8}-[0-9a-fA-F-]{27,})(?=/|$)')
+_path_templates: Dict[str, str] = {}
+_MAX_PATH_TEMPLATES = 4096
+
+
+def path_template(path: str) -> str:
+    """
+    Collapse the ids in a request path so it can be used as a metric label.
+
+    ``/workspaces/12/tasks/34/complete`` becomes ``/workspaces/:id/tasks/:id/complete``.
+    """
+    template = _path_templates.get(path)
+    if template is None:
+        template = _ID_SEGMENT.sub('/:id', path)
+        if len(_path_templates) < _MAX_PATH_TEMPLATES:
+            _path_templates[path] = template
+    return template
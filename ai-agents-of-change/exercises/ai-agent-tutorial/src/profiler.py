@@ -0,0 +1,189 @@
+"""
+On-demand profiling for a live agent.
+
+Two tools are provided:
+
+- ``SamplingProfiler`` samples the stacks of every thread from a background
+  thread for a fixed number of seconds and returns them in the collapsed-stack
+  format understood by ``flamegraph.pl``, speedscope and similar viewers. The
+  ``AgentServer`` exposes it at ``/admin/profile``.
+- ``RequestProfiler`` runs ``cProfile`` around individual requests whose route
+  or capability name matches ``OPENSERV_PROFILE_MATCH`` and writes a ``.prof``
+  file per request to ``OPENSERV_PROFILE_DIR``. When no pattern is configured
+  ``profile_request`` returns a shared no-op context manager, so the cost of
+  leaving the hooks in place is a single attribute check.
+
+Note that the agent runs on one event loop, so a per-request profile also
+contains whatever other requests were interleaved with it.
+"""
+
+import asyncio
+import cProfile
+import fnmatch
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ProfilerBusyError(Exception):
+    """Raised when a sampling profile is requested while another one is running."""
+    pass
+
+
+def _collapse(frame, thread_name: str) -> str:
+    names: List[str] = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+        frame = frame.f_back
+    names.append(thread_name)
+    names.reverse()
+    return ';'.join(names)
+
+
+class SamplingProfiler:
+    """Samples all thread stacks at a fixed interval from a background thread."""
+
+    def __init__(self, interval: float = 0.005) -> None:
+        self.interval = interval
+        self._lock = threading.Lock()
+
+    def sample(self, seconds: float) -> Dict[str, int]:
+        """Sample stacks for ``seconds`` and return collapsed stacks with their counts."""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError('A profile is already running')
+        try:
+            own_id = threading.get_ident()
+            stacks: Counter = Counter()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_id:
+                        continue
+                    stacks[_collapse(frame, names.get(thread_id, str(thread_id)))] += 1
+                time.sleep(self.interval)
+            return dict(stacks)
+        finally:
+            self._lock.release()
+
+    async def profile(self, seconds: float) -> str:
+        """Profile the process for ``seconds`` without blocking the event loop."""
+        stacks = await asyncio.to_thread(self.sample, seconds)
+        return format_collapsed(stacks)
+
+
+def format_collapsed(stacks: Dict[str, int]) -> str:
+    """Render stack counts in the collapsed-stack format, one ``stack count`` per line."""
+    return '\n'.join(f'{stack} {count}' for stack, count in sorted(stacks.items())) + '\n'
+
+
+class _NoopProfile:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+_NOOP_PROFILE = _NoopProfile()
+
+
+class _RequestProfile:
+    def __init__(self, profiler: 'RequestProfiler', kind: str, name: str) -> None:
+        self.profiler = profiler
+        self.kind = kind
+        self.name = name
+        self._profile: Optional[cProfile.Profile] = None
+
+    def __enter__(self) -> None:
+        # Only one cProfile can be active per thread; overlapping requests are skipped
+        if self.profiler._active:
+            return None
+        self.profiler._active = True
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+        return None
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self._profile is None:
+            return
+        self._profile.disable()
+        self.profiler._active = False
+        safe_name = ''.join(c if c.isalnum() or c in '-_' else '_' for c in self.name.strip('/')) or 'root'
+        path = os.path.join(self.profiler.directory, f'{self.kind}-{safe_name}-{time.time_ns()}.prof')
+        try:
+            os.makedirs(self.profiler.directory, exist_ok=True)
+            self._profile.dump_stats(path)
+            logger.info(f"Wrote profile for {self.kind} '{self.name}' to {path}")
+        except OSError as e:
+            logger.error(f"Failed to write profile to {path}: {str(e)}")
+
+
+class RequestProfiler:
+    """
+    Profiles individual routes or capabilities that match a set of patterns.
+
+    Patterns are shell-style globs matched against ``route:<path>`` and
+    ``capability:<name>``, e.g. ``route:/tools/*,capability:search``.
+    """
+
+    def __init__(self, patterns: Optional[List[str]] = None, directory: str = 'profiles') -> None:
+        self.patterns = [p.strip() for p in (patterns or []) if p.strip()]
+        # Profiles set up at runtime can only be written below the configured directory
+        self.root = directory
+        self.directory = directory
+        self.enabled = bool(self.patterns)
+        self._active = False
+
+    def configure(self, patterns: Optional[List[str]], directory: Optional[str] = None) -> None:
+        """
+        Change the profiled routes and capabilities at runtime.
+
+        ``directory`` is relative to the directory the profiler was created
+        with. Raises ValueError for patterns that are not a list of strings
+        or a directory outside it.
+        """
+        if patterns is None:
+            patterns = []
+        if not isinstance(patterns, list) or not all(isinstance(p, str) for p in patterns):
+            raise ValueError('patterns must be a list of strings')
+        if directory is not None and not isinstance(directory, str):
+            raise ValueError('directory must be a string')
+        new_directory = self._resolve(directory) if directory else self.directory
+        self.patterns = [p.strip() for p in patterns if p.strip()]
+        self.directory = new_directory
+        self.enabled = bool(self.patterns)
+
+    def _resolve(self, directory: str) -> str:
+        root = os.path.realpath(self.root)
+        target = os.path.realpath(os.path.join(root, directory))
+        if os.path.commonpath([root, target]) != root:
+            raise ValueError(f'directory must be inside the profile directory {self.root}')
+        return target
+
+    def matches(self, kind: str, name: str) -> bool:
+        target = f'{kind}:{name}'
+        return any(fnmatch.fnmatchcase(target, pattern) for pattern in self.patterns)
+
+    def profile_request(self, kind: str, name: str):
+        """Get a context manager that profiles the enclosed block if it matches."""
+        if not self.enabled or not self.matches(kind, name):
+            return _NOOP_PROFILE
+        return _RequestProfile(self, kind, name)
+
+
+sampling_profiler = SamplingProfiler()
+
+request_profiler = RequestProfiler(
+    patterns=os.environ.get('OPENSERV_PROFILE_MATCH', '').split(','),
+    directory=os.environ.get('OPENSERV_PROFILE_DIR', 'profiles'),
+)
@@ -0,0 +1,169 @@
+"""
+Declarative projection of the action sent in runtime payloads.
+
+By default the agent forwards the whole action it received to the runtime,
+including integrations, memories and every workspace agent. A projection
+lists which sub-trees to keep, cap or drop, using dotted paths into the
+action:
+
+    {
+        "include": ["type", "me", "task", "workspace", "memories"],
+        "exclude": ["workspace.agents"],
+        "cap": {"memories": 20, "messages": -30},
+        "max_messages": 50
+    }
+
+- ``include``: keep only these paths (default: everything)
+- ``exclude``: drop these paths
+- ``cap``: keep only the first N entries of these lists, or the last N for a
+  negative N (the chat action's ``messages`` are oldest first)
+- ``max_messages``: send only the N most recent chat messages
+
+The configuration comes from ``AgentOptions.payload_projection`` or the
+``OPENSERV_PAYLOAD_PROJECTION`` environment variable (JSON). The size of the
+action before and after projection is counted per request kind.
+
+To see what a projection would save on a captured action:
+
+    python -m src.projection <action.json> [projection.json]
+"""
+
+import json
+import logging
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+PAYLOAD_BYTES = REGISTRY.counter(
+    'openserv_runtime_action_bytes_total',
+    'Size of the action in runtime payloads before and after projection, by agent, request kind and stage.',
+    ('agent', 'kind', 'stage'),
+)
+
+
+def _split(paths: Iterable[str]) -> List[Tuple[str, ...]]:
+    return [tuple(path.split('.')) for path in paths]
+
+
+class PayloadProjection:
+    """Include, cap and exclude rules applied to the action of runtime payloads."""
+
+    def __init__(
+        self,
+        include: Optional[Sequence[str]] = None,
+        exclude: Sequence[str] = (),
+        cap: Optional[Dict[str, int]] = None,
+        max_messages: Optional[int] = None,
+    ) -> None:
+        self.include = _split(include) if include is not None else None
+        self.exclude = _split(exclude)
+        self.cap = {tuple(path.split('.')): limit for path, limit in (cap or {}).items()}
+        self.max_messages = max_messages
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]]) -> Optional['PayloadProjection']:
+        """Build a projection from its JSON form; None or an empty config means no projection."""
+        if not config:
+            return None
+        unknown = set(config) - {'include', 'exclude', 'cap', 'max_messages'}
+        if unknown:
+            raise ValueError(f"Unknown payload projection keys: {', '.join(sorted(unknown))}")
+        return cls(
+            include=config.get('include'),
+            exclude=config.get('exclude', ()),
+            cap=config.get('cap'),
+            max_messages=config.get('max_messages'),
+        )
+
+    @property
+    def changes_action(self) -> bool:
+        return bool(self.include is not None or self.exclude or self.cap)
+
+    def apply(self, action: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Project a decoded action. Only the containers along projected paths
+        are copied; everything else is shared with the input.
+        """
+        result = action
+        if self.include is not None:
+            result = _include(action, self.include)
+        for path in self.exclude:
+            result = _update(result, path, None)
+        for path, limit in self.cap.items():
+            result = _update(result, path, limit)
+        return result
+
+    def messages(self, messages: List[Any]) -> List[Any]:
+        """Trim chat messages to the most recent ``max_messages``, keeping a leading system prompt."""
+        if self.max_messages is None:
+            return messages
+        head = messages[:1] if messages and isinstance(messages[0], dict) and messages[0].get('role') == 'system' else []
+        if len(messages) - len(head) <= self.max_messages:
+            return messages
+        return head + messages[len(messages) - self.max_messages:]
+
+
+def _include(data: Any, paths: List[Tuple[str, ...]]) -> Any:
+    if not isinstance(data, dict):
+        return data
+    if any(len(path) == 0 for path in paths):
+        return data
+    result = {}
+    for key in data:
+        below = [path[1:] for path in paths if path[0] == key]
+        if below:
+            result[key] = _include(data[key], below)
+    return result
+
+
+def _update(data: Any, path: Tuple[str, ...], limit: Optional[int]) -> Any:
+    """Drop (``limit`` None) or cap the list at ``path``, copying containers on the way down."""
+    if not isinstance(data, dict) or path[0] not in data:
+        return data
+    key = path[0]
+    result = dict(data)
+    if len(path) > 1:
+        result[key] = _update(data[key], path[1:], limit)
+    elif limit is None:
+        del result[key]
+    elif isinstance(data[key], list) and len(data[key]) > abs(limit):
+        result[key] = data[key][:limit] if limit >= 0 else data[key][limit:]
+    return result
+
+
+def size_report(action: Dict[str, Any], projection: PayloadProjection) -> List[Tuple[str, int, int]]:
+    """Encoded size of each top-level and workspace sub-tree of an action, before and after projection."""
+    projected = projection.apply(action)
+
+    def size(data: Any, path: Tuple[str, ...]) -> int:
+        for key in path:
+            if not isinstance(data, dict) or key not in data:
+                return 0
+            data = data[key]
+        return len(json.dumps(data, separators=(',', ':')))
+
+    paths = [(key,) for key in action]
+    if isinstance(action.get('workspace'), dict):
+        paths += [('workspace', key) for key in action['workspace']]
+    rows = [('.'.join(path), size(action, path), size(projected, path)) for path in paths]
+    rows.append(('(total)', size(action, ()), size(projected, ())))
+    return rows
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('usage: python -m src.projection <action.json> [projection.json]')
+        sys.exit(1)
+    with open(sys.argv[1]) as f:
+        captured = json.load(f)
+    config: Dict[str, Any] = {}
+    if len(sys.argv) > 2:
+        with open(sys.argv[2]) as f:
+            config = json.load(f)
+    projection = PayloadProjection.from_config(config) or PayloadProjection()
+    print(f"{'path':<32} {'before':>10} {'after':>10}")
+    for path, before, after in size_report(captured, projection):
+        print(f"{path:<32} {before:>10} {after:>10}")
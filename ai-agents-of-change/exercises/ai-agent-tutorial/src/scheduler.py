@@ -0,0 +1,270 @@
+"""
+Dispatcher for root-route work with priority classes and per-workspace fair queuing.
+
+Work is submitted in one of two classes, served in priority order:
+
+- ``chat``: interactive respond-chat-message actions
+- ``task``: batch do-task actions
+
+Within a class, workspaces are served by deficit round-robin, so a flood of
+tasks from one big workspace cannot delay the other workspaces behind it.
+Each workspace can run at most ``workspace_concurrency`` actions at once,
+and tasks can never take the slots reserved for chat.
+
+The time each action waits before it starts is recorded per class.
+``oldest_wait``, which load shedding watches, counts only the time actions
+are held back by the global and class limits: a workspace waiting behind
+its own limit is busy, but the agent is not overloaded.
+"""
+
+import asyncio
+import contextvars
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Set
+
+from .metrics import DEFAULT_AGENT, REGISTRY
+
+logger = logging.getLogger(__name__)
+
+CHAT = 'chat'
+TASK = 'task'
+PRIORITY_ORDER = (CHAT, TASK)
+
+QUEUE_WAIT = REGISTRY.histogram(
+    'openserv_scheduler_queue_wait_seconds',
+    'Time root-route actions wait in the scheduler before they start, by agent and priority class.',
+    ('agent', 'class'),
+)
+QUEUED = REGISTRY.gauge(
+    'openserv_scheduler_queued',
+    'Actions waiting in the scheduler, by agent and priority class.',
+    ('agent', 'class'),
+)
+RUNNING = REGISTRY.gauge(
+    'openserv_scheduler_running',
+    'Actions currently running, by agent and priority class.',
+    ('agent', 'class'),
+)
+
+
+class _Job:
+    __slots__ = ('priority', 'workspace', 'factory', 'cost', 'enqueued_at', 'future', 'context')
+
+    def __init__(self, priority: str, workspace: Hashable, factory: Callable[[], Awaitable[Any]], cost: float,
+                 future: asyncio.Future) -> None:
+        self.priority = priority
+        self.workspace = workspace
+        self.factory = factory
+        self.cost = cost
+        self.enqueued_at = time.monotonic()
+        self.future = future
+        # Run the job in the submitter's context so tracing spans are parented correctly
+        self.context = contextvars.copy_context()
+
+
+class _ClassQueue:
+    """Deficit round-robin over the workspaces with work queued in one class."""
+
+    def __init__(self, quantum: float) -> None:
+        self.quantum = quantum
+        self.queues: Dict[Hashable, Deque[_Job]] = {}
+        self.deficits: Dict[Hashable, float] = {}
+        self.active: Deque[Hashable] = deque()
+        self.size = 0
+        self.running = 0
+
+    def push(self, job: _Job) -> None:
+        queue = self.queues.get(job.workspace)
+        if queue is None:
+            queue = self.queues[job.workspace] = deque()
+            self.deficits[job.workspace] = 0.0
+            self.active.append(job.workspace)
+        queue.append(job)
+        self.size += 1
+
+    def pop(self, can_run: Callable[[Hashable], bool]) -> Optional[_Job]:
+        """Take the next job from the first eligible workspace in round-robin order."""
+        for _ in range(len(self.active)):
+            workspace = self.active[0]
+            queue = self.queues[workspace]
+            if not can_run(workspace):
+                self.active.rotate(-1)
+                continue
+            if self.deficits[workspace] < queue[0].cost:
+                self.deficits[workspace] += self.quantum
+            if self.deficits[workspace] < queue[0].cost:
+                # Not enough credit yet: move on and come back next round
+                self.active.rotate(-1)
+                continue
+            job = queue.popleft()
+            self.deficits[workspace] -= job.cost
+            self.size -= 1
+            if queue:
+                self.active.rotate(-1)
+            else:
+                # An idle workspace keeps no credit
+                self.active.popleft()
+                del self.queues[workspace]
+                del self.deficits[workspace]
+            return job
+        return None
+
+    def clear(self) -> List[_Job]:
+        """Remove and return every queued job."""
+        jobs = [job for queue in self.queues.values() for job in queue]
+        self.queues.clear()
+        self.deficits.clear()
+        self.active.clear()
+        self.size = 0
+        return jobs
+
+
+class ActionScheduler:
+    """Runs submitted actions under global, per-class and per-workspace concurrency limits."""
+
+    def __init__(
+        self,
+        max_concurrency: int = 32,
+        workspace_concurrency: int = 4,
+        chat_reserved: Optional[int] = None,
+        quantum: float = 1.0,
+        agent: str = DEFAULT_AGENT,
+    ) -> None:
+        """
+        Args:
+            max_concurrency: Maximum actions running at once
+            workspace_concurrency: Maximum actions running at once for one workspace
+            chat_reserved: Slots that only chat may use; defaults to a quarter of max_concurrency
+            quantum: Credit a workspace earns per round-robin turn, in units of job cost
+            agent: Agent label of the scheduler's metrics
+        """
+        self.max_concurrency = max_concurrency
+        self.workspace_concurrency = workspace_concurrency
+        self.chat_reserved = max_concurrency // 4 if chat_reserved is None else chat_reserved
+        self._classes = {priority: _ClassQueue(quantum) for priority in PRIORITY_ORDER}
+        self._limits = {CHAT: max_concurrency, TASK: max(1, max_concurrency - self.chat_reserved)}
+        self._running = 0
+        self._running_by_workspace: Dict[Hashable, int] = {}
+        # When each workspace last dropped below its limit; its queued actions wait on the other limits since
+        self._eligible_since: Dict[Hashable, float] = {}
+        # Running actions, kept so that shutdown can cancel them
+        self._tasks: Set[asyncio.Task] = set()
+        self._queue_wait = {priority: QUEUE_WAIT.labels(agent, priority) for priority in PRIORITY_ORDER}
+        for priority, queue in self._classes.items():
+            QUEUED.labels(agent, priority).set_function(lambda q=queue: q.size)
+            RUNNING.labels(agent, priority).set_function(lambda q=queue: q.running)
+
+    def submit(
+        self,
+        priority: str,
+        workspace: Hashable,
+        factory: Callable[[], Awaitable[Any]],
+        cost: float = 1.0,
+    ) -> asyncio.Future:
+        """
+        Queue an action and return a future for its result.
+
+        Args:
+            priority: ``chat`` or ``task``
+            workspace: Key the action is fair-queued under, normally the workspace id
+            factory: Called with no arguments to create the coroutine when the action starts
+            cost: Relative cost of the action for round-robin accounting
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._classes[priority].push(_Job(priority, workspace, factory, cost, future))
+        self._dispatch()
+        return future
+
+    def queued(self, priority: Optional[str] = None) -> int:
+        if priority is not None:
+            return self._classes[priority].size
+        return sum(queue.size for queue in self._classes.values())
+
+    def oldest_wait(self) -> float:
+        """
+        Seconds the longest-waiting queued action has been held back by the
+        global or class limits, or 0 if none is. Time spent behind its own
+        workspace's limit is not counted.
+        """
+        oldest = min(
+            (
+                max(queue[0].enqueued_at, self._eligible_since.get(workspace, 0.0))
+                for classes in self._classes.values()
+                for workspace, queue in classes.queues.items()
+                if self._can_run(workspace)
+            ),
+            default=None
+        )
+        return time.monotonic() - oldest if oldest is not None else 0.0
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    async def shutdown(self) -> None:
+        """Drop queued actions and cancel running ones, waiting until they have stopped."""
+        for queue in self._classes.values():
+            for job in queue.clear():
+                job.future.cancel()
+        self._eligible_since.clear()
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _can_run(self, workspace: Hashable) -> bool:
+        return self._running_by_workspace.get(workspace, 0) < self.workspace_concurrency
+
+    def _dispatch(self) -> None:
+        while self._running < self.max_concurrency:
+            job = None
+            for priority in PRIORITY_ORDER:
+                queue = self._classes[priority]
+                if queue.size and queue.running < self._limits[priority]:
+                    job = queue.pop(self._can_run)
+                    if job is not None:
+                        break
+            if job is None:
+                return
+            self._start(job)
+
+    def _start(self, job: _Job) -> None:
+        self._queue_wait[job.priority].observe(time.monotonic() - job.enqueued_at)
+        self._running += 1
+        self._classes[job.priority].running += 1
+        self._running_by_workspace[job.workspace] = self._running_by_workspace.get(job.workspace, 0) + 1
+        task = job.context.run(asyncio.ensure_future, self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(lambda t: self._finish(job, t))
+
+    async def _run(self, job: _Job) -> None:
+        if job.future.cancelled():
+            return
+        try:
+            result = await job.factory()
+        except asyncio.CancelledError:
+            job.future.cancel()
+            raise
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+
+    def _finish(self, job: _Job, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        self._running -= 1
+        self._classes[job.priority].running -= 1
+        remaining = self._running_by_workspace[job.workspace] - 1
+        if remaining == self.workspace_concurrency - 1:
+            self._eligible_since[job.workspace] = time.monotonic()
+        if remaining:
+            self._running_by_workspace[job.workspace] = remaining
+        else:
+            del self._running_by_workspace[job.workspace]
+            if not any(job.workspace in queue.queues for queue in self._classes.values()):
+                self._eligible_since.pop(job.workspace, None)
+        self._dispatch()
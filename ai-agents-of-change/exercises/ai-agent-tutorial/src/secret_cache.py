@@ -0,0 +1,89 @@
+"""
+In-memory cache for workspace secrets.
+
+Secret lists and values are fetched from the platform once and then served
+from memory for ``ttl`` seconds. Each entry is dropped as soon as it
+expires, so secret values do not linger in memory after their TTL.
+Concurrent lookups of the same entry share a single request.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from .metrics import DEFAULT_AGENT, REGISTRY
+
+logger = logging.getLogger(__name__)
+
+SECRET_LOOKUPS = REGISTRY.counter(
+    'openserv_secret_cache_lookups_total',
+    'Secret lookups, by agent, kind (list or value) and result (hit, miss or shared).',
+    ('agent', 'kind', 'result'),
+)
+
+
+class SecretCache:
+    """A TTL cache with single-flight loading, keyed by tuples starting with a kind and workspace id."""
+
+    def __init__(self, ttl: float = 300.0, agent: str = DEFAULT_AGENT) -> None:
+        self.ttl = ttl
+        self.agent = agent
+        self._entries: Dict[Hashable, Tuple[float, Any, Optional[asyncio.TimerHandle]]] = {}
+        self._loading: Dict[Hashable, asyncio.Future] = {}
+
+    def cached(self, key: Tuple) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] > time.monotonic()
+
+    async def get(self, key: Tuple, load: Callable[[], Awaitable[Any]]) -> Any:
+        """Get the value for ``key``, calling ``load`` if it is missing or expired."""
+        kind = key[0]
+        if self.ttl <= 0:
+            return await load()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            SECRET_LOOKUPS.labels(self.agent, kind, 'hit').inc()
+            return entry[1]
+        loading = self._loading.get(key)
+        if loading is not None:
+            SECRET_LOOKUPS.labels(self.agent, kind, 'shared').inc()
+            return await asyncio.shield(loading)
+        SECRET_LOOKUPS.labels(self.agent, kind, 'miss').inc()
+        loading = self._loading[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await load()
+        except BaseException as e:
+            # Failures are not cached; whoever shares this load gets the same error
+            if not loading.done():
+                if isinstance(e, asyncio.CancelledError):
+                    loading.cancel()
+                else:
+                    loading.set_exception(e)
+                    # Mark retrieved so an unshared failure is not reported as never retrieved
+                    loading.exception()
+            raise
+        else:
+            self._store(key, value)
+            loading.set_result(value)
+            return value
+        finally:
+            self._loading.pop(key, None)
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        old = self._entries.get(key)
+        if old is not None and old[2] is not None:
+            old[2].cancel()
+        timer = asyncio.get_running_loop().call_later(self.ttl, self._entries.pop, key, None)
+        self._entries[key] = (time.monotonic() + self.ttl, value, timer)
+
+    def invalidate(self, workspace_id: Optional[int] = None) -> None:
+        """Drop cached entries for one workspace, or for all workspaces."""
+        for key in list(self._entries):
+            if workspace_id is None or key[1] == workspace_id:
+                _, _, timer = self._entries.pop(key)
+                if timer is not None:
+                    timer.cancel()
+
+    def __len__(self) -> int:
+        return len(self._entries)
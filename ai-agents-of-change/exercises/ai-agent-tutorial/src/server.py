@@ -11,15 +11,21 @@ import base64
 from fastapi import FastAPI, Request, HTTPException, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
-from typing import Optional, Dict, Any, Callable, List
+from fastapi.responses import Response, StreamingResponse, JSONResponse
+from typing import Optional, Dict, Any, Callable, List, AsyncIterator
 import uvicorn
 import asyncio
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.types import ASGIApp
 import time
+from contextlib import asynccontextmanager
 
 from .config import ServerConfig
-from .exceptions import ToolError
+from .exceptions import ToolError, JobStoreFullError, ValidationError
+from .metrics import DEFAULT_AGENT, REGISTRY, ROUTE_LATENCY, CONTENT_TYPE
+from . import tracing
+from .profiler import sampling_profiler, request_profiler, ProfilerBusyError
+from .loop_monitor import loop_monitor
 
 logger = logging.getLogger(__name__)
 
@@ -61,12 +67,35 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
         response = await call_next(request)
         return response
 
+class MetricsMiddleware(BaseHTTPMiddleware):
+    """Record request latency per route template and status code."""
+    def __init__(self, app: ASGIApp, server: 'AgentServer'):
+        super().__init__(app)
+        self.server = server
+
+    async def dispatch(self, request: Request, call_next):
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            # The router stores the matched route in the scope; fall back to a
+            # fixed label so unmatched paths can't blow up the label set
+            route = request.scope.get('route')
+            route_path = getattr(route, 'path', None) or 'unmatched'
+            ROUTE_LATENCY.labels(self.server.metrics_agent, request.method, route_path, str(status)).observe(
+                time.perf_counter() - start
+            )
+
 async def verify_auth_token(
     request: Request,
     authorization: Optional[str] = Header(None)
 ) -> None:
-    """Verify the authorization token for API requests."""
-    auth_token = os.environ.get("OPENSERV_AUTH_TOKEN")
+    """Verify the authorization token for API requests against the token of the agent the app serves."""
+    # request.app is the agent's own app, also when it is mounted on an AgentHost
+    auth_token = request.app.state.auth_token
     
     # If no auth token is set, skip validation
     if not auth_token:
@@ -80,19 +109,35 @@ async def verify_auth_token(
             detail="Unauthorized: Missing authorization token"
         )
         
-    # Simple token comparison (improve with secure methods in production)
-    if authorization != f"Bearer {auth_token}":
+    if not hmac.compare_digest(authorization, f"Bearer {auth_token}"):
         logger.warning("Invalid authorization token")
         raise HTTPException(
             status_code=401,
             detail="Unauthorized: Invalid token"
         )
 
+async def verify_admin_token(
+    authorization: Optional[str] = Header(None)
+) -> None:
+    """Verify the token for admin endpoints; they are disabled unless OPENSERV_ADMIN_TOKEN is set."""
+    admin_token = os.environ.get("OPENSERV_ADMIN_TOKEN")
+    
+    if not admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    
+    if not authorization or not hmac.compare_digest(authorization, f"Bearer {admin_token}"):
+        logger.warning("Invalid or missing admin token")
+        raise HTTPException(
+            status_code=401,
+            detail="Unauthorized: Invalid admin token"
+        )
+
 class AgentServer:
     """HTTP server for the Agent."""
     def __init__(self, config: ServerConfig):
         self.config = config
-        self.app = FastAPI()
+        self.app = FastAPI(lifespan=self._lifespan)
+        self.app.state.auth_token = config.auth_token
         self._agent = None
         self._server: Optional[uvicorn.Server] = None
         
@@ -105,18 +150,82 @@ class AgentServer:
             """Health check endpoint."""
             return {"status": "up", "version": "1.0.0"}
         
+        @self.app.get("/ready")
+        async def ready():
+            """Readiness endpoint: 503 while the agent is shedding load."""
+            shedder = self._agent.shedder if self._agent else None
+            if shedder is None:
+                return {"status": "ready"}
+            status = shedder.status()
+            if status["status"] != "ready":
+                return JSONResponse(status_code=503, content=status,
+                                    headers={"Retry-After": str(shedder.retry_after())})
+            return status
+        
+        @self.app.get("/metrics")
+        async def metrics():
+            """Metrics endpoint in the Prometheus text exposition format."""
+            return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+        
+        @self.app.get("/admin/profile", dependencies=[Depends(verify_admin_token)])
+        async def profile(seconds: float = 10.0):
+            """Sample all thread stacks for N seconds and return them as collapsed stacks."""
+            if seconds <= 0 or seconds > 300:
+                raise HTTPException(status_code=400, detail="seconds must be between 0 and 300")
+            try:
+                collapsed = await sampling_profiler.profile(seconds)
+            except ProfilerBusyError as e:
+                raise HTTPException(status_code=409, detail=str(e))
+            return Response(
+                content=collapsed,
+                media_type="text/plain",
+                headers={"Content-Disposition": f'attachment; filename="profile-{int(time.time())}.collapsed"'}
+            )
+        
+        @self.app.put("/admin/profile/requests", dependencies=[Depends(verify_admin_token)])
+        async def profile_requests(request: Request):
+            """Set the route and capability patterns that get profiled per request."""
+            try:
+                body = await request.json()
+                if not isinstance(body, dict):
+                    raise ValueError('Expected a JSON object')
+                request_profiler.configure(body.get('patterns', []), body.get('directory'))
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            return {"patterns": request_profiler.patterns, "directory": request_profiler.directory}
+        
+        @self.app.get("/admin/loop", dependencies=[Depends(verify_admin_token)])
+        async def loop_stats():
+            """Event-loop lag percentiles and the stacks of recent stalls."""
+            return {"lag": loop_monitor.stats(), "stalls": loop_monitor.recent_stalls()}
+        
         @self.app.post("/", dependencies=[Depends(verify_auth_token)])
         async def root(request: Request):
             """Root route for task execution and chat message responses."""
             if not self._agent:
                 raise HTTPException(status_code=500, detail="Agent not initialized")
             
+            # Refuse new work before reading the body while the agent is overloaded
+            shedder = self._agent.shedder
+            if shedder is not None and not shedder.admit():
+                logger.warning("Shedding root route request: agent is overloaded")
+                raise HTTPException(
+                    status_code=503,
+                    detail="Agent is overloaded. Please try again later.",
+                    headers={"Retry-After": str(shedder.retry_after())}
+                )
+            
             try:
-                body = await request.json()
-                logger.info(f"Root route request received: {body.get('type', 'unknown')}")
+                # Validated in one pass from the raw bytes by the agent
+                body = await request.body()
+                logger.info(f"Root route request received ({len(body)} bytes)")
                 
-                await self._agent.handle_root_route(body)
+                with tracing.start_span('POST /', parent=tracing.extract(request.headers)), \
+                        request_profiler.profile_request('route', '/'):
+                    await self._agent.handle_root_route(body)
                 return {"status": "OK", "message": "Request accepted for processing"}
+            except ValidationError as e:
+                raise HTTPException(status_code=400, detail=str(e))
             except Exception as e:
                 logger.exception("Error handling root request: %s", str(e))
                 raise HTTPException(
@@ -140,8 +249,26 @@ class AgentServer:
                 if 'messages' not in body:
                     body['messages'] = []
                 
-                result = await self._agent.handle_tool_route(tool_name, body)
+                # Async mode: accept now, run in the background, poll /jobs/{job_id} or get a callback
+                if 'respond-async' in request.headers.get('prefer', ''):
+                    job = self._agent.submit_tool_job(tool_name, body, body.pop('callback_url', None))
+                    return JSONResponse(
+                        status_code=202,
+                        content=job.to_dict(),
+                        headers={"Location": f"/jobs/{job.id}", "Preference-Applied": "respond-async"}
+                    )
+                
+                # Continue the runtime's trace so the tool call shows up in the task timeline
+                with tracing.start_span('POST /tools/{tool_name}', parent=tracing.extract(request.headers), tool=tool_name), \
+                        request_profiler.profile_request('route', f'/tools/{tool_name}'):
+                    result = await self._agent.handle_tool_route(tool_name, body)
                 return result
+            except ToolError as e:
+                raise HTTPException(status_code=404, detail=str(e))
+            except JobStoreFullError as e:
+                raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
             except Exception as e:
                 logger.exception("Error handling tool request for %s: %s", tool_name, str(e))
                 raise HTTPException(
@@ -149,6 +276,64 @@ class AgentServer:
                     detail=f"Error executing tool {tool_name}: {str(e)}"
                 )
         
+        @self.app.get("/jobs/{job_id}", dependencies=[Depends(verify_auth_token)])
+        async def job_status(job_id: str):
+            """Status and, once finished, result or error of an async tool job."""
+            if not self._agent:
+                raise HTTPException(status_code=500, detail="Agent not initialized")
+            job = self._agent.jobs.get(job_id)
+            if job is None:
+                raise HTTPException(status_code=404, detail="Job not found or expired")
+            return job.to_dict()
+        
+        @self.app.post("/tools/{tool_name}/stream", dependencies=[Depends(verify_auth_token)])
+        async def tool_stream(tool_name: str, request: Request):
+            """Streaming tool route: sends the tool's output and progress as Server-Sent Events."""
+            if not self._agent:
+                raise HTTPException(status_code=500, detail="Agent not initialized")
+            
+            try:
+                body = await request.json()
+                if not isinstance(body, dict):
+                    raise ValueError('The request body must be a JSON object')
+                events = self._agent.handle_tool_stream(tool_name, body)
+            except ToolError as e:
+                raise HTTPException(status_code=404, detail=str(e))
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"Invalid request body: {str(e)}")
+            
+            return StreamingResponse(
+                self._event_stream(tool_name, events, tracing.extract(request.headers)),
+                media_type="text/event-stream",
+                # Ask reverse proxies not to buffer the stream
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
+        
+        @self.app.post("/batch/tools", dependencies=[Depends(verify_auth_token)])
+        async def tool_batch(request: Request):
+            """Batch tool route: runs several tool calls sharing one set of messages and action."""
+            if not self._agent:
+                raise HTTPException(status_code=500, detail="Agent not initialized")
+                
+            try:
+                body = await request.json()
+                if not isinstance(body, dict) or not isinstance(body.get('calls'), list):
+                    raise HTTPException(status_code=400, detail="Missing required parameter: calls")
+                
+                with tracing.start_span('POST /batch/tools', parent=tracing.extract(request.headers),
+                                        calls=len(body['calls'])), \
+                        request_profiler.profile_request('route', '/batch/tools'):
+                    result = await self._agent.handle_tool_batch(body)
+                return result
+            except HTTPException:
+                raise
+            except Exception as e:
+                logger.exception("Error handling tool batch: %s", str(e))
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"Error executing tool batch: {str(e)}"
+                )
+        
         @self.app.post("/task-complete", dependencies=[Depends(verify_auth_token)])
         async def task_complete(request: Request):
             """Endpoint to explicitly mark a task as complete."""
@@ -178,6 +363,66 @@ class AgentServer:
                     detail=f"Error completing task: {str(e)}"
                 )
     
+    async def _event_stream(
+        self,
+        tool_name: str,
+        events: AsyncIterator[Dict[str, Any]],
+        parent: Optional[tracing.SpanContext]
+    ) -> AsyncIterator[bytes]:
+        """
+        Encode tool events as Server-Sent Events.
+        
+        The tool runs in its own task and hands events over through a small
+        bounded buffer, so a slow client pauses the tool instead of letting
+        output pile up in memory. While the tool is quiet, keep-alive comments
+        stop proxies from timing out the connection.
+        """
+        buffer: asyncio.Queue = asyncio.Queue(maxsize=int(os.environ.get("OPENSERV_STREAM_BUFFER", "16")))
+        heartbeat = float(os.environ.get("OPENSERV_STREAM_HEARTBEAT", "15"))
+        end = object()
+        
+        async def produce() -> None:
+            try:
+                with tracing.start_span('POST /tools/{tool_name}/stream', parent=parent, tool=tool_name), \
+                        request_profiler.profile_request('route', f'/tools/{tool_name}/stream'):
+                    async for event in events:
+                        await buffer.put(event)
+            except Exception as e:
+                logger.exception("Error streaming tool %s: %s", tool_name, str(e))
+                await buffer.put({'event': 'error', 'data': {'error': str(e)}})
+            await buffer.put(end)
+        
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(buffer.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield b': keep-alive\n\n'
+                    continue
+                if event is end:
+                    break
+                yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n".encode()
+        finally:
+            # Stops the tool if the client went away
+            producer.cancel()
+    
+    @asynccontextmanager
+    async def _lifespan(self, app: FastAPI):
+        """Start and stop background services with the server."""
+        monitor_enabled = os.environ.get("OPENSERV_LOOP_MONITOR", "1") != "0"
+        if monitor_enabled:
+            loop_monitor.start()
+        if self._agent:
+            await self._agent.on_startup()
+        try:
+            yield
+        finally:
+            if self._agent:
+                await self._agent.on_shutdown()
+            if monitor_enabled:
+                await loop_monitor.stop()
+    
     def add_middleware(self):
         """Add security and performance middleware to the FastAPI app."""
         # Add CORS middleware
@@ -194,11 +439,19 @@ class AgentServer:
         
         # Add rate limiting
         self.app.add_middleware(RateLimitMiddleware, requests_per_minute=300)
+        
+        # Add request metrics (outermost, so rate-limited requests are counted too)
+        self.app.add_middleware(MetricsMiddleware, server=self)
 
     def set_agent(self, agent: Any) -> None:
         """Set the agent instance for request handling."""
         self._agent = agent
 
+    @property
+    def metrics_agent(self) -> str:
+        """The agent label of this server's request metrics."""
+        return self._agent.metrics_agent if self._agent else DEFAULT_AGENT
+
     def start(self) -> None:
         """Start the HTTP server."""
         logger.info("Agent server starting on port %s", self.config.port)
@@ -0,0 +1,109 @@
+"""
+Adaptive load shedding for root-route work.
+
+Follows the CoDel idea: a short burst that queues briefly is fine, but a
+queue that stays above its target delay for a whole interval means the
+agent is taking on more work than it can finish. Two delays are watched:
+
+- sojourn: how long the oldest action has been waiting in the scheduler for
+  capacity; actions held back only by their own workspace's limit don't count
+- event-loop lag, as measured by the loop monitor
+
+Once either has stayed above its target for ``interval`` seconds, new
+root-route work is refused with 503 and Retry-After until the delay drops
+back below target. The same state backs the readiness endpoint, so a load
+balancer can route around a saturated replica.
+"""
+
+import math
+import time
+from typing import Any, Dict, Optional
+
+from .loop_monitor import LoopMonitor
+from .metrics import DEFAULT_AGENT, REGISTRY
+from .scheduler import ActionScheduler
+
+SHEDDING = REGISTRY.gauge(
+    'openserv_load_shedding',
+    'Whether new root-route work is being refused (1) or accepted (0), by agent.',
+    ('agent',),
+)
+SHED_REQUESTS = REGISTRY.counter(
+    'openserv_shed_requests_total',
+    'Root-route requests refused by load shedding, by agent.',
+    ('agent',),
+)
+
+
+class LoadShedder:
+    """Decides whether to accept new work from queue sojourn time and event-loop lag."""
+
+    def __init__(
+        self,
+        scheduler: ActionScheduler,
+        monitor: LoopMonitor,
+        sojourn_target: float = 0.5,
+        lag_target: float = 0.2,
+        interval: float = 1.0,
+        agent: str = DEFAULT_AGENT,
+    ) -> None:
+        """
+        Args:
+            scheduler: Scheduler whose queue delay is watched
+            monitor: Loop monitor whose lag is watched
+            sojourn_target: Acceptable wait of the oldest queued action, in seconds
+            lag_target: Acceptable event-loop lag, in seconds
+            interval: How long a delay must stay above target before shedding starts
+            agent: Agent label of the shedder's metrics
+        """
+        self.scheduler = scheduler
+        self.monitor = monitor
+        self.sojourn_target = sojourn_target
+        self.lag_target = lag_target
+        self.interval = interval
+        self._above_since: Optional[float] = None
+        self._shedding = False
+        SHEDDING.labels(agent).set_function(lambda: 1 if self._shedding else 0)
+        self._shed_requests = SHED_REQUESTS.labels(agent)
+
+    def _update(self) -> None:
+        now = time.monotonic()
+        above = (
+            self.scheduler.oldest_wait() > self.sojourn_target
+            or self.monitor.current_lag() > self.lag_target
+        )
+        if not above:
+            self._above_since = None
+            self._shedding = False
+        elif self._above_since is None:
+            self._above_since = now
+        elif now - self._above_since >= self.interval:
+            self._shedding = True
+
+    @property
+    def shedding(self) -> bool:
+        self._update()
+        return self._shedding
+
+    def admit(self) -> bool:
+        """Whether to accept a new piece of root-route work; refusals are counted."""
+        if self.shedding:
+            self._shed_requests.inc()
+            return False
+        return True
+
+    def retry_after(self) -> int:
+        """Seconds a refused client should wait, scaled to the current queue delay."""
+        delay = max(self.scheduler.oldest_wait(), self.monitor.current_lag(), self.interval)
+        return max(1, math.ceil(delay))
+
+    def status(self) -> Dict[str, Any]:
+        """Saturation details for the readiness endpoint."""
+        shedding = self.shedding
+        return {
+            'status': 'saturated' if shedding else 'ready',
+            'queue_delay': round(self.scheduler.oldest_wait(), 4),
+            'loop_lag': round(self.monitor.current_lag(), 4),
+            'queued': self.scheduler.queued(),
+            'running': self.scheduler.running,
+        }
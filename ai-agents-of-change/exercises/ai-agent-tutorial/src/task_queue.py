@@ -0,0 +1,274 @@
+"""
+Durable local queue for do-task actions.
+
+Accepted actions are written to an embedded SQLite database (WAL mode)
+before the root route returns 200, so they survive crashes and restarts. A
+dispatcher hands them back out in arrival order without waiting for them to
+finish, and each is deleted when its run is done. At most ``max_in_flight``
+are handed out at once; the scheduler they are handed to decides which
+workspace goes first.
+
+Writes are group-committed: concurrent ``put`` calls are gathered for a few
+milliseconds and committed in one transaction, so durability costs one fsync
+per batch rather than one per request. All SQLite work runs on a single
+dedicated thread, off the event loop.
+
+Only a bounded window of the backlog is held in memory. Workers can be
+rate-limited, so a large backlog left by a restart drains at a controlled
+pace instead of all at once.
+"""
+
+import asyncio
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, List, Optional, Set, Tuple
+
+from .exceptions import TaskQueueClosedError
+from .metrics import DEFAULT_AGENT, REGISTRY
+
+logger = logging.getLogger(__name__)
+
+QUEUE_DEPTH = REGISTRY.gauge(
+    'openserv_task_queue_depth',
+    'Actions recorded in the durable task queue and not yet completed, by agent.',
+    ('agent',),
+)
+QUEUE_COMMITS = REGISTRY.histogram(
+    'openserv_task_queue_commit_batch_size',
+    'Number of queue writes committed together in one transaction, by agent.',
+    ('agent',),
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+
+
+class QueuedAction:
+    """An action read back from the queue."""
+    __slots__ = ('id', 'kind', 'body', 'enqueued_at')
+
+    def __init__(self, id: int, kind: str, body: bytes, enqueued_at: float) -> None:
+        self.id = id
+        self.kind = kind
+        self.body = body
+        self.enqueued_at = enqueued_at
+
+
+class DurableTaskQueue:
+    """A SQLite-backed FIFO queue with group commit and a rate-limited, bounded dispatcher."""
+
+    def __init__(
+        self,
+        path: str,
+        max_in_flight: int = 128,
+        drain_rate: float = 0.0,
+        batch_window: float = 0.002,
+        max_batch: int = 256,
+        prefetch: int = 100,
+        synchronous: str = 'NORMAL',
+        agent: str = DEFAULT_AGENT,
+    ) -> None:
+        """
+        Args:
+            path: SQLite database file
+            max_in_flight: Maximum queued actions handed out and not yet finished
+            drain_rate: Maximum actions started per second; 0 means unlimited
+            batch_window: How long writes wait to be committed together, in seconds
+            max_batch: Maximum writes per transaction
+            prefetch: Maximum actions read ahead into memory
+            synchronous: SQLite synchronous mode. NORMAL survives process crashes
+                in WAL mode; FULL also survives power loss.
+            agent: Agent label of the queue's metrics
+        """
+        self.path = path
+        self.max_in_flight = max_in_flight
+        self.drain_rate = drain_rate
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.prefetch = prefetch
+        self.synchronous = synchronous
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='openserv-task-queue')
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pending: List[Tuple[str, Any, Optional[asyncio.Future]]] = []
+        self._flush_scheduled = False
+        self._ready: Optional[asyncio.Queue] = None
+        self._new_rows: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._in_flight: Set[asyncio.Task] = set()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._last_id = 0
+        self._next_start = 0.0
+        self._depth = 0
+        QUEUE_DEPTH.labels(agent).set_function(lambda: self._depth)
+        self._commits = QUEUE_COMMITS.labels(agent)
+
+    async def _run(self, func: Callable, *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def _open_sync(self) -> int:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f'PRAGMA synchronous={self.synchronous}')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS actions ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, '
+            'body BLOB NOT NULL, enqueued_at REAL NOT NULL)'
+        )
+        self._conn = conn
+        return conn.execute('SELECT COUNT(*) FROM actions').fetchone()[0]
+
+    async def start(self, handler: Callable[[QueuedAction], Awaitable[None]]) -> None:
+        """Open the database and start the feeder and dispatcher tasks."""
+        self._depth = await self._run(self._open_sync)
+        if self._depth:
+            logger.info(f"Recovered {self._depth} queued actions from {self.path}")
+        self._ready = asyncio.Queue(maxsize=self.prefetch)
+        self._new_rows = asyncio.Event()
+        self._new_rows.set()
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._tasks.append(asyncio.create_task(self._feed()))
+        self._tasks.append(asyncio.create_task(self._dispatch(handler)))
+        logger.info(f"Durable task queue started at {self.path} with up to {self.max_in_flight} actions in flight")
+
+    async def stop(self) -> None:
+        """Stop dispatching, cancel running actions and close the database. Unfinished actions stay queued."""
+        tasks = self._tasks + list(self._in_flight)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        while self._pending and self._conn is not None:
+            await self._flush()
+        if self._conn is not None:
+            await self._run(self._conn.close)
+            self._conn = None
+        self._executor.shutdown(wait=False)
+        # Writes that could not be committed must not leave their callers waiting
+        pending, self._pending = self._pending, []
+        for _, _, future in pending:
+            if future is not None and not future.done():
+                future.set_exception(TaskQueueClosedError(f"Task queue at {self.path} was stopped"))
+
+    async def put(self, kind: str, body: bytes) -> None:
+        """
+        Record an action; returns once it has been committed to disk.
+
+        Raises:
+            TaskQueueClosedError: If the queue has not been started or has been stopped
+        """
+        if self._conn is None:
+            raise TaskQueueClosedError(f"Task queue at {self.path} is not running")
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(('put', (kind, body, time.time()), future))
+        self._schedule_flush()
+        await future
+
+    def ack(self, action_id: int) -> None:
+        """Remove a finished action. Deletes are committed with the next batch."""
+        self._pending.append(('delete', action_id, None))
+        self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        if len(self._pending) >= self.max_batch:
+            asyncio.get_running_loop().create_task(self._flush())
+        elif not self._flush_scheduled:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_later(
+                self.batch_window, lambda: asyncio.ensure_future(self._flush())
+            )
+
+    def _commit_sync(self, batch: List[Tuple[str, Any, Optional[asyncio.Future]]]) -> None:
+        conn = self._conn
+        conn.execute('BEGIN')
+        try:
+            for op, value, _ in batch:
+                if op == 'put':
+                    conn.execute('INSERT INTO actions (kind, body, enqueued_at) VALUES (?, ?, ?)', value)
+                else:
+                    conn.execute('DELETE FROM actions WHERE id = ?', (value,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    async def _flush(self) -> None:
+        self._flush_scheduled = False
+        if not self._pending or self._conn is None:
+            return
+        batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+        if self._pending:
+            self._schedule_flush()
+        self._commits.observe(len(batch))
+        try:
+            await self._run(self._commit_sync, batch)
+        except Exception as e:
+            logger.error(f"Failed to commit {len(batch)} queue writes: {str(e)}")
+            for _, _, future in batch:
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            return
+        puts = 0
+        for op, _, future in batch:
+            if op == 'put':
+                puts += 1
+                if not future.done():
+                    future.set_result(None)
+            else:
+                self._depth -= 1
+        self._depth += puts
+        if puts:
+            self._new_rows.set()
+
+    def _fetch_sync(self, after_id: int, limit: int) -> List[tuple]:
+        return self._conn.execute(
+            'SELECT id, kind, body, enqueued_at FROM actions WHERE id > ? ORDER BY id LIMIT ?',
+            (after_id, limit)
+        ).fetchall()
+
+    async def _feed(self) -> None:
+        # Reads the backlog in id order into the bounded ready queue
+        while True:
+            await self._new_rows.wait()
+            self._new_rows.clear()
+            while True:
+                rows = await self._run(self._fetch_sync, self._last_id, self.prefetch)
+                if not rows:
+                    break
+                for row in rows:
+                    self._last_id = row[0]
+                    await self._ready.put(QueuedAction(*row))
+
+    async def _throttle(self) -> None:
+        if self.drain_rate <= 0:
+            return
+        now = time.monotonic()
+        start_at = max(now, self._next_start)
+        self._next_start = start_at + 1.0 / self.drain_rate
+        if start_at > now:
+            await asyncio.sleep(start_at - now)
+
+    async def _dispatch(self, handler: Callable[[QueuedAction], Awaitable[None]]) -> None:
+        # Hands actions out without waiting for them, so the scheduler sees the whole in-flight window
+        while True:
+            item = await self._ready.get()
+            await self._slots.acquire()
+            await self._throttle()
+            task = asyncio.ensure_future(handler(item))
+            self._in_flight.add(task)
+            task.add_done_callback(lambda t, item=item: self._finished(item, t))
+
+    def _finished(self, item: QueuedAction, task: asyncio.Task) -> None:
+        self._in_flight.discard(task)
+        self._slots.release()
+        if task.cancelled():
+            # Stopped before it finished: leave it queued for the next start
+            return
+        if task.exception() is not None:
+            # The action has been attempted; drop it rather than retrying forever
+            logger.error(f"Queued {item.kind} action {item.id} failed: {str(task.exception())}")
+        self.ack(item.id)
+
+    @property
+    def depth(self) -> int:
+        return self._depth
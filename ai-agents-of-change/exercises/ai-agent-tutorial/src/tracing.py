@@ -0,0 +1,323 @@
+"""
+Lightweight tracing for the OpenServ Agent library.
+
+Spans are opened around the root route, task execution, runtime calls, every
+iteration of the process tool loop, capability runs and upstream requests.
+The active span is tracked in a context variable, so spans opened in tasks
+spawned with ``asyncio.create_task`` are parented correctly.
+
+Trace context travels between the agent, the runtime and the tool routes in
+the W3C ``traceparent`` header.
+
+Tracing is off unless an exporter is configured. Set ``OPENSERV_TRACE_FILE``
+to append finished spans to a JSON-lines file, or call ``set_exporter`` with
+an ``InMemorySpanExporter`` to collect them in-process. The whole timeline of
+one task can then be rebuilt with::
+
+    python -m src.tracing traces.jsonl <trace_id>
+"""
+
+import contextvars
+import functools
+import json
+import logging
+import os
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, Iterable, List, Mapping, MutableMapping, Optional
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_HEADER = 'traceparent'
+
+
+class SpanContext:
+    """The identifiers that link a span to its trace and parent."""
+    __slots__ = ('trace_id', 'span_id')
+
+    def __init__(self, trace_id: str, span_id: str) -> None:
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+    def to_traceparent(self) -> str:
+        return f'00-{self.trace_id}-{self.span_id}-01'
+
+    @classmethod
+    def from_traceparent(cls, value: Optional[str]) -> Optional['SpanContext']:
+        """Parse a ``traceparent`` header, returning None if it is missing or malformed."""
+        if not value:
+            return None
+        parts = value.strip().split('-')
+        if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+            return None
+        if parts[1] == '0' * 32 or parts[2] == '0' * 16:
+            return None
+        return cls(parts[1].lower(), parts[2].lower())
+
+
+class Span:
+    """A timed operation within a trace."""
+    __slots__ = ('context', 'parent_id', 'name', 'attributes', 'start_ns', 'end_ns', 'status', '_token')
+
+    def __init__(self, name: str, context: SpanContext, parent_id: Optional[str], attributes: Dict[str, Any]) -> None:
+        self.name = name
+        self.context = context
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.status = 'ok'
+        self._token: Optional[contextvars.Token] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_exception(self, error: BaseException) -> None:
+        self.status = 'error'
+        self.attributes['error.type'] = type(error).__name__
+        self.attributes['error.message'] = str(error)
+
+    def end(self) -> None:
+        """Finish the span and hand it to the exporter. Ending twice is a no-op."""
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if self._token is not None:
+            try:
+                _current_span.reset(self._token)
+            except ValueError:
+                # Ended from a different context than it was started in
+                _current_span.set(None)
+            self._token = None
+        exporter = _exporter
+        if exporter is not None:
+            exporter.export(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'trace_id': self.context.trace_id,
+            'span_id': self.context.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start_ns': self.start_ns,
+            'end_ns': self.end_ns,
+            'duration_ms': (self.end_ns - self.start_ns) / 1e6 if self.end_ns else None,
+            'status': self.status,
+            'attributes': self.attributes,
+        }
+
+    def __enter__(self) -> 'Span':
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc is not None:
+            self.record_exception(exc)
+        self.end()
+
+
+class _NoopSpan:
+    """Stand-in returned while tracing is disabled, so call sites stay unconditional."""
+    __slots__ = ()
+    context = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def record_exception(self, error: BaseException) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+    def __enter__(self) -> '_NoopSpan':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar('openserv_current_span', default=None)
+
+
+class InMemorySpanExporter:
+    """Collects finished spans in a list - a collector stand-in for tests and benchmarks."""
+
+    def __init__(self) -> None:
+        self.spans: List[Dict[str, Any]] = []
+
+    def export(self, span: Span) -> None:
+        self.spans.append(span.to_dict())
+
+    def flush(self) -> None:
+        pass
+
+    def clear(self) -> None:
+        self.spans.clear()
+
+
+class FileSpanExporter:
+    """
+    Appends finished spans to a JSON-lines file.
+
+    Spans are buffered and written in batches to keep file I/O off the
+    per-span path; the buffer is flushed when it fills up, when it gets
+    older than ``flush_interval`` seconds and on shutdown.
+    """
+
+    def __init__(self, path: str, batch_size: int = 64, flush_interval: float = 1.0) -> None:
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer: List[str] = []
+        self._last_flush = time.monotonic()
+
+    def export(self, span: Span) -> None:
+        self._buffer.append(json.dumps(span.to_dict(), default=str))
+        if len(self._buffer) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        lines, self._buffer = self._buffer, []
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+        except OSError as e:
+            logger.error(f"Failed to write spans to {self.path}: {str(e)}")
+
+
+_exporter: Optional[Any] = None
+
+
+def set_exporter(exporter: Optional[Any]) -> None:
+    """Install a span exporter, or pass None to turn tracing off."""
+    global _exporter
+    if _exporter is not None:
+        _exporter.flush()
+    _exporter = exporter
+
+
+def flush() -> None:
+    """Write out any buffered spans."""
+    if _exporter is not None:
+        _exporter.flush()
+
+
+def is_enabled() -> bool:
+    return _exporter is not None
+
+
+def _new_id(bits: int) -> str:
+    return f'{random.getrandbits(bits):0{bits // 4}x}'
+
+
+def current_span():
+    """Get the active span, or a no-op span when there is none."""
+    return _current_span.get() or NOOP_SPAN
+
+
+def start_span(name: str, parent: Optional[SpanContext] = None, **attributes: Any):
+    """
+    Open a span as a child of ``parent`` or of the active span.
+
+    Use it as a context manager to make the span active for the enclosed
+    block; without ``with`` the caller must call ``end()`` itself.
+    """
+    if _exporter is None:
+        return NOOP_SPAN
+    if parent is None:
+        active = _current_span.get()
+        parent = active.context if active is not None else None
+    if parent is not None:
+        context = SpanContext(parent.trace_id, _new_id(64))
+        parent_id = parent.span_id
+    else:
+        context = SpanContext(_new_id(128), _new_id(64))
+        parent_id = None
+    return Span(name, context, parent_id, attributes)
+
+
+def traced(name: str) -> Callable:
+    """Decorator that wraps an async function in a span."""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if _exporter is None:
+                return await func(*args, **kwargs)
+            with start_span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def inject(headers: MutableMapping[str, str]) -> MutableMapping[str, str]:
+    """Add the active span's ``traceparent`` header to outbound request headers."""
+    span = _current_span.get()
+    if span is not None:
+        headers[TRACEPARENT_HEADER] = span.context.to_traceparent()
+    return headers
+
+
+def extract(headers: Mapping[str, str]) -> Optional[SpanContext]:
+    """Read the trace context from inbound request headers."""
+    if _exporter is None:
+        return None
+    return SpanContext.from_traceparent(headers.get(TRACEPARENT_HEADER))
+
+
+def load_spans(path: str, trace_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Read exported spans back from a JSON-lines file, optionally for one trace."""
+    spans = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            span = json.loads(line)
+            if trace_id is None or span['trace_id'] == trace_id:
+                spans.append(span)
+    return spans
+
+
+def format_timeline(spans: Iterable[Dict[str, Any]]) -> str:
+    """Render spans as an indented tree with offsets relative to the trace start."""
+    spans = sorted(spans, key=lambda s: s['start_ns'])
+    if not spans:
+        return ''
+    children: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    ids = {s['span_id'] for s in spans}
+    for span in spans:
+        parent = span['parent_id'] if span['parent_id'] in ids else None
+        children.setdefault(parent, []).append(span)
+    origin = spans[0]['start_ns']
+    lines: List[str] = []
+
+    def walk(parent: Optional[str], depth: int) -> None:
+        for span in children.get(parent, []):
+            offset = (span['start_ns'] - origin) / 1e6
+            duration = span.get('duration_ms')
+            duration = f'{duration:.1f}ms' if duration is not None else 'unfinished'
+            attrs = ' '.join(f'{k}={v}' for k, v in span['attributes'].items())
+            status = ' [error]' if span['status'] == 'error' else ''
+            lines.append(f"{offset:>10.1f}ms {'  ' * depth}{span['name']} {duration}{status} {attrs}".rstrip())
+            walk(span['span_id'], depth + 1)
+
+    walk(None, 0)
+    return '\n'.join(lines)
+
+
+_trace_file = os.environ.get('OPENSERV_TRACE_FILE')
+if _trace_file:
+    set_exporter(FileSpanExporter(_trace_file))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('usage: python -m src.tracing <trace-file> [trace_id]')
+        sys.exit(1)
+    print(format_timeline(load_spans(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)))
@@ -1,8 +1,99 @@
 from enum import Enum
-from typing import Optional, List, Dict, Any, Union, Literal, Callable
-from pydantic import BaseModel, Field, root_validator
+from functools import lru_cache
+from typing import Optional, List, Dict, Any, Union, Literal, Callable, MutableSequence, Type, TypeVar, Generic, Iterator, Iterable
+from typing_extensions import Annotated
+from pydantic import BaseModel, Field, PrivateAttr, PlainValidator, PlainSerializer, TypeAdapter
+from pydantic import ValidationError as PydanticValidationError
 from datetime import datetime
 
+from .exceptions import ValidationError
+
+M = TypeVar('M', bound=BaseModel)
+
+@lru_cache(maxsize=None)
+def _list_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(List[model])
+
+class LazyModelList(MutableSequence, Generic[M]):
+    """
+    A list of models that is only validated when it is first read.
+
+    Large, rarely used parts of an action (workspace agents, integrations,
+    memories) are kept as the raw decoded JSON until something accesses an
+    element. Serializing an untouched list returns the raw data unchanged.
+
+    Because of this, an invalid element raises pydantic's ValidationError on
+    first access rather than when the action is parsed. The usual list
+    methods (``append``, ``extend``, item assignment) work on the validated
+    models, but the object is not a ``list`` instance.
+    """
+    __slots__ = ('_model', '_raw', '_items')
+
+    def __init__(self, model: Type[M], raw: List[Any]) -> None:
+        self._model = model
+        self._raw = raw
+        self._items: Optional[List[M]] = None
+
+    @property
+    def raw(self) -> List[Any]:
+        return self._raw
+
+    def _materialize(self) -> List[M]:
+        if self._items is None:
+            self._items = _list_adapter(self._model).validate_python(self._raw)
+        return self._items
+
+    def __getitem__(self, index):
+        return self._materialize()[index]
+
+    def __iter__(self) -> Iterator[M]:
+        return iter(self._materialize())
+
+    def __setitem__(self, index, value) -> None:
+        self._materialize()[index] = value
+
+    def __delitem__(self, index) -> None:
+        del self._materialize()[index]
+
+    def insert(self, index: int, value: M) -> None:
+        self._materialize().insert(index, value)
+
+    def __len__(self) -> int:
+        return len(self._items) if self._items is not None else len(self._raw)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, LazyModelList):
+            other = other._materialize()
+        return self._materialize() == other
+
+    def __repr__(self) -> str:
+        state = 'validated' if self._items is not None else 'raw'
+        return f'LazyModelList[{self._model.__name__}]({len(self._raw)} items, {state})'
+
+    def dump(self, mode: str = 'python') -> List[Any]:
+        if self._items is None:
+            return self._raw
+        return [item.model_dump(mode=mode) for item in self._items]
+
+def _lazy_list(model: Type[M]):
+    """Annotated list type whose elements are validated lazily on first access."""
+    def validate(value: Any) -> Any:
+        if isinstance(value, LazyModelList):
+            return value
+        if not isinstance(value, list):
+            raise ValueError('Input should be a valid list')
+        if value and all(isinstance(v, model) for v in value):
+            # Already validated models built in Python
+            return value
+        return LazyModelList(model, value)
+
+    def serialize(value: Any, info) -> Any:
+        if isinstance(value, LazyModelList):
+            return value.dump(info.mode)
+        return [v.model_dump(mode=info.mode) if isinstance(v, BaseModel) else v for v in value]
+
+    return Annotated[List[model], PlainValidator(validate), PlainSerializer(serialize)]
+
 class AgentKind(str, Enum):
     EXTERNAL = 'external'
     ELIZA = 'eliza'
@@ -64,7 +155,7 @@ class Workspace(BaseModel):
     id: int
     goal: str
     bucket_folder: str
-    agents: List[Agent]
+    agents: _lazy_list(Agent)
 
 class Integration(BaseModel):
     id: int
@@ -86,8 +177,16 @@ class AgentAction(BaseModel):
     me: AgentBase
     task: Optional[Task] = None
     workspace: Workspace
-    integrations: List[Integration] = []
-    memories: List[Memory] = []
+    integrations: _lazy_list(Integration) = []
+    memories: _lazy_list(Memory) = []
+
+    # The request body this action was parsed from, if it came in as raw JSON
+    _raw_json: Optional[bytes] = PrivateAttr(default=None)
+
+    @property
+    def raw_json(self) -> Optional[bytes]:
+        """The original JSON bytes of the action, reused when forwarding it unchanged."""
+        return self._raw_json
 
 class DoTaskAction(AgentAction):
     type: Literal['do-task']
@@ -103,6 +202,45 @@ class RespondChatMessageAction(AgentAction):
     type: Literal['respond-chat-message']
     messages: List[ChatMessage]
 
+# Precompiled validator for root-route payloads, dispatching on the action type
+_ROOT_ACTION_ADAPTER = TypeAdapter(
+    Annotated[Union[DoTaskAction, RespondChatMessageAction], Field(discriminator='type')]
+)
+
+def parse_action(body: Union[bytes, bytearray, str, Dict[str, Any]]) -> Union[DoTaskAction, RespondChatMessageAction]:
+    """
+    Validate a root-route payload into a DoTaskAction or RespondChatMessageAction.
+
+    Raw JSON is validated in a single pass straight from the bytes, without
+    building an intermediate dict, and is kept on the action so it can be
+    forwarded to the runtime without re-serializing.
+    """
+    try:
+        if isinstance(body, dict):
+            return _ROOT_ACTION_ADAPTER.validate_python(body)
+        action = _ROOT_ACTION_ADAPTER.validate_json(body)
+    except PydanticValidationError as e:
+        raise ValidationError(_describe_action_error(e)) from e
+    action._raw_json = body.encode('utf-8') if isinstance(body, str) else bytes(body)
+    return action
+
+def _describe_action_error(error: PydanticValidationError) -> str:
+    """A short, readable reason a root-route payload was rejected."""
+    details = error.errors(include_url=False)
+    first = details[0]
+    if first['type'] == 'union_tag_invalid':
+        return (f"Invalid action type: {first['ctx']['tag']!r} "
+                f"(expected 'do-task' or 'respond-chat-message')")
+    if first['type'] == 'union_tag_not_found':
+        return "Missing action type (expected 'do-task' or 'respond-chat-message')"
+    if first['type'] == 'json_invalid':
+        return first['msg']
+    problems = '; '.join(
+        f"{'.'.join(str(part) for part in d['loc'][1:]) or '(action)'}: {d['msg']}" for d in details[:5]
+    )
+    more = f" (and {len(details) - 5} more)" if len(details) > 5 else ''
+    return f"Invalid {first['loc'][0] if first['loc'] else 'action'} action: {problems}{more}"
+
 class MessageDict(BaseModel):
     """
     A message dict with flexible ID type to match TypeScript SDK.
@@ -118,42 +256,77 @@ class MessageDict(BaseModel):
     class Config:
         extra = "allow"
 
+def _message_to_dict(msg: Any) -> Any:
+    if isinstance(msg, dict):
+        return msg
+    if hasattr(msg, 'model_dump'):
+        return msg.model_dump()
+    if hasattr(msg, 'dict'):
+        return msg.dict()
+    return msg
+
+class MessageHistory(list):
+    """
+    A conversation history that is handed around without copying its messages.
+
+    It is a list of message dicts, so it can be indexed, extended and
+    serialized like any list. Building one from another history, or
+    extending one with ``with_message``, copies only the list of references;
+    the message dicts are shared, so treat them as read-only and use
+    ``to_list`` for a copy with private dicts.
+
+    ``with_message`` and ``with_messages`` return a new history and leave
+    this one as it is. Each capability run gets its own history, so a tool
+    that appends to or removes from it changes only its own copy.
+    """
+    __slots__ = ()
+
+    def __init__(self, messages: Iterable[Any] = ()) -> None:
+        if isinstance(messages, MessageHistory):
+            super().__init__(messages)
+        else:
+            # Converts message models to dicts; dicts are kept by reference
+            super().__init__(_message_to_dict(m) for m in messages)
+
+    def with_message(self, message: Any) -> 'MessageHistory':
+        """Get a history with ``message`` added at the end."""
+        return self.with_messages((message,))
+
+    def with_messages(self, messages: Iterable[Any]) -> 'MessageHistory':
+        """Get a history with ``messages`` added at the end."""
+        history = MessageHistory(self)
+        list.extend(history, (_message_to_dict(m) for m in messages))
+        return history
+
+    def as_list(self) -> List[Any]:
+        """The messages as a list for read-only consumers such as the LLM client."""
+        return self
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """A private, mutable copy of the history with copied message dicts."""
+        return [dict(m) if isinstance(m, dict) else m for m in self]
+
+def _validate_history(value: Any) -> MessageHistory:
+    if isinstance(value, MessageHistory):
+        return value
+    if not isinstance(value, (list, tuple)):
+        raise ValueError('messages must be a list')
+    return MessageHistory(value)
+
 class ProcessParams(BaseModel):
     """
     Parameters for the process method.
     
     This model handles messages from various sources, including the OpenAI API
     and the OpenServ runtime, ensuring compatibility with the TypeScript SDK.
+    Messages are held in a MessageHistory: message dicts are kept by reference
+    with their original ID types, and MessageDict instances are converted to dicts.
     """
-    messages: List[Union[Dict[str, Any], MessageDict]]
+    messages: Annotated[MessageHistory, PlainValidator(_validate_history), PlainSerializer(lambda h: h.as_list())]
     
     class Config:
         arbitrary_types_allowed = True
         extra = "allow"
-    
-    @root_validator(pre=True)
-    def ensure_message_format(cls, values):
-        """
-        Ensures that messages are in the correct format, handling both dictionary
-        and MessageDict instances, and converting IDs as needed.
-        """
-        if 'messages' in values:
-            # Convert all messages to properly handle ID types
-            formatted_messages = []
-            
-            for msg in values['messages']:
-                # If already a dict, ensure IDs are properly handled
-                if isinstance(msg, dict):
-                    # If the message has an ID, ensure it's kept as is (no string conversion)
-                    formatted_msg = dict(msg)
-                    formatted_messages.append(formatted_msg)
-                else:
-                    # If it's not a dict (e.g., MessageDict), convert to dict
-                    formatted_messages.append(msg.dict())
-            
-            values['messages'] = formatted_messages
-        
-        return values
 
 class AgentOptions(BaseModel):
     system_prompt: str
@@ -162,6 +335,20 @@ class AgentOptions(BaseModel):
     port: Optional[int] = None
     model: Optional[str] = None
     on_error: Optional[Callable[[Exception, Dict[str, Any]], None]] = None
+    # SQLite file for the durable do-task queue (defaults to OPENSERV_TASK_QUEUE_PATH; unset keeps tasks in memory)
+    task_queue_path: Optional[str] = None
+    # Include/exclude/cap rules for the action sent to the runtime (see projection.py;
+    # defaults to the JSON in OPENSERV_PAYLOAD_PROJECTION)
+    payload_projection: Optional[Dict[str, Any]] = None
+    # Name of the agent when several run in one process (see host.py); used as its
+    # route prefix and to label its metrics
+    name: Optional[str] = None
+    # Backend for tool-loop completions, e.g. a ScriptedBackend for offline load tests
+    # (see llm.py; defaults to OpenAI)
+    llm_backend: Optional[Any] = None
+    # Bearer token callers must send to this agent's routes (defaults to OPENSERV_AUTH_TOKEN);
+    # agents hosted together each check their own
+    auth_token: Optional[str] = None
 
 class GetFilesParams(BaseModel):
     workspace_id: int
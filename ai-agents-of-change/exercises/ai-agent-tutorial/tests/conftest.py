@@ -0,0 +1,53 @@
+import os
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# Tests import the package as ``src``, like the examples and benchmarks
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+os.environ.setdefault('OPENSERV_LOG_LEVEL', 'WARNING')
+
+
+@pytest.fixture
+def make_agent(tmp_path, monkeypatch):
+    """Build agents with test credentials and a private attachment cache directory."""
+    monkeypatch.setenv('OPENSERV_ATTACHMENT_CACHE_DIR', str(tmp_path / 'attachments'))
+    from src.agent import Agent
+    from src.types import AgentOptions
+
+    def make(**options):
+        options.setdefault('system_prompt', 'You are a test agent.')
+        options.setdefault('api_key', 'test-api-key')
+        return Agent(AgentOptions(**options))
+    return make
+
+
+def do_task_payload(task_id=42, workspace_id=7, **task):
+    """A minimal do-task action as the platform sends it."""
+    return {
+        'type': 'do-task',
+        'me': {'id': 1, 'name': 'test-agent', 'kind': 'external'},
+        'task': {'id': task_id, 'description': 'Summarize the notes', 'dependencies': [], **task},
+        'workspace': {'id': workspace_id, 'goal': 'Testing', 'bucket_folder': 'ws', 'agents': []},
+        'integrations': [],
+        'memories': [],
+    }
+
+
+def chat_payload(message_id=1, workspace_id=7, text='hello'):
+    """A minimal respond-chat-message action."""
+    return {
+        'type': 'respond-chat-message',
+        'me': {'id': 1, 'name': 'test-agent', 'kind': 'external'},
+        'workspace': {'id': workspace_id, 'goal': 'Testing', 'bucket_folder': 'ws', 'agents': []},
+        'messages': [{'author': 'user', 'message': text, 'id': message_id, 'createdAt': '2024-01-01T00:00:00Z'}],
+    }
+
+
+@pytest.fixture
+def payloads():
+    """Builders for root-route payloads."""
+    return SimpleNamespace(do_task=do_task_payload, chat=chat_payload)
@@ -0,0 +1,122 @@
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+from src.attachments import AttachmentCache
+
+FILES = {
+    'https://files.example.com/a.txt': b'alpha',
+    'https://files.example.com/a-copy.txt': b'alpha',
+    'https://files.example.com/b.txt': b'bravo',
+}
+
+
+def make_cache(directory, requests=None, **options):
+    cache = AttachmentCache(str(directory), **options)
+
+    def serve(request):
+        if requests is not None:
+            requests.append(str(request.url))
+        return httpx.Response(200, content=FILES[str(request.url)])
+
+    cache._client = httpx.AsyncClient(transport=httpx.MockTransport(serve))
+    cache._semaphore = asyncio.Semaphore(cache.concurrency)
+    return cache
+
+
+async def test_downloads_once_and_stores_identical_content_once(tmp_path):
+    requests = []
+    cache = make_cache(tmp_path, requests)
+    first = await cache.path('https://files.example.com/a.txt')
+    again = await cache.path('https://files.example.com/a.txt')
+    copy = await cache.path('https://files.example.com/a-copy.txt')
+    assert first == again == copy
+    assert first.read_bytes() == b'alpha'
+    assert requests == ['https://files.example.com/a.txt', 'https://files.example.com/a-copy.txt']
+    assert bytes(await cache.view('https://files.example.com/a.txt')) == b'alpha'
+
+
+async def test_prefetch_shares_the_download_with_later_lookups(tmp_path):
+    requests = []
+    cache = make_cache(tmp_path, requests)
+    await cache.prefetch(['https://files.example.com/b.txt'])
+    assert (await cache.path('https://files.example.com/b.txt')).read_bytes() == b'bravo'
+    assert requests == ['https://files.example.com/b.txt']
+
+
+async def test_a_new_cache_picks_up_files_from_a_previous_run(tmp_path):
+    await make_cache(tmp_path).path('https://files.example.com/a.txt')
+    requests = []
+    cache = make_cache(tmp_path, requests)
+    await cache.load()
+    assert cache.cached_path('https://files.example.com/a.txt') is not None
+    assert requests == []
+
+
+async def test_evicts_least_recently_used_files_over_the_size_limit(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=5)
+    await cache.path('https://files.example.com/a.txt')
+    await cache.path('https://files.example.com/b.txt')
+    assert cache.cached_path('https://files.example.com/a.txt') is None
+    assert cache.cached_path('https://files.example.com/b.txt') is not None
+
+
+async def test_load_reads_the_directory_off_the_event_loop(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path)
+    threads = []
+    scan = cache._scan
+
+    def record():
+        threads.append(threading.current_thread())
+        return scan()
+
+    monkeypatch.setattr(cache, '_scan', record)
+    await asyncio.gather(cache.load(), cache.load())
+    assert len(threads) == 1 and threads[0] is not threading.main_thread()
+
+
+async def test_failed_load_is_retried(tmp_path):
+    blocker = tmp_path / 'cache'
+    blocker.write_text('not a directory')
+    cache = make_cache(blocker)
+    with pytest.raises(OSError):
+        await cache.load()
+    blocker.unlink()
+    await cache.load()
+    assert blocker.is_dir()
+
+
+async def test_a_file_deleted_behind_the_cache_is_downloaded_again(tmp_path):
+    requests = []
+    cache = make_cache(tmp_path, requests)
+    path = await cache.path('https://files.example.com/a.txt')
+    path.unlink()
+    assert (await cache.path('https://files.example.com/a.txt')).read_bytes() == b'alpha'
+    assert len(requests) == 2
+
+
+async def test_an_unusable_cache_does_not_stop_the_task(make_agent, payloads, monkeypatch, tmp_path):
+    agent = make_agent()
+    blocker = tmp_path / 'blocker'
+    blocker.write_text('not a directory')
+    agent.attachments = make_cache(blocker)
+    executed, errors = [], []
+
+    async def execute_task(**kwargs):
+        executed.append(kwargs['task_id'])
+        return {'success': True}
+
+    async def mark_task_as_errored(workspace_id, task_id, error):
+        errors.append(task_id)
+
+    monkeypatch.setattr(agent.runtime_client, 'execute_task', execute_task)
+    monkeypatch.setattr(agent, 'mark_task_as_errored', mark_task_as_errored)
+    payload = payloads.do_task(task_id=9, dependencies=[{
+        'id': 1, 'description': 'Gather', 'status': 'done',
+        'attachments': [{'id': 1, 'path': 'a.txt', 'fullUrl': 'https://files.example.com/a.txt'}],
+    }])
+    from src.types import parse_action
+    await agent.do_task(parse_action(payload))
+    assert executed == [9] and errors == []
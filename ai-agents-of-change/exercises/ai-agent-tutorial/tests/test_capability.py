@@ -0,0 +1,66 @@
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from src.capability import Capability, Progress
+
+
+class CountArgs(BaseModel):
+    upto: int
+
+
+def counting_capability(closed):
+    async def count(params, messages):
+        try:
+            yield Progress('starting', 0.0)
+            for i in range(params['args'].upto):
+                yield str(i)
+        finally:
+            closed.append(True)
+    return Capability(name='count', description='Count up', schema=CountArgs, run=count)
+
+
+async def test_run_joins_streamed_chunks_without_progress():
+    closed = []
+    result = await counting_capability(closed).run({'args': {'upto': 3}}, [])
+    assert result == '012'
+    assert closed == [True]
+
+
+async def test_stream_closes_the_run_function_when_the_caller_stops_early():
+    closed = []
+    stream = counting_capability(closed).stream({'args': {'upto': 100}}, [])
+    chunks = []
+    async for chunk in stream:
+        chunks.append(chunk)
+        if len(chunks) == 3:
+            break
+    await stream.aclose()
+    assert isinstance(chunks[0], Progress)
+    assert chunks[1:] == ['0', '1']
+    assert closed == [True]
+
+
+@pytest.fixture
+def client(make_agent):
+    agent = make_agent()
+    agent.add_capability(counting_capability([]))
+    return TestClient(agent.server.app)
+
+
+def test_stream_route_sends_events(client):
+    response = client.post('/tools/count/stream', json={'args': {'upto': 2}})
+    assert response.status_code == 200
+    events = [line for line in response.text.splitlines() if line.startswith('event:')]
+    assert events == ['event: progress', 'event: chunk', 'event: chunk', 'event: done']
+
+
+@pytest.mark.parametrize('body', [b'{"args": ', b'[1, 2]'])
+def test_stream_route_rejects_malformed_bodies_with_400(client, body):
+    response = client.post('/tools/count/stream', content=body)
+    assert response.status_code == 400
+    assert response.json()['detail'].startswith('Invalid request body')
+
+
+def test_stream_route_answers_unknown_tools_with_404(client):
+    assert client.post('/tools/missing/stream', json={}).status_code == 404
@@ -0,0 +1,109 @@
+import gzip
+import json
+
+import httpx
+import pytest
+
+from src import client as client_module
+
+BIG = {'notes': 'x' * 20000}
+
+
+@pytest.fixture
+def make_client(make_agent, monkeypatch):
+    def make(compression='gzip', min_bytes=1024, **env):
+        monkeypatch.setenv('OPENSERV_REQUEST_COMPRESSION', compression)
+        monkeypatch.setenv('OPENSERV_REQUEST_COMPRESSION_MIN_BYTES', str(min_bytes))
+        for name, value in env.items():
+            monkeypatch.setenv(name, str(value))
+        return make_agent().api_client
+    return make
+
+
+def record(client, respond=None):
+    sent = []
+
+    def handler(request):
+        sent.append(request)
+        return respond(request) if respond else httpx.Response(200, json={})
+
+    client.client._transport = httpx.MockTransport(handler)
+    return sent
+
+
+def decoded(request):
+    body = request.content
+    if request.headers.get('content-encoding') == 'gzip':
+        body = gzip.decompress(body)
+    return json.loads(body)
+
+
+async def done(value):
+    return value
+
+
+async def test_large_bodies_are_gzipped(make_client):
+    client = make_client()
+    sent = record(client)
+    await client.post('/tasks', BIG)
+    assert sent[0].headers['content-encoding'] == 'gzip'
+    assert len(sent[0].content) < 1000
+    assert decoded(sent[0]) == BIG
+
+
+async def test_small_bodies_are_sent_as_they_are(make_client):
+    client = make_client()
+    sent = record(client)
+    await client.post('/tasks', {'small': True})
+    assert 'content-encoding' not in sent[0].headers
+
+
+async def test_bodies_above_the_thread_threshold_are_compressed_off_the_loop(make_client, monkeypatch):
+    client = make_client(OPENSERV_REQUEST_COMPRESSION_THREAD_BYTES=2048)
+    threads = []
+    monkeypatch.setattr(client_module.asyncio, 'to_thread',
+                        lambda func, *args: threads.append(func) or done(func(*args)))
+    sent = record(client)
+    await client.post('/tasks', BIG)
+    assert threads == [client_module.compress_body]
+    assert decoded(sent[0]) == BIG
+
+
+async def test_a_host_that_rejects_the_encoding_gets_plain_bodies(make_client):
+    client = make_client()
+
+    def respond(request):
+        if 'content-encoding' in request.headers:
+            return httpx.Response(415)
+        return httpx.Response(200, json={})
+
+    sent = record(client, respond)
+    await client.post('/tasks', BIG)
+    await client.post('/tasks', BIG)
+    assert [request.headers.get('content-encoding') for request in sent] == ['gzip', None, None]
+    assert decoded(sent[1]) == BIG
+
+
+async def test_a_host_that_offers_another_encoding_gets_it(make_client, monkeypatch):
+    monkeypatch.setattr(client_module, '_zstd_compressor', lambda: object())
+    monkeypatch.setattr(client_module, 'compress_body',
+                        lambda data, encoding: gzip.compress(data) if encoding == 'gzip' else b'zstd:' + data)
+    client = make_client('zstd')
+
+    def respond(request):
+        if request.headers.get('content-encoding') == 'zstd':
+            return httpx.Response(415, headers={'accept-encoding': 'gzip'})
+        return httpx.Response(200, json={})
+
+    sent = record(client, respond)
+    await client.post('/tasks', BIG)
+    assert [request.headers.get('content-encoding') for request in sent] == ['zstd', 'gzip']
+
+
+def test_zstd_falls_back_to_gzip_without_zstandard(make_client, monkeypatch):
+    monkeypatch.setattr(client_module, '_zstd_compressor', lambda: None)
+    assert make_client('zstd').compression == 'gzip'
+
+
+def test_unknown_encodings_disable_compression(make_client):
+    assert make_client('brotli').compression is None
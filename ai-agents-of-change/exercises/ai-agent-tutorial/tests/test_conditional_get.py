@@ -0,0 +1,85 @@
+import httpx
+import pytest
+
+from src.client import ConditionalCache
+
+
+class Upstream:
+    """A fake API that serves one versioned document and honours If-None-Match."""
+
+    def __init__(self, headers=None):
+        self.version = 1
+        self.headers = headers if headers is not None else {}
+        self.requests = []
+
+    def __call__(self, request):
+        self.requests.append(request)
+        etag = f'"v{self.version}"'
+        if request.headers.get('if-none-match') == etag:
+            return httpx.Response(304, headers={'etag': etag})
+        return httpx.Response(200, json={'version': self.version}, headers={'etag': etag, **self.headers})
+
+
+@pytest.fixture
+def client(make_agent):
+    return make_agent().api_client
+
+
+def serve(client, upstream):
+    client.client._transport = httpx.MockTransport(upstream)
+    return upstream
+
+
+async def test_unchanged_responses_are_answered_from_the_local_copy(client):
+    upstream = serve(client, Upstream())
+    assert await client.get('/workspaces/1/files') == {'version': 1}
+    assert await client.get('/workspaces/1/files') == {'version': 1}
+    assert 'if-none-match' not in upstream.requests[0].headers
+    assert upstream.requests[1].headers['if-none-match'] == '"v1"'
+
+
+async def test_changed_responses_replace_the_local_copy(client):
+    upstream = serve(client, Upstream())
+    await client.get('/workspaces/1/files')
+    upstream.version = 2
+    assert await client.get('/workspaces/1/files') == {'version': 2}
+    assert upstream.requests[-1].headers['if-none-match'] == '"v1"'
+    await client.get('/workspaces/1/files')
+    assert upstream.requests[-1].headers['if-none-match'] == '"v2"'
+
+
+async def test_no_store_and_unconditional_gets_are_not_kept(client):
+    upstream = serve(client, Upstream(headers={'cache-control': 'no-store'}))
+    await client.get('/workspaces/1/files')
+    await client.get('/workspaces/1/files')
+    await client.get('/workspaces/1/secret', conditional=False)
+    await client.get('/workspaces/1/secret', conditional=False)
+    assert all('if-none-match' not in request.headers for request in upstream.requests)
+
+
+async def test_query_parameters_are_part_of_the_key(client):
+    upstream = serve(client, Upstream())
+    await client.get('/files', params={'page': '1'})
+    await client.get('/files', params={'page': '2'})
+    assert 'if-none-match' not in upstream.requests[1].headers
+
+
+def test_cache_evicts_the_least_recently_used_bodies():
+    cache = ConditionalCache(max_bytes=10)
+
+    def response(body):
+        return httpx.Response(200, content=body, headers={'etag': '"x"'})
+
+    cache.store('a', response(b'aaaa'))
+    cache.store('b', response(b'bbbb'))
+    cache.get('a')
+    cache.store('c', response(b'cccc'))
+    assert cache.get('a') is not None and cache.get('c') is not None
+    assert cache.get('b') is None
+    cache.store('big', response(b'x' * 11))
+    assert cache.get('big') is None
+
+
+def test_setting_the_budget_to_zero_disables_it(make_agent, monkeypatch):
+    monkeypatch.setenv('OPENSERV_HTTP_CACHE_BYTES', '0')
+    assert make_agent().api_client.conditional_cache is None
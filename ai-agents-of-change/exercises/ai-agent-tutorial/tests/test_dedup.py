@@ -0,0 +1,62 @@
+import asyncio
+import json
+
+import pytest
+
+
+@pytest.fixture
+def agent(make_agent, monkeypatch):
+    agent = make_agent()
+    agent.runtime_calls = []
+    agent.runtime_results = []
+
+    async def execute_task(**kwargs):
+        agent.runtime_calls.append(kwargs['task_id'])
+        result = agent.runtime_results.pop(0) if agent.runtime_results else {'success': True}
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def ignore(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(agent.runtime_client, 'execute_task', execute_task)
+    monkeypatch.setattr(agent, 'mark_task_as_errored', ignore)
+    monkeypatch.setattr(agent, 'prefetch_secrets', ignore)
+    return agent
+
+
+async def deliver(agent, payload):
+    await agent.handle_root_route(json.dumps(payload).encode())
+    # Let the scheduled run and its done callback finish
+    pending = asyncio.all_tasks() - {asyncio.current_task()}
+    if pending:
+        await asyncio.wait(pending, timeout=5)
+    await asyncio.sleep(0)
+
+
+async def test_duplicate_of_a_successful_task_is_suppressed(agent, payloads):
+    await deliver(agent, payloads.do_task(task_id=1))
+    await deliver(agent, payloads.do_task(task_id=1))
+    assert agent.runtime_calls == [1]
+
+
+@pytest.mark.parametrize('failure', [{'success': False, 'error': 'upstream 502'}, ConnectionError('reset')])
+async def test_redelivery_of_a_failed_task_runs_again(agent, payloads, failure):
+    agent.runtime_results = [failure]
+    await deliver(agent, payloads.do_task(task_id=2))
+    await deliver(agent, payloads.do_task(task_id=2))
+    assert agent.runtime_calls == [2, 2]
+
+
+async def test_redelivery_of_a_failed_chat_runs_again(agent, payloads, monkeypatch):
+    calls = []
+
+    async def handle_chat(**kwargs):
+        calls.append(kwargs)
+        return {'success': False, 'error': 'upstream 502'}
+
+    monkeypatch.setattr(agent.runtime_client, 'handle_chat', handle_chat)
+    await deliver(agent, payloads.chat(message_id=5))
+    await deliver(agent, payloads.chat(message_id=5))
+    assert len(calls) == 2
@@ -0,0 +1,144 @@
+import asyncio
+import math
+
+import httpx
+import pytest
+
+from src.limiter import AdaptiveLimiter
+from src.llm import Completion, HedgedBackend, LLMBackend, ScriptedBackend
+
+
+class Delays(LLMBackend):
+    """Answers after the next scripted delay; a delay that is an exception is raised instead."""
+    model = 'delays'
+
+    def __init__(self, delays):
+        self.delays = list(delays)
+        self.started = 0
+        self.cancelled = 0
+
+    async def complete(self, messages, tools=None, tool_choice=None):
+        index = self.started
+        self.started += 1
+        delay = self.delays[index] if index < len(self.delays) else 0.0
+        try:
+            if isinstance(delay, Exception):
+                await asyncio.sleep(0.001)
+                raise delay
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return Completion(f'answer {index}')
+
+
+def warmed(backend, latency=0.01, **options):
+    """A hedged backend that has already seen enough completions of ``latency`` to hedge."""
+    options.setdefault('budget', 1.0)
+    hedged = HedgedBackend(backend, min_samples=5, **options)
+    # Enough history that the test's own slow completions do not move the percentile
+    hedged._latencies.extend([latency] * 100)
+    return hedged
+
+
+async def test_no_hedging_before_enough_samples():
+    backend = Delays([0.03])
+    hedged = HedgedBackend(backend, min_samples=5)
+    assert hedged.hedge_delay() is None
+    assert (await hedged.complete([])).content == 'answer 0'
+    assert backend.started == 1
+
+
+async def test_a_slow_request_is_hedged_and_the_faster_answer_used():
+    backend = Delays([0.5, 0.0])
+    hedged = warmed(backend)
+    result = await hedged.complete([])
+    assert result.content == 'answer 1'
+    assert backend.started == 2
+    await asyncio.sleep(0)
+    assert backend.cancelled == 1
+
+
+async def test_a_fast_request_is_not_hedged():
+    backend = Delays([0.0])
+    hedged = warmed(backend, latency=0.05)
+    await hedged.complete([])
+    assert backend.started == 1
+
+
+async def test_hedges_are_limited_by_the_budget():
+    backend = Delays([0.03] * 10)
+    hedged = warmed(backend, latency=0.001, budget=0.5, burst=1.0)
+    for _ in range(4):
+        await hedged.complete([])
+    # Half a hedge of credit per completion: every other slow request is hedged
+    assert backend.started == 6
+
+
+async def test_a_failed_hedge_falls_back_to_the_primary():
+    backend = Delays([0.03, ConnectionError('hedge failed')])
+    hedged = warmed(backend)
+    assert (await hedged.complete([])).content == 'answer 0'
+
+
+async def test_the_primary_error_is_raised_when_both_fail():
+    backend = Delays([ConnectionError('primary'), ConnectionError('hedge')])
+    hedged = warmed(backend, latency=0.0001)
+    with pytest.raises(ConnectionError, match='primary'):
+        await hedged.complete([])
+    assert backend.started == 2
+
+
+def throttled():
+    return httpx.HTTPStatusError('429', request=httpx.Request('POST', 'http://llm'), response=httpx.Response(429))
+
+
+async def test_a_hedge_needs_a_free_slot_of_its_own():
+    limiter = AdaptiveLimiter('llm', initial_limit=1)
+    backend = Delays([0.03, 0.0])
+    hedged = warmed(backend, limiter=limiter)
+    over_budget = hedged._hedges['over_budget'].get()
+    async with limiter.slot():
+        assert (await hedged.complete([])).content == 'answer 0'
+    assert backend.started == 1
+    assert hedged._hedges['over_budget'].get() == over_budget + 1
+
+
+async def test_a_hedge_holds_a_slot_until_it_ends():
+    limiter = AdaptiveLimiter('llm', initial_limit=2)
+    backend = Delays([0.5, 0.0])
+    hedged = warmed(backend, limiter=limiter)
+    async with limiter.slot():
+        assert (await hedged.complete([])).content == 'answer 1'
+        assert limiter.in_flight == 1
+    assert limiter.in_flight == 0
+
+
+async def test_a_throttled_primary_that_lost_to_its_hedge_reduces_the_limit():
+    limiter = AdaptiveLimiter('llm', initial_limit=4)
+    backend = Delays([throttled(), 0.01])
+    hedged = warmed(backend, latency=0.0001, limiter=limiter)
+    async with limiter.slot():
+        assert (await hedged.complete([])).content == 'answer 1'
+    assert limiter.limit < 4
+
+
+async def test_a_primary_cut_off_by_its_hedge_counts_as_slower_than_the_rest():
+    backend = Delays([0.5, 0.0, 0.0])
+    hedged = warmed(backend)
+    await hedged.complete([])
+    assert hedged._latencies[-1] == math.inf
+    # Only the original request's time is kept, never the hedge's
+    await hedged.complete([])
+    assert len(hedged._latencies) == 102
+
+
+def test_from_env(monkeypatch):
+    backend = ScriptedBackend([{'content': 'x'}])
+    assert HedgedBackend.from_env(backend) is backend
+    monkeypatch.setenv('OPENSERV_LLM_HEDGE_PERCENTILE', '90')
+    monkeypatch.setenv('OPENSERV_LLM_HEDGE_BUDGET', '0.1')
+    hedged = HedgedBackend.from_env(backend)
+    assert isinstance(hedged, HedgedBackend)
+    assert (hedged.percentile, hedged.budget, hedged.model) == (90.0, 0.1, 'scripted')
+    assert HedgedBackend.from_env(hedged) is hedged
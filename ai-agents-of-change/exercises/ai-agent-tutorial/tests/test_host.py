@@ -0,0 +1,85 @@
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from src.capability import Capability
+from src.host import AgentHost
+from src.metrics import REGISTRY
+from src.types import AgentOptions
+
+
+class EchoArgs(BaseModel):
+    text: str
+
+
+@pytest.fixture
+def host(tmp_path, monkeypatch):
+    monkeypatch.setenv('OPENSERV_ATTACHMENT_CACHE_DIR', str(tmp_path / 'attachments'))
+    host = AgentHost()
+    for name in ('alpha', 'beta'):
+        agent = host.create_agent(AgentOptions(name=name, system_prompt='You echo.', api_key=f'{name}-key'))
+        agent.add_capability(Capability(
+            name='echo', description='Echo', schema=EchoArgs,
+            run=lambda params, messages, name=name: f"{name}: {params['args'].text}",
+        ))
+    return host
+
+
+def test_routes_by_path_and_header(host):
+    client = TestClient(host.app)
+    by_path = client.post('/agents/alpha/tools/echo', json={'args': {'text': 'hi'}})
+    by_header = client.post('/tools/echo', json={'args': {'text': 'hi'}}, headers={'x-openserv-agent': 'beta'})
+    assert by_path.json()['result'] == 'alpha: hi'
+    assert by_header.json()['result'] == 'beta: hi'
+
+
+@pytest.mark.parametrize('value', ['../admin', 'alpha/tools', 'a b', ''])
+def test_rejects_agent_headers_that_are_not_names(host, value):
+    response = TestClient(host.app).post('/tools/echo', json={}, headers={'x-openserv-agent': value})
+    assert response.status_code == 400
+
+
+def test_each_agent_checks_its_own_auth_token(tmp_path, monkeypatch):
+    monkeypatch.setenv('OPENSERV_ATTACHMENT_CACHE_DIR', str(tmp_path / 'attachments'))
+    host = AgentHost()
+    for name in ('alpha', 'beta'):
+        agent = host.create_agent(AgentOptions(name=name, system_prompt='You echo.', api_key=f'{name}-key',
+                                               auth_token=f'{name}-token'))
+        agent.add_capability(Capability(name='echo', description='Echo', schema=EchoArgs,
+                                        run=lambda params, messages: 'ok'))
+    client = TestClient(host.app)
+    body = {'args': {'text': 'hi'}}
+    alpha = {'authorization': 'Bearer alpha-token'}
+    assert client.post('/agents/alpha/tools/echo', json=body, headers=alpha).status_code == 200
+    assert client.post('/agents/beta/tools/echo', json=body, headers=alpha).status_code == 401
+    assert client.post('/tools/echo', json=body, headers={**alpha, 'x-openserv-agent': 'beta'}).status_code == 401
+
+
+def test_unknown_agent_is_not_found(host):
+    response = TestClient(host.app).post('/tools/echo', json={}, headers={'x-openserv-agent': 'gamma'})
+    assert response.status_code == 404
+
+
+def test_agent_metrics_are_labelled_per_agent(host):
+    client = TestClient(host.app)
+    client.post('/agents/alpha/tools/echo', json={'args': {'text': 'hi'}})
+    client.post('/agents/beta/tools/echo', json={'args': {'text': 'hi'}})
+    text = REGISTRY.render()
+    for name in ('alpha', 'beta'):
+        assert f'openserv_capability_duration_seconds_count{{agent="{name}",capability="echo",outcome="ok"}}' in text
+        assert f'openserv_http_request_duration_seconds_count{{agent="{name}",method="POST",route="/tools/{{tool_name}}"' in text
+        assert f'openserv_scheduler_queued{{agent="{name}",class="task"}}' in text
+        assert f'openserv_concurrency_limit{{agent="{name}",limiter="llm"}}' in text
+    # The pool the agents share is reported once
+    assert 'openserv_http_pool_connections{agent="host",client="shared",state="active"}' in text
+    assert 'openserv_http_pool_connections{agent="alpha"' not in text
+
+
+def test_hosted_capabilities_leave_no_default_agent_series(host):
+    host.agents['alpha'].add_capability(Capability(
+        name='alpha_only', description='Only on alpha', schema=EchoArgs, run=lambda params, messages: 'ok',
+    ))
+    TestClient(host.app).post('/agents/alpha/tools/alpha_only', json={'args': {'text': 'hi'}})
+    text = REGISTRY.render()
+    assert 'agent="alpha",capability="alpha_only"' in text
+    assert 'agent="default",capability="alpha_only"' not in text
@@ -0,0 +1,43 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def loaded_after(statement):
+    """Run ``statement`` in a fresh interpreter and list the heavy modules it loaded."""
+    code = (
+        f'import sys, json\n{statement}\n'
+        "print(json.dumps([m for m in ('openai', 'fastapi', 'uvicorn', 'httpx') if m in sys.modules]))"
+    )
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.splitlines()[-1])
+
+
+def test_types_and_capabilities_do_not_load_the_agent_dependencies():
+    assert loaded_after('from src import Capability, AgentOptions, ToolError') == []
+
+
+def test_agent_is_loaded_on_first_access():
+    assert 'fastapi' in loaded_after('from src import Agent')
+
+
+def test_agent_does_not_import_openai_until_the_client_is_needed():
+    assert 'openai' not in loaded_after('from src.agent import Agent')
+
+
+def test_importing_does_not_configure_logging():
+    code = 'import logging, src.agent\nprint(len(logging.getLogger().handlers))'
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == '0'
+    assert output.stderr == ''
+
+
+def test_unknown_attributes_still_raise():
+    import src
+    with pytest.raises(AttributeError, match='NotAThing'):
+        src.NotAThing
@@ -0,0 +1,103 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from src.capability import Capability
+from src.exceptions import JobStoreFullError
+from src.jobs import COMPLETED, CallbackPolicy, JobStore
+
+
+class EchoArgs(BaseModel):
+    text: str
+
+
+def test_job_store_refuses_jobs_while_full_of_unfinished_ones():
+    store = JobStore(max_jobs=1)
+    job = store.create('echo')
+    with pytest.raises(JobStoreFullError):
+        store.create('echo')
+    store.finish(job, result='done')
+    assert store.create('echo').id != job.id
+    assert store.get(job.id) is None
+
+
+@pytest.mark.parametrize('url, allowed', [
+    ('https://hooks.example.com/done', True),
+    ('http://HOOKS.example.com:8080/done', True),
+    ('https://api.partner.io/jobs', True),
+    ('https://partner.io/jobs', False),
+    ('https://evil-partner.io/jobs', False),
+    ('http://169.254.169.254/latest/meta-data', False),
+    ('ftp://hooks.example.com/done', False),
+    ('not a url', False),
+])
+def test_callback_policy_allows_listed_hosts_only(url, allowed):
+    policy = CallbackPolicy(['hooks.example.com', '*.partner.io'])
+    if allowed:
+        policy.check(url)
+    else:
+        with pytest.raises(ValueError):
+            policy.check(url)
+
+
+def test_callbacks_are_disabled_without_a_host_list(monkeypatch):
+    monkeypatch.delenv('OPENSERV_CALLBACK_HOSTS', raising=False)
+    with pytest.raises(ValueError, match='OPENSERV_CALLBACK_HOSTS'):
+        CallbackPolicy.from_env().check('https://hooks.example.com/done')
+
+
+@pytest.fixture
+def agent(make_agent, monkeypatch):
+    monkeypatch.setenv('OPENSERV_CALLBACK_HOSTS', 'hooks.example.com')
+    agent = make_agent()
+    agent.add_capability(Capability(
+        name='echo', description='Echo', schema=EchoArgs, run=lambda params, messages: params['args'].text,
+    ))
+    return agent
+
+
+def test_async_call_with_a_disallowed_callback_is_rejected(agent):
+    response = TestClient(agent.server.app).post(
+        '/tools/echo',
+        json={'args': {'text': 'hi'}, 'callback_url': 'http://127.0.0.1:2375/containers'},
+        headers={'Prefer': 'respond-async'},
+    )
+    assert response.status_code == 400
+    assert len(agent.jobs) == 0
+
+
+@pytest.mark.parametrize('action', ['zz', {'workspace': 'zz'}, {'workspace': {'id': [1]}}])
+def test_async_call_with_a_malformed_action_is_rejected(agent, action):
+    response = TestClient(agent.server.app).post(
+        '/tools/echo',
+        json={'args': {'text': 'hi'}, 'action': action},
+        headers={'Prefer': 'respond-async'},
+    )
+    assert response.status_code == 400
+    assert len(agent.jobs) == 0
+
+
+async def test_finished_job_is_posted_to_its_callback(agent):
+    posted = []
+    agent._callback_client = httpx.AsyncClient(transport=httpx.MockTransport(
+        lambda request: posted.append(request) or httpx.Response(204)
+    ))
+    job = agent.submit_tool_job('echo', {'args': {'text': 'hi'}}, 'https://hooks.example.com/done')
+    for _ in range(20):
+        await asyncio.sleep(0)
+    assert job.status == COMPLETED
+    assert [str(request.url) for request in posted] == ['https://hooks.example.com/done']
+
+
+async def test_unexpected_callback_errors_are_logged_not_raised(agent, caplog):
+    def fail(request):
+        raise RuntimeError('transport bug')
+
+    agent._callback_client = httpx.AsyncClient(transport=httpx.MockTransport(fail))
+    job = agent.jobs.create('echo', 'https://hooks.example.com/done')
+    agent.jobs.finish(job, result='hi')
+    await agent._deliver_job(job, attempts=1)
+    assert 'transport bug' in caplog.text
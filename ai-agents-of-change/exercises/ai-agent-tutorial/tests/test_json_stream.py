@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+from src.client import JSONArrayParser
+
+BODIES = [
+    b'[]',
+    b'[1, 0.5, -2e3, 10]',
+    b'[true, false, null, "text with ] and , inside"]',
+    b'[{"id": 1, "tags": ["a", "b"]}, {"id": 2, "name": "caf\xc3\xa9 \xe2\x98\x95"}]',
+    b' [ [1, [2]] , {"nested": {"deep": [3.25]}} ] ',
+    b'{"data": [{"id": 1}, 22, 0.125], "total": 3}',
+    b'{"total": 2, "data": [1.5, "two"]}',
+    b'{"data": {"id": 9}}',
+    b'{"id": 7, "name": "single"}',
+    b'"just a string"',
+]
+
+
+def parse(body, sizes):
+    """Feed ``body`` in chunks of the given sizes, then the rest, and collect the items."""
+    parser = JSONArrayParser()
+    items = []
+    pos = 0
+    for size in sizes:
+        items += parser.feed(body[pos:pos + size])
+        pos += size
+    items += parser.feed(body[pos:])
+    return items + parser.close()
+
+
+def expected(body):
+    data = json.loads(body)
+    if isinstance(data, dict):
+        data = data.get('data', data)
+    return data if isinstance(data, list) else [data]
+
+
+@pytest.mark.parametrize('body', BODIES)
+def test_every_two_chunk_split_gives_the_same_items(body):
+    for split in range(len(body) + 1):
+        assert parse(body, [split]) == expected(body), f'split at {split}'
+
+
+@pytest.mark.parametrize('body', BODIES)
+def test_one_byte_chunks_give_the_same_items(body):
+    assert parse(body, [1] * len(body)) == expected(body)
+
+
+def test_number_split_across_chunks():
+    parser = JSONArrayParser()
+    assert parser.feed(b'[1, 0.') == [1]
+    assert parser.feed(b'5]') == [0.5]
+    assert parser.close() == []
+
+
+def test_items_are_returned_as_soon_as_they_are_complete():
+    parser = JSONArrayParser()
+    assert parser.feed(b'{"data": [{"id": 1}, {"id"') == [{'id': 1}]
+    assert parser.feed(b': 2}') == [{'id': 2}]
+    assert parser.feed(b'], "next": null}') == []
+    assert parser.close() == []
+
+
+def test_wrapped_listing_keeps_only_the_unfinished_tail():
+    parser = JSONArrayParser()
+    parser.feed(b'{"data": [' + b'{"name": "xxxxxxxxxxxxxxxx"}, ' * 1000)
+    assert len(parser._buffer) < 100
+
+
+@pytest.mark.parametrize('body', [b'[1, 2', b'[1 2]', b'[1, 0.x]', b'{"data": [1]', b'[1,]'])
+def test_invalid_or_truncated_streams_raise(body):
+    parser = JSONArrayParser()
+    with pytest.raises(ValueError):
+        parser.feed(body)
+        parser.close()
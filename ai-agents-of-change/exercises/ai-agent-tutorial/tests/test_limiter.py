@@ -0,0 +1,75 @@
+import asyncio
+import random
+
+import httpx
+import pytest
+
+from src.exceptions import ConcurrencyLimitError
+from src.limiter import AdaptiveLimiter
+
+
+def test_jittery_latency_does_not_shrink_the_limit():
+    limiter = AdaptiveLimiter('test-jitter', initial_limit=8, window=50)
+    jitter = random.Random(1)
+    for _ in range(2000):
+        limiter.in_flight += 1
+        limiter.release(0.02 + jitter.uniform(0, 0.2))
+    assert limiter.limit > 60
+
+
+def test_single_slow_call_does_not_shrink_the_limit():
+    limiter = AdaptiveLimiter('test-outlier', initial_limit=8, window=10)
+    for latency in [0.01] * 5 + [5.0] + [0.01] * 5:
+        limiter.in_flight += 1
+        limiter.release(latency)
+    assert limiter.limit > 8
+
+
+def test_slow_window_shrinks_and_holds_the_limit():
+    limiter = AdaptiveLimiter('test-slow', initial_limit=20, window=10)
+    for _ in range(10):
+        limiter.in_flight += 1
+        limiter.release(0.01)
+    grown = limiter.limit
+    for _ in range(10):
+        limiter.in_flight += 1
+        limiter.release(0.1)
+    reduced = limiter.limit
+    assert reduced < grown
+    for _ in range(5):
+        limiter.in_flight += 1
+        limiter.release(0.1)
+    assert limiter.limit == reduced
+
+
+def test_throttled_call_shrinks_the_limit():
+    limiter = AdaptiveLimiter('test-throttle', initial_limit=10)
+    limiter.in_flight += 1
+    limiter.release(0.05, throttled=True)
+    assert limiter.limit == pytest.approx(7)
+
+
+async def test_slot_counts_429_as_throttling_and_other_errors_as_neutral():
+    limiter = AdaptiveLimiter('test-slot', initial_limit=10)
+    response = httpx.Response(429, request=httpx.Request('GET', 'http://upstream'))
+    with pytest.raises(ValueError):
+        async with limiter.slot():
+            raise ValueError('bad input')
+    assert limiter.limit == 10
+    with pytest.raises(httpx.HTTPStatusError):
+        async with limiter.slot():
+            raise httpx.HTTPStatusError('throttled', request=response.request, response=response)
+    assert limiter.limit == pytest.approx(7)
+    assert limiter.in_flight == 0
+
+
+async def test_callers_over_the_limit_wait_then_time_out():
+    limiter = AdaptiveLimiter('test-wait', initial_limit=1, max_wait=0.05)
+    await limiter.acquire()
+    waiter = asyncio.ensure_future(limiter.acquire())
+    await asyncio.sleep(0)
+    limiter.release(None)
+    await waiter
+    assert limiter.in_flight == 1
+    with pytest.raises(ConcurrencyLimitError):
+        await limiter.acquire()
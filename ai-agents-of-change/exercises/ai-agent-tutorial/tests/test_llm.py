@@ -0,0 +1,113 @@
+import json
+
+import pytest
+from pydantic import BaseModel
+
+from src.capability import Capability
+from src.exceptions import ConfigurationError
+from src.llm import HedgedBackend, ScriptedBackend
+from src.types import ProcessParams
+
+SCRIPT = [
+    {'tool_calls': [{'name': 'search', 'arguments': {'query': 'rust'}}]},
+    {'content': 'Here is what I found'},
+]
+
+
+class SearchArgs(BaseModel):
+    query: str
+
+
+def search_capability(calls):
+    def search(params, messages):
+        calls.append(params['args'].query)
+        return f"results for {params['args'].query}"
+    return Capability(name='search', description='Search', schema=SearchArgs, run=search)
+
+
+def user(text):
+    return {'role': 'user', 'content': text}
+
+
+async def test_script_steps_follow_the_assistant_turns():
+    backend = ScriptedBackend(SCRIPT)
+    first = await backend.complete([user('hi')])
+    assert first.tool_calls[0].name == 'search'
+    assert json.loads(first.tool_calls[0].arguments) == {'query': 'rust'}
+    second = await backend.complete([user('hi'), first.to_message(), {'role': 'tool', 'content': 'x'}])
+    assert second.content == 'Here is what I found'
+    # Past the end the last step repeats, and a new user message starts over
+    history = [user('hi'), first.to_message(), second.to_message()]
+    assert (await backend.complete(history)).content == 'Here is what I found'
+    assert (await backend.complete(history + [user('again')])).tool_calls
+    assert backend.calls == 4
+
+
+def test_script_files_and_empty_scripts(tmp_path):
+    path = tmp_path / 'script.json'
+    path.write_text(json.dumps({'latency_ms': 250, 'jitter_ms': 50, 'seed': 3, 'steps': SCRIPT}))
+    backend = ScriptedBackend.from_file(str(path))
+    assert (backend.latency, backend.jitter) == (0.25, 0.05)
+    with pytest.raises(ValueError):
+        ScriptedBackend([])
+
+
+async def test_process_runs_the_tools_the_model_calls(make_agent):
+    calls = []
+    agent = make_agent(llm_backend=ScriptedBackend(SCRIPT))
+    agent.add_capability(search_capability(calls))
+    result = await agent.process(ProcessParams(messages=[user('find rust')]))
+    assert result['completed'] and result['content'] == 'Here is what I found'
+    assert calls == ['rust']
+    roles = [message['role'] for message in result['messages']]
+    assert roles == ['user', 'assistant', 'tool', 'assistant']
+    assert result['messages'][2]['content'] == 'results for rust'
+
+
+async def test_unknown_tools_are_reported_to_the_model(make_agent):
+    agent = make_agent(llm_backend=ScriptedBackend([
+        {'tool_calls': [{'name': 'missing', 'arguments': {}}]},
+        {'content': 'done'},
+    ]))
+    result = await agent.process(ProcessParams(messages=[user('hi')]))
+    assert result['messages'][2]['content'] == 'Error: Tool not found: missing'
+    assert result['content'] == 'done'
+
+
+async def test_the_loop_stops_at_the_iteration_limit(make_agent, monkeypatch):
+    monkeypatch.setenv('OPENSERV_TOOL_LOOP_LIMIT', '3')
+    calls = []
+    backend = ScriptedBackend(SCRIPT[:1])
+    agent = make_agent(llm_backend=backend)
+    agent.add_capability(search_capability(calls))
+    result = await agent.process(ProcessParams(messages=[user('loop')]))
+    assert backend.calls == 3 and len(calls) == 3
+    assert result['content'].startswith('Maximum number of tool calls reached')
+
+
+async def test_backend_errors_end_the_loop(make_agent):
+    class Failing(ScriptedBackend):
+        async def complete(self, messages, tools=None, tool_choice=None):
+            raise ConnectionError('upstream down')
+
+    agent = make_agent(llm_backend=Failing(SCRIPT))
+    result = await agent.process(ProcessParams(messages=[user('hi')]))
+    assert result == {'error': 'upstream down', 'messages': [user('hi')], 'completed': False}
+
+
+def test_backend_selection(make_agent, monkeypatch, tmp_path):
+    scripted = ScriptedBackend(SCRIPT)
+    assert make_agent(llm_backend=scripted).llm_backend is scripted
+
+    path = tmp_path / 'script.json'
+    path.write_text(json.dumps({'steps': SCRIPT}))
+    monkeypatch.setenv('OPENSERV_LLM_SCRIPT', str(path))
+    assert isinstance(make_agent().llm_backend, ScriptedBackend)
+
+    monkeypatch.setenv('OPENSERV_LLM_HEDGE_PERCENTILE', '95')
+    assert isinstance(make_agent().llm_backend, HedgedBackend)
+
+    monkeypatch.delenv('OPENSERV_LLM_SCRIPT')
+    monkeypatch.delenv('OPENAI_API_KEY', raising=False)
+    with pytest.raises(ConfigurationError):
+        make_agent().llm_backend
@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+import pytest
+
+from src.loop_monitor import LoopMonitor
+
+
+@pytest.fixture
+async def monitor():
+    monitor = LoopMonitor(interval=0.01, slow_threshold=0.05)
+    monitor.start()
+    yield monitor
+    await monitor.stop()
+
+
+def block_the_loop():
+    """Sleep synchronously on the loop thread so the watchdog has a stall to find."""
+    time.sleep(0.2)
+
+
+async def test_idle_loop_has_little_lag(monitor):
+    await asyncio.sleep(0.1)
+    assert monitor.stats()['p50'] < 0.05
+    assert monitor.recent_stalls() == []
+
+
+async def test_a_blocking_call_is_recorded_with_its_stack(monitor):
+    await asyncio.sleep(0.03)
+    block_the_loop()
+    await asyncio.sleep(0.1)
+    stalls = monitor.recent_stalls()
+    assert len(stalls) == 1
+    assert stalls[0]['duration'] >= 0.05
+    assert 'block_the_loop' in stalls[0]['stack']
+    assert monitor.stats()['max'] >= 0.15
+
+
+async def test_current_lag_reports_an_ongoing_stall(monitor):
+    await asyncio.sleep(0.03)
+    time.sleep(0.1)
+    assert monitor.current_lag() >= 0.05
+
+
+async def test_stop_ends_the_probe(monitor):
+    await monitor.stop()
+    assert not monitor.running
+    monitor._watchdog.join(1)
+    assert not monitor._watchdog.is_alive()
+
+
+def test_percentiles_of_the_sample_window():
+    monitor = LoopMonitor(window=10)
+    assert monitor.percentile(0.5) == 0.0
+    monitor._samples.extend(i / 100 for i in range(10))
+    assert monitor.percentile(0.5) == 0.05
+    assert monitor.percentile(1) == 0.09
+    assert monitor.stats()['p90'] == 0.09
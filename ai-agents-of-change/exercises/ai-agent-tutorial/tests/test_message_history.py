@@ -0,0 +1,87 @@
+import json
+
+import pytest
+from pydantic import BaseModel
+
+from src.capability import Capability
+from src.llm import ScriptedBackend
+from src.types import MessageHistory, ProcessParams
+
+
+class _NoArgs(BaseModel):
+    pass
+
+
+def test_with_message_returns_a_new_history_and_keeps_the_original():
+    history = MessageHistory([{'role': 'user', 'content': 'hi'}])
+    longer = history.with_message({'role': 'assistant', 'content': 'hello'})
+
+    assert len(history) == 1
+    assert [m['content'] for m in longer] == ['hi', 'hello']
+
+
+def test_branching_from_an_older_view_does_not_leak_into_newer_ones():
+    base = MessageHistory([{'role': 'user', 'content': 'hi'}])
+    first = base.with_message({'role': 'assistant', 'content': 'a'})
+    second = base.with_messages([{'role': 'assistant', 'content': 'b'}])
+
+    assert [m['content'] for m in first] == ['hi', 'a']
+    assert [m['content'] for m in second] == ['hi', 'b']
+
+
+@pytest.mark.parametrize('mutate', [
+    lambda h: h.append({'role': 'user'}),
+    lambda h: h.extend([{'role': 'user'}]),
+    lambda h: h.insert(0, {'role': 'user'}),
+    lambda h: h.pop(),
+    lambda h: h.__setitem__(0, {'role': 'user'}),
+])
+async def test_a_mutating_tool_changes_only_its_own_copy(mutate):
+    history = MessageHistory([{'role': 'user', 'content': 'hi'}])
+    seen = []
+
+    def tool(params, messages):
+        mutate(messages)
+        seen.append(list(messages))
+        return 'ok'
+
+    capability = Capability(name='mutate', description='Mutates its history', schema=_NoArgs, run=tool)
+    assert await capability.run({'args': {}}, history) == 'ok'
+    assert await capability.run({'args': {}}, history) == 'ok'
+    assert history == [{'role': 'user', 'content': 'hi'}]
+    # The second run starts from the caller's history, not the first run's changes
+    assert seen[0] == seen[1]
+
+
+def test_history_is_a_json_serializable_list():
+    history = MessageHistory([{'role': 'user', 'content': 'hi'}]).with_message({'role': 'assistant', 'content': 'a'})
+    assert isinstance(history, list)
+    assert json.loads(json.dumps(history)) == [{'role': 'user', 'content': 'hi'}, {'role': 'assistant', 'content': 'a'}]
+
+
+def test_to_list_gives_a_private_mutable_copy():
+    message = {'role': 'user', 'content': 'hi'}
+    copy = MessageHistory([message]).to_list()
+    copy.append({'role': 'assistant', 'content': 'hello'})
+    copy[0]['content'] = 'changed'
+    assert message['content'] == 'hi'
+
+
+class _Args(BaseModel):
+    text: str
+
+
+async def test_process_returns_the_messages_as_a_list(make_agent):
+    backend = ScriptedBackend([
+        {'tool_calls': [{'name': 'echo', 'arguments': {'text': 'ping'}}]},
+        {'content': 'done'},
+    ])
+    agent = make_agent(llm_backend=backend)
+    agent.add_capability(Capability(name='echo', description='Echo', schema=_Args, run=lambda p, m: p['args'].text))
+
+    result = await agent.process(ProcessParams(messages=[{'role': 'user', 'content': 'hi'}]))
+
+    assert result['content'] == 'done'
+    assert isinstance(result['messages'], list)
+    assert [m['role'] for m in result['messages']] == ['user', 'assistant', 'tool', 'assistant']
+    assert result['messages'][2]['content'] == 'ping'
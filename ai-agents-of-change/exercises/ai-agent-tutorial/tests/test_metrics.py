@@ -0,0 +1,66 @@
+import math
+
+from src.llm import LLMBackend
+from src.metrics import TOOL_LOOP_ITERATIONS, Counter, Gauge, Histogram, MetricsRegistry
+from src.types import MessageHistory, ProcessParams
+
+
+def test_nan_and_infinities_use_exposition_format_spelling():
+    registry = MetricsRegistry()
+    gauge = registry.gauge('test_value', 'A value.', ('kind',))
+    gauge.labels('nan').set(math.nan)
+    gauge.labels('inf').set(math.inf)
+    gauge.labels('-inf').set(-math.inf)
+    broken = registry.gauge('test_broken', 'A failing function.')
+    broken.set_function(lambda: 1 / 0)
+
+    text = registry.render()
+    assert 'test_value{kind="nan"} NaN' in text
+    assert 'test_value{kind="inf"} +Inf' in text
+    assert 'test_value{kind="-inf"} -Inf' in text
+    assert 'test_broken NaN' in text
+
+
+def test_labels_that_render_alike_share_one_series():
+    counter = Counter('test_total', 'Calls.', ('code',))
+    counter.labels('1').inc()
+    counter.labels(1).inc()
+    counter.labels('1').inc()
+    counter.labels(1).inc()
+
+    assert counter.render()[2:] == ['test_total{code="1"} 4']
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram('test_seconds', 'Latency.', buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value)
+
+    lines = histogram.render()
+    assert 'test_seconds_bucket{le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{le="1"} 2' in lines
+    assert 'test_seconds_bucket{le="+Inf"} 3' in lines
+    assert 'test_seconds_count 3' in lines
+
+
+def test_gauge_function_is_read_at_scrape_time():
+    gauge = Gauge('test_queue', 'Queue length.')
+    items = []
+    gauge.set_function(lambda: len(items))
+    items.extend([1, 2])
+    assert gauge.render()[2] == 'test_queue 2'
+
+
+class _FailingBackend(LLMBackend):
+    async def complete(self, messages, tools=None, tool_choice=None):
+        raise ConnectionError('upstream down')
+
+
+async def test_failed_tool_loops_are_counted(make_agent):
+    agent = make_agent(llm_backend=_FailingBackend())
+    before = TOOL_LOOP_ITERATIONS.labels('default').counts[0]
+
+    result = await agent.process(ProcessParams(messages=MessageHistory([{'role': 'user', 'content': 'hi'}])))
+
+    assert result['completed'] is False
+    assert TOOL_LOOP_ITERATIONS.labels('default').counts[0] == before + 1
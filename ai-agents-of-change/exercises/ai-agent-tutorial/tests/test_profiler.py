@@ -0,0 +1,50 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.profiler import RequestProfiler, request_profiler
+
+
+def test_configure_keeps_directories_inside_the_profile_root(tmp_path):
+    profiler = RequestProfiler(directory=str(tmp_path / 'profiles'))
+
+    profiler.configure(['route:/tools/*'], 'slow-tools')
+    assert profiler.directory == os.path.realpath(tmp_path / 'profiles' / 'slow-tools')
+    assert profiler.matches('route', '/tools/search')
+
+    for outside in ('../elsewhere', '/etc', 'a/../../b'):
+        with pytest.raises(ValueError):
+            profiler.configure(['route:/'], outside)
+    # A rejected call leaves the previous settings in place
+    assert profiler.patterns == ['route:/tools/*']
+    assert profiler.directory.endswith('slow-tools')
+
+
+def test_configure_requires_a_list_of_patterns(tmp_path):
+    profiler = RequestProfiler(directory=str(tmp_path))
+    with pytest.raises(ValueError):
+        profiler.configure('route:/tools/*')
+    with pytest.raises(ValueError):
+        profiler.configure(['route:/', 3])
+    assert profiler.patterns == []
+    assert not profiler.enabled
+
+
+@pytest.fixture
+def admin_client(make_agent, monkeypatch):
+    monkeypatch.setenv('OPENSERV_ADMIN_TOKEN', 'admin-secret')
+    saved = (request_profiler.patterns, request_profiler.directory, request_profiler.enabled)
+    yield TestClient(make_agent().server.app), {'Authorization': 'Bearer admin-secret'}
+    request_profiler.patterns, request_profiler.directory, request_profiler.enabled = saved
+
+
+def test_profile_requests_route_rejects_bad_settings(admin_client):
+    client, headers = admin_client
+    assert client.put('/admin/profile/requests', json={'patterns': 'route:/'}, headers=headers).status_code == 400
+    assert client.put('/admin/profile/requests', json={'patterns': [], 'directory': '/tmp'}, headers=headers).status_code == 400
+    assert client.put('/admin/profile/requests', content=b'{', headers=headers).status_code == 400
+
+    response = client.put('/admin/profile/requests', json={'patterns': ['capability:*']}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()['patterns'] == ['capability:*']
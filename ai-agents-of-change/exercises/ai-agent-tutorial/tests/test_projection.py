@@ -0,0 +1,73 @@
+import json
+
+import httpx
+import pytest
+
+from src.projection import PayloadProjection, size_report
+from src.types import parse_action
+
+ACTION = {
+    'type': 'do-task',
+    'me': {'id': 1},
+    'task': {'id': 5, 'description': 'x'},
+    'workspace': {'id': 7, 'goal': 'g', 'agents': [{'id': 1}, {'id': 2}]},
+    'integrations': [{'id': 'slack'}],
+    'memories': [1, 2, 3, 4],
+}
+
+
+def test_include_keeps_only_the_listed_paths():
+    projection = PayloadProjection(include=['type', 'task', 'workspace.id'])
+    assert projection.apply(ACTION) == {'type': 'do-task', 'task': ACTION['task'], 'workspace': {'id': 7}}
+
+
+def test_exclude_and_cap_copy_only_the_containers_they_change():
+    projection = PayloadProjection(exclude=['workspace.agents', 'missing.path'], cap={'memories': -2})
+    result = projection.apply(ACTION)
+    assert result['workspace'] == {'id': 7, 'goal': 'g'}
+    assert result['memories'] == [3, 4]
+    assert result['task'] is ACTION['task']
+    assert ACTION['workspace']['agents'] and ACTION['memories'] == [1, 2, 3, 4]
+
+
+@pytest.mark.parametrize('messages, expected', [
+    ([{'role': 'system'}, 'a', 'b', 'c'], [{'role': 'system'}, 'b', 'c']),
+    (['a', 'b', 'c'], ['b', 'c']),
+    (['a', 'b'], ['a', 'b']),
+    ([{'role': 'system'}, 'a', 'b'], [{'role': 'system'}, 'a', 'b']),
+])
+def test_max_messages_keeps_the_most_recent_and_the_system_prompt(messages, expected):
+    assert PayloadProjection(max_messages=2).messages(messages) == expected
+
+
+def test_config_validation():
+    assert PayloadProjection.from_config(None) is None
+    assert PayloadProjection.from_config({}) is None
+    assert not PayloadProjection.from_config({'max_messages': 5}).changes_action
+    with pytest.raises(ValueError, match='inclde'):
+        PayloadProjection.from_config({'inclde': ['task']})
+
+
+def test_size_report_compares_sub_trees():
+    rows = {path: (before, after) for path, before, after in
+            size_report(ACTION, PayloadProjection(exclude=['workspace.agents', 'integrations']))}
+    assert rows['workspace.agents'][1] == 0 and rows['workspace.agents'][0] > 0
+    assert rows['integrations'][1] == 0
+    assert rows['task'][0] == rows['task'][1]
+    assert rows['(total)'][1] < rows['(total)'][0]
+
+
+async def test_runtime_receives_the_projected_action(make_agent, payloads):
+    agent = make_agent(payload_projection={'exclude': ['workspace.agents'], 'cap': {'memories': 1}})
+    sent = []
+    agent.runtime_client.client._transport = httpx.MockTransport(
+        lambda request: sent.append(json.loads(request.content)) or httpx.Response(200, json={})
+    )
+    payload = payloads.do_task(task_id=5)
+    payload['workspace']['agents'] = [{'id': 1, 'name': 'a', 'capabilities_description': 'x'}]
+    payload['memories'] = [{'id': 1, 'memory': 'one', 'createdAt': '2024-01-01T00:00:00Z'}] * 3
+    await agent.do_task(parse_action(json.dumps(payload).encode()))
+    action = sent[0]['action']
+    assert 'agents' not in action['workspace']
+    assert len(action['memories']) == 1
+    assert action['task']['id'] == 5
@@ -0,0 +1,154 @@
+import asyncio
+
+import pytest
+
+from src import tracing
+from src.scheduler import CHAT, TASK, ActionScheduler
+
+
+@pytest.fixture
+async def release():
+    """An event that lets the held jobs finish; set at teardown so none are left running."""
+    event = asyncio.Event()
+    yield event
+    event.set()
+    await asyncio.sleep(0)
+
+
+def recorder(started, release):
+    def job(name):
+        async def run():
+            started.append(name)
+            await release.wait()
+            return name
+        return run
+    return job
+
+
+async def settle():
+    """Let started jobs finish and their completion callbacks dispatch the next ones."""
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+async def run_after_blocker(scheduler, submit):
+    """Queue jobs behind one running job so the scheduler, not submission order, picks who goes first."""
+    gate = asyncio.Event()
+    scheduler.submit(TASK, 'blocker', gate.wait)
+    await asyncio.sleep(0)
+    started = []
+
+    def job(name):
+        async def run():
+            started.append(name)
+        return run
+
+    submit(job)
+    gate.set()
+    await settle()
+    return started
+
+
+async def test_chat_starts_before_queued_tasks():
+    scheduler = ActionScheduler(max_concurrency=1, chat_reserved=0)
+
+    def submit(job):
+        scheduler.submit(TASK, 'a', job('task'))
+        scheduler.submit(CHAT, 'a', job('chat'))
+
+    assert await run_after_blocker(scheduler, submit) == ['chat', 'task']
+
+
+async def test_workspaces_take_turns():
+    scheduler = ActionScheduler(max_concurrency=1, chat_reserved=0)
+
+    def submit(job):
+        for i in range(3):
+            scheduler.submit(TASK, 'big', job(f'big-{i}'))
+        scheduler.submit(TASK, 'small', job('small-0'))
+
+    assert await run_after_blocker(scheduler, submit) == ['big-0', 'small-0', 'big-1', 'big-2']
+
+
+async def test_costly_jobs_get_proportionally_fewer_turns():
+    scheduler = ActionScheduler(max_concurrency=1, chat_reserved=0, quantum=1.0)
+
+    def submit(job):
+        for i in range(2):
+            scheduler.submit(TASK, 'heavy', job(f'heavy-{i}'), cost=2.0)
+        for i in range(4):
+            scheduler.submit(TASK, 'light', job(f'light-{i}'))
+
+    started = await run_after_blocker(scheduler, submit)
+    assert started == ['light-0', 'heavy-0', 'light-1', 'light-2', 'heavy-1', 'light-3']
+
+
+async def test_workspace_limit_leaves_room_for_others(release):
+    scheduler = ActionScheduler(max_concurrency=8, workspace_concurrency=2, chat_reserved=0)
+    started = []
+    job = recorder(started, release)
+    for i in range(4):
+        scheduler.submit(TASK, 'a', job(f'a-{i}'))
+    scheduler.submit(TASK, 'b', job('b-0'))
+    await asyncio.sleep(0)
+    assert sorted(started) == ['a-0', 'a-1', 'b-0']
+    assert scheduler.running == 3 and scheduler.queued(TASK) == 2
+
+
+async def test_tasks_cannot_take_the_chat_reservation(release):
+    scheduler = ActionScheduler(max_concurrency=4, workspace_concurrency=10, chat_reserved=1)
+    started = []
+    job = recorder(started, release)
+    for i in range(5):
+        scheduler.submit(TASK, i, job(f'task-{i}'))
+    await asyncio.sleep(0)
+    assert scheduler.running == 3
+    scheduler.submit(CHAT, 'x', job('chat'))
+    await asyncio.sleep(0)
+    assert 'chat' in started and scheduler.running == 4
+
+
+async def test_results_and_errors_reach_the_caller():
+    scheduler = ActionScheduler()
+
+    async def fail():
+        raise ValueError('boom')
+
+    async def succeed():
+        return 42
+
+    assert await scheduler.submit(TASK, 'a', succeed) == 42
+    with pytest.raises(ValueError):
+        await scheduler.submit(TASK, 'a', fail)
+    await settle()
+    assert scheduler.running == 0 and scheduler.queued() == 0
+
+
+async def test_shutdown_cancels_running_and_queued_jobs():
+    scheduler = ActionScheduler(max_concurrency=1, chat_reserved=0)
+    started = []
+    running = scheduler.submit(TASK, 'a', recorder(started, asyncio.Event())('running'))
+    queued = scheduler.submit(TASK, 'b', recorder(started, asyncio.Event())('queued'))
+    await asyncio.sleep(0)
+    await scheduler.shutdown()
+    assert started == ['running']
+    assert running.cancelled() and queued.cancelled()
+    assert scheduler.running == 0 and scheduler.queued() == 0
+
+
+async def test_jobs_run_in_the_submitters_context():
+    exporter = tracing.InMemorySpanExporter()
+    tracing.set_exporter(exporter)
+    scheduler = ActionScheduler()
+
+    async def child():
+        with tracing.start_span('child'):
+            pass
+
+    try:
+        with tracing.start_span('parent') as parent:
+            await scheduler.submit(TASK, 'a', child)
+    finally:
+        tracing.set_exporter(None)
+    child_span = next(span for span in exporter.spans if span['name'] == 'child')
+    assert child_span['parent_id'] == parent.context.span_id
@@ -0,0 +1,112 @@
+import asyncio
+
+import httpx
+import pytest
+from pydantic import BaseModel
+
+from src.capability import Capability
+from src.secret_cache import SecretCache
+from src.types import GetSecretsParams, GetSecretValueParams
+
+
+def counting_loader(value='secret'):
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return value
+    return load, calls
+
+
+async def test_hits_are_served_from_memory():
+    cache = SecretCache(ttl=60)
+    load, calls = counting_loader()
+    assert await cache.get(('list', 1), load) == 'secret'
+    assert await cache.get(('list', 1), load) == 'secret'
+    assert len(calls) == 1
+    assert cache.cached(('list', 1))
+
+
+async def test_concurrent_misses_share_one_load():
+    cache = SecretCache(ttl=60)
+    load, calls = counting_loader()
+    results = await asyncio.gather(*(cache.get(('value', 1, 's'), load) for _ in range(5)))
+    assert results == ['secret'] * 5
+    assert len(calls) == 1
+
+
+async def test_entries_are_dropped_when_they_expire():
+    cache = SecretCache(ttl=0.02)
+    load, calls = counting_loader()
+    await cache.get(('value', 1, 's'), load)
+    await asyncio.sleep(0.04)
+    assert len(cache) == 0
+    await cache.get(('value', 1, 's'), load)
+    assert len(calls) == 2
+
+
+async def test_failures_are_shared_but_not_cached():
+    cache = SecretCache(ttl=60)
+    attempts = []
+
+    async def fail():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        raise ConnectionError('down')
+
+    results = await asyncio.gather(*(cache.get(('list', 1), fail) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(result, ConnectionError) for result in results)
+    assert len(attempts) == 1
+    load, _ = counting_loader()
+    assert await cache.get(('list', 1), load) == 'secret'
+
+
+async def test_invalidate_one_workspace():
+    cache = SecretCache(ttl=60)
+    load, _ = counting_loader()
+    await cache.get(('list', 1), load)
+    await cache.get(('value', 1, 's'), load)
+    await cache.get(('list', 2), load)
+    cache.invalidate(1)
+    assert not cache.cached(('list', 1)) and not cache.cached(('value', 1, 's'))
+    assert cache.cached(('list', 2))
+    cache.invalidate()
+    assert len(cache) == 0
+
+
+async def test_zero_ttl_disables_caching():
+    cache = SecretCache(ttl=0)
+    load, calls = counting_loader()
+    await cache.get(('list', 1), load)
+    await cache.get(('list', 1), load)
+    assert len(calls) == 2 and len(cache) == 0
+
+
+class NoArgs(BaseModel):
+    pass
+
+
+@pytest.fixture
+def agent(make_agent):
+    agent = make_agent()
+    agent.requests = []
+
+    def respond(request):
+        agent.requests.append(request.url.path)
+        if request.url.path.endswith('/agent-secrets'):
+            return httpx.Response(200, json=[{'id': 1, 'name': 'TOKEN'}, {'id': 2, 'name': 'OTHER'}])
+        return httpx.Response(200, json='value-of-1')
+
+    agent.api_client.client._transport = httpx.MockTransport(respond)
+    agent.add_capability(Capability(name='uses_token', description='Uses a token', schema=NoArgs,
+                                    run=lambda params, messages: 'ok', secrets=['TOKEN']))
+    return agent
+
+
+async def test_prefetch_loads_the_list_and_the_declared_values(agent):
+    await agent.prefetch_secrets(7)
+    assert agent.requests == ['/workspaces/7/agent-secrets', '/workspaces/7/agent-secrets/1/value']
+    assert await agent.get_secret_value(GetSecretValueParams(workspace_id=7, secret_id='1')) == 'value-of-1'
+    await agent.get_secrets(GetSecretsParams(workspace_id=7))
+    assert len(agent.requests) == 2
@@ -0,0 +1,213 @@
+import asyncio
+import json
+import sqlite3
+
+import pytest
+
+from src.exceptions import TaskQueueClosedError
+from src.task_queue import DurableTaskQueue
+
+
+def rows(path):
+    with sqlite3.connect(path) as conn:
+        return [row[0] for row in conn.execute('SELECT body FROM actions ORDER BY id')]
+
+
+async def wait_for(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, 'timed out'
+        await asyncio.sleep(0.005)
+
+
+async def hold(item):
+    """A handler that never finishes, so actions stay queued until the queue is stopped."""
+    await asyncio.Event().wait()
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'queue.db')
+
+
+async def test_actions_run_in_order_and_are_removed(path):
+    handled = []
+
+    async def handler(item):
+        handled.append(item.body)
+
+    queue = DurableTaskQueue(path, max_in_flight=1)
+    await queue.start(handler)
+    for i in range(5):
+        await queue.put('do-task', str(i).encode())
+    await wait_for(lambda: queue.depth == 0)
+    await queue.stop()
+    assert handled == [b'0', b'1', b'2', b'3', b'4']
+    assert rows(path) == []
+
+
+async def test_put_returns_after_the_write_is_committed(path):
+    release = asyncio.Event()
+    queue = DurableTaskQueue(path, max_in_flight=1)
+    await queue.start(lambda item: release.wait())
+    await queue.put('do-task', b'first')
+    assert rows(path) == [b'first']
+    release.set()
+    await queue.stop()
+
+
+async def test_concurrent_puts_are_committed_together(path):
+    queue = DurableTaskQueue(path, batch_window=0.01)
+    await queue.start(hold)
+    commits = []
+    commit = queue._commit_sync
+    queue._commit_sync = lambda batch: commits.append(len(batch)) or commit(batch)
+    await asyncio.gather(*(queue.put('do-task', str(i).encode()) for i in range(20)))
+    await queue.stop()
+    assert commits == [20]
+    assert len(rows(path)) == 20
+
+
+async def test_unfinished_actions_survive_a_restart(path):
+    queue = DurableTaskQueue(path)
+    await queue.start(hold)
+    await queue.put('do-task', b'a')
+    await queue.put('do-task', b'b')
+    await queue.stop()
+
+    handled = []
+
+    async def handler(item):
+        handled.append(item.body)
+
+    restarted = DurableTaskQueue(path, max_in_flight=2)
+    await restarted.start(handler)
+    assert restarted.depth == 2
+    await wait_for(lambda: restarted.depth == 0)
+    await restarted.stop()
+    assert sorted(handled) == [b'a', b'b']
+
+
+async def test_failing_actions_are_dropped(path):
+    async def handler(item):
+        raise ValueError('broken')
+
+    queue = DurableTaskQueue(path, max_in_flight=1)
+    await queue.start(handler)
+    await queue.put('do-task', b'bad')
+    await wait_for(lambda: queue.depth == 0)
+    await queue.stop()
+    assert rows(path) == []
+
+
+async def test_puts_fail_when_the_queue_is_not_running(path):
+    queue = DurableTaskQueue(path)
+    with pytest.raises(TaskQueueClosedError):
+        await queue.put('do-task', b'early')
+    await queue.start(hold)
+    await queue.stop()
+    with pytest.raises(TaskQueueClosedError):
+        await asyncio.wait_for(queue.put('do-task', b'late'), 1)
+
+
+async def test_stop_commits_the_writes_still_waiting(path):
+    queue = DurableTaskQueue(path, batch_window=10)
+    await queue.start(hold)
+    put = asyncio.ensure_future(queue.put('do-task', b'waiting'))
+    await asyncio.sleep(0)
+    await queue.stop()
+    await asyncio.wait_for(put, 1)
+    assert rows(path) == [b'waiting']
+
+
+async def test_drain_rate_spaces_out_starts(path):
+    started = []
+
+    async def handler(item):
+        started.append(asyncio.get_running_loop().time())
+
+    queue = DurableTaskQueue(path, max_in_flight=4, drain_rate=50)
+    await queue.start(handler)
+    for i in range(5):
+        await queue.put('do-task', str(i).encode())
+    await wait_for(lambda: len(started) == 5)
+    await queue.stop()
+    # Five starts at 50/s take at least four intervals of 20ms
+    assert started[-1] - started[0] >= 0.07
+
+
+async def test_agent_runs_queued_tasks_after_a_restart(make_agent, payloads, monkeypatch, path):
+    async def ignore(*args, **kwargs):
+        return None
+
+    agent = make_agent(task_queue_path=path)
+    monkeypatch.setattr(agent, 'prefetch_secrets', ignore)
+    await agent.task_queue.start(hold)
+    await agent.handle_root_route(json.dumps(payloads.do_task(task_id=3)).encode())
+    await agent.task_queue.stop()
+    assert len(rows(path)) == 1
+
+    executed = []
+
+    async def execute_task(**kwargs):
+        executed.append(kwargs['task_id'])
+        return {'success': True}
+
+    restarted = make_agent(task_queue_path=path)
+    monkeypatch.setattr(restarted.runtime_client, 'execute_task', execute_task)
+    monkeypatch.setattr(restarted, 'prefetch_secrets', ignore)
+    await restarted.on_startup()
+    await wait_for(lambda: restarted.task_queue.depth == 0)
+    await restarted.on_shutdown()
+    assert executed == [3]
+
+
+async def test_dispatch_does_not_wait_for_runs_up_to_the_in_flight_cap(path):
+    started = []
+    release = asyncio.Event()
+
+    async def handler(item):
+        started.append(item.body)
+        await release.wait()
+
+    queue = DurableTaskQueue(path, max_in_flight=3)
+    await queue.start(handler)
+    for i in range(5):
+        await queue.put('do-task', str(i).encode())
+    await wait_for(lambda: len(started) == 3)
+    await asyncio.sleep(0.02)
+    assert started == [b'0', b'1', b'2']
+    release.set()
+    await wait_for(lambda: queue.depth == 0)
+    await queue.stop()
+    assert len(started) == 5
+
+
+async def test_queued_tasks_are_fair_queued_across_workspaces(make_agent, payloads, monkeypatch, path):
+    monkeypatch.setenv('OPENSERV_WORKSPACE_CONCURRENCY', '1')
+    release = asyncio.Event()
+    running = []
+
+    async def execute_task(**kwargs):
+        running.append(kwargs['task_id'])
+        await release.wait()
+        return {'success': True}
+
+    async def ignore(*args, **kwargs):
+        return None
+
+    agent = make_agent(task_queue_path=path)
+    monkeypatch.setattr(agent.runtime_client, 'execute_task', execute_task)
+    monkeypatch.setattr(agent, 'prefetch_secrets', ignore)
+    await agent.on_startup()
+    # A burst from workspace 1, then one task from workspace 2
+    for task_id in range(1, 7):
+        await agent.handle_root_route(json.dumps(payloads.do_task(task_id=task_id, workspace_id=1)).encode())
+    await agent.handle_root_route(json.dumps(payloads.do_task(task_id=100, workspace_id=2)).encode())
+    await wait_for(lambda: len(running) == 2)
+    # Workspace 2 does not wait behind workspace 1's burst
+    assert running == [1, 100]
+    release.set()
+    await wait_for(lambda: agent.task_queue.depth == 0)
+    await agent.on_shutdown()
+    assert sorted(running) == [1, 2, 3, 4, 5, 6, 100]
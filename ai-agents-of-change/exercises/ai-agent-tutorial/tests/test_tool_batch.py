@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from src.capability import Capability
+
+
+class EchoArgs(BaseModel):
+    text: str
+
+
+@pytest.fixture
+def agent(make_agent):
+    agent = make_agent()
+    agent.seen_messages = []
+
+    def echo(params, messages):
+        agent.seen_messages.append(messages)
+        return f"{params['args'].text} ({len(messages)} messages, action {params['action']})"
+
+    agent.add_capability(Capability(name='echo', description='Echo', schema=EchoArgs, run=echo))
+    return agent
+
+
+def test_results_come_back_in_call_order_with_per_item_errors(agent):
+    response = TestClient(agent.server.app).post('/batch/tools', json={
+        'messages': [{'role': 'user', 'content': 'hi'}],
+        'action': 'shared',
+        'calls': [
+            {'tool_name': 'echo', 'args': {'text': 'one'}},
+            {'tool_name': 'missing', 'args': {}},
+            {'args': {'text': 'no name'}},
+            {'tool_name': 'echo', 'args': {'text': 'two'}, 'action': 'own', 'messages': []},
+            {'tool_name': 'echo', 'args': {}},
+        ],
+    })
+    assert response.status_code == 200
+    results = response.json()['results']
+    assert results[0] == {'result': 'one (1 messages, action shared)'}
+    assert results[1] == {'error': 'Tool "missing" not found'}
+    assert results[2] == {'error': 'Missing tool_name'}
+    assert results[3] == {'result': 'two (0 messages, action own)'}
+    assert results[4]['error'].startswith('Invalid arguments')
+
+
+async def test_calls_share_one_message_history(agent):
+    body = {'messages': [{'role': 'user', 'content': 'hi'}],
+            'calls': [{'tool_name': 'echo', 'args': {'text': str(i)}} for i in range(3)]}
+    await agent.handle_tool_batch(body)
+    assert len(agent.seen_messages) == 3
+    # Each call gets its own list, but the message dicts are not copied
+    first = agent.seen_messages[0]
+    assert all(messages is not first and messages[0] is first[0] for messages in agent.seen_messages[1:])
+
+
+async def test_concurrency_is_bounded(make_agent, monkeypatch):
+    monkeypatch.setenv('OPENSERV_TOOL_BATCH_CONCURRENCY', '2')
+    agent = make_agent()
+    running = []
+    peak = []
+
+    async def slow(params, messages):
+        running.append(1)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.pop()
+        return 'done'
+
+    agent.add_capability(Capability(name='slow', description='Slow', schema=EchoArgs, run=slow))
+    result = await agent.handle_tool_batch({'calls': [{'tool_name': 'slow', 'args': {'text': 'x'}}] * 6})
+    assert [item['result'] for item in result['results']] == ['done'] * 6
+    assert max(peak) == 2
+
+
+@pytest.mark.parametrize('body', [{}, {'calls': 'echo'}, [], 'calls'])
+def test_a_body_without_a_list_of_calls_is_rejected(agent, body):
+    response = TestClient(agent.server.app).post('/batch/tools', json=body)
+    assert response.status_code == 400
+
+
+def test_a_tool_named_batch_is_not_shadowed(agent):
+    agent.add_capability(Capability(name='batch', description='Batch', schema=EchoArgs,
+                                    run=lambda params, messages: 'tool'))
+    response = TestClient(agent.server.app).post('/tools/batch', json={'args': {'text': 'x'}})
+    assert response.json() == {'result': 'tool'}
@@ -0,0 +1,117 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from src import tracing
+from src.capability import Capability
+from src.types import parse_action
+
+TRACEPARENT = '00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01'
+
+
+@pytest.fixture
+def spans():
+    exporter = tracing.InMemorySpanExporter()
+    tracing.set_exporter(exporter)
+    yield exporter.spans
+    tracing.set_exporter(None)
+
+
+def by_name(spans):
+    return {span['name']: span for span in spans}
+
+
+@pytest.mark.parametrize('value', [
+    None, '', 'garbage', '00-abc-def-01',
+    '00-00000000000000000000000000000000-b7ad6b7169203331-01',
+    '00-0af7651916cd43dd8448eb211c80319c-0000000000000000-01',
+])
+def test_malformed_traceparent_is_ignored(value):
+    assert tracing.SpanContext.from_traceparent(value) is None
+
+
+def test_traceparent_round_trips():
+    context = tracing.SpanContext.from_traceparent(TRACEPARENT)
+    assert context.to_traceparent() == TRACEPARENT
+
+
+def test_no_spans_without_an_exporter():
+    with tracing.start_span('ignored') as span:
+        assert span is tracing.NOOP_SPAN
+    assert tracing.inject({}) == {}
+
+
+async def test_spans_nest_across_tasks(spans):
+    async def child():
+        with tracing.start_span('child'):
+            pass
+
+    with tracing.start_span('parent') as parent:
+        await asyncio.create_task(child())
+    recorded = by_name(spans)
+    assert recorded['child']['parent_id'] == parent.context.span_id
+    assert recorded['child']['trace_id'] == recorded['parent']['trace_id']
+
+
+async def test_errors_are_recorded_on_the_span(spans):
+    with pytest.raises(ValueError):
+        with tracing.start_span('failing'):
+            raise ValueError('boom')
+    assert spans[0]['status'] == 'error'
+    assert spans[0]['attributes']['error.message'] == 'boom'
+
+
+class EchoArgs(BaseModel):
+    text: str
+
+
+def test_tool_route_continues_the_callers_trace(make_agent, spans):
+    agent = make_agent()
+    agent.add_capability(Capability(name='echo', description='Echo', schema=EchoArgs,
+                                    run=lambda params, messages: params['args'].text))
+    response = TestClient(agent.server.app).post(
+        '/tools/echo', json={'args': {'text': 'hi'}}, headers={'traceparent': TRACEPARENT}
+    )
+    assert response.status_code == 200
+    recorded = by_name(spans)
+    route = recorded['POST /tools/{tool_name}']
+    assert route['trace_id'] == '0af7651916cd43dd8448eb211c80319c'
+    assert route['parent_id'] == 'b7ad6b7169203331'
+    assert recorded['capability.run']['parent_id'] == route['span_id']
+
+
+async def test_runtime_calls_carry_the_task_trace(make_agent, payloads, spans):
+    agent = make_agent()
+    sent = []
+    agent.runtime_client.client._transport = httpx.MockTransport(
+        lambda request: sent.append(request) or httpx.Response(200, json={})
+    )
+    await agent.do_task(parse_action(payloads.do_task(task_id=5)))
+    recorded = by_name(spans)
+    task = recorded['do_task']
+    execute = recorded['runtime.execute_task']
+    assert execute['parent_id'] == task['span_id']
+    assert execute['attributes']['task_id'] == 5
+    context = tracing.SpanContext.from_traceparent(sent[0].headers['traceparent'])
+    assert context.trace_id == task['trace_id']
+    assert context.span_id in {span['span_id'] for span in spans}
+
+
+def test_file_export_and_timeline(tmp_path):
+    path = str(tmp_path / 'traces.jsonl')
+    tracing.set_exporter(tracing.FileSpanExporter(path, batch_size=100))
+    try:
+        with tracing.start_span('outer', task_id=1) as outer:
+            with tracing.start_span('inner'):
+                pass
+        tracing.flush()
+    finally:
+        tracing.set_exporter(None)
+    loaded = tracing.load_spans(path, outer.context.trace_id)
+    assert [span['name'] for span in loaded] == ['inner', 'outer']
+    lines = tracing.format_timeline(loaded).splitlines()
+    assert 'outer' in lines[0] and 'task_id=1' in lines[0]
+    assert lines[1].split('ms', 1)[1].startswith('   inner')
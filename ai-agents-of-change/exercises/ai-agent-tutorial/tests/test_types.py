@@ -0,0 +1,56 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.exceptions import ValidationError
+from src.types import DoTaskAction, LazyModelList, Memory, RespondChatMessageAction, parse_action
+
+
+def test_parse_action_dispatches_on_type_and_keeps_raw_json(payloads):
+    raw = json.dumps(payloads.do_task()).encode()
+    action = parse_action(raw)
+    assert isinstance(action, DoTaskAction)
+    assert action.raw_json == raw
+    assert isinstance(parse_action(payloads.chat()), RespondChatMessageAction)
+
+
+@pytest.mark.parametrize('body, message', [
+    (b'{"type": "cancel-task"}', "Invalid action type: 'cancel-task'"),
+    (b'{"me": {}}', 'Missing action type'),
+    (b'{"type": ', 'EOF while parsing'),
+])
+def test_parse_action_explains_rejected_payloads(body, message):
+    with pytest.raises(ValidationError) as error:
+        parse_action(body)
+    assert message in str(error.value)
+
+
+def test_parse_action_lists_missing_fields(payloads):
+    payload = payloads.do_task()
+    del payload['task']['description']
+    with pytest.raises(ValidationError, match='task.description: Field required'):
+        parse_action(payload)
+
+
+def test_root_route_answers_bad_payloads_with_400(make_agent):
+    client = TestClient(make_agent().server.app)
+    response = client.post('/', content=b'{"type": "cancel-task"}')
+    assert response.status_code == 400
+    assert "Invalid action type: 'cancel-task'" in response.json()['detail']
+
+
+def test_lazy_lists_validate_on_first_access_and_support_list_methods(payloads):
+    payload = payloads.do_task()
+    payload['memories'] = [{'id': 1, 'memory': 'a'}, {'id': 'not-a-number', 'memory': 'b'}]
+    action = parse_action(payload)
+    assert isinstance(action.memories, LazyModelList)
+    assert len(action.memories) == 2
+    with pytest.raises(Exception):
+        action.memories[0]
+
+    action = parse_action(payloads.do_task())
+    action.memories.append(Memory(id=3, memory='remember this'))
+    action.memories.extend([Memory(id=4, memory='and this')])
+    assert [m.id for m in action.memories] == [3, 4]
+    assert [m['id'] for m in action.model_dump()['memories']] == [3, 4]
@@ -0,0 +1,87 @@
+import json
+from typing import List
+
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from src.capability import Capability
+from src.llm import ScriptedBackend
+from src.types import ProcessParams
+
+
+class Item(BaseModel):
+    name: str
+    quantity: int
+
+
+class OrderArgs(BaseModel):
+    customer: str
+    items: List[Item]
+    note: str = ''
+
+
+class NoArgs(BaseModel):
+    pass
+
+
+def order_capability():
+    return Capability(name='order', description='Place an order', schema=OrderArgs,
+                      run=lambda params, messages: f"{params['args'].customer}: {len(params['args'].items)} items")
+
+
+async def test_json_arguments_are_validated_in_one_pass():
+    result = await order_capability().run({'args': '{"customer": "ada", "items": [{"name": "tea", "quantity": 2}]}'}, [])
+    assert result == 'ada: 1 items'
+
+
+async def test_an_instance_of_the_schema_is_used_as_it_is():
+    args = OrderArgs(customer='ada', items=[])
+    seen = []
+    capability = Capability(name='order', description='Order', schema=OrderArgs,
+                            run=lambda params, messages: seen.append(params['args']) or 'ok')
+    await capability.run({'args': args}, [])
+    assert seen[0] is args
+
+
+async def test_every_problem_is_reported_at_once():
+    result = json.loads(await order_capability().run(
+        {'args': {'items': [{'name': 'tea', 'quantity': 'two'}, {'quantity': 1}], 'note': 'x' * 500}}, []
+    ))
+    assert result['error'] == 'invalid_arguments' and result['tool'] == 'order'
+    errors = {error['field']: error for error in result['errors']}
+    assert set(errors) == {'customer', 'items.0.quantity', 'items.1.name'}
+    assert errors['items.0.quantity']['got'] == 'two'
+    assert 'got' not in errors['customer']
+
+
+async def test_malformed_json_and_long_values_are_reported_compactly():
+    result = json.loads(await order_capability().run({'args': '{"customer": '}, []))
+    assert result['errors'][0]['field'] == '(arguments)'
+    long_value = json.loads(await order_capability().run({'args': {'customer': 1, 'items': 'x' * 500}}, []))
+    got = next(error['got'] for error in long_value['errors'] if error['field'] == 'items')
+    assert len(got) < 200 and got.endswith('...')
+
+
+async def test_an_empty_string_means_no_arguments():
+    capability = Capability(name='ping', description='Ping', schema=NoArgs, run=lambda params, messages: 'pong')
+    assert await capability.run({'args': ''}, []) == 'pong'
+
+
+def test_tool_route_returns_structured_errors(make_agent):
+    agent = make_agent()
+    agent.add_capability(order_capability())
+    response = TestClient(agent.server.app).post('/tools/order', json={'args': {'customer': 'ada'}})
+    body = response.json()
+    assert body['error'] == 'Invalid arguments: items: Field required'
+    assert body['errors'] == [{'field': 'items', 'problem': 'Field required'}]
+
+
+async def test_the_model_gets_the_errors_as_the_tool_result(make_agent):
+    agent = make_agent(llm_backend=ScriptedBackend([
+        {'tool_calls': [{'name': 'order', 'arguments': '{"customer": "ada", "items": [{"name": "tea"}]}'}]},
+        {'content': 'done'},
+    ]))
+    agent.add_capability(order_capability())
+    result = await agent.process(ProcessParams(messages=[{'role': 'user', 'content': 'order tea'}]))
+    tool_result = json.loads(result['messages'][2]['content'])
+    assert tool_result['errors'] == [{'field': 'items.0.quantity', 'problem': 'Field required'}]